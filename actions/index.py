@@ -1,11 +1,13 @@
 # actions/index.py
 import os
+import time
 from pathlib import Path
 import sys
 sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
 
-from utils.fetcher import ScoreFetcher
-from utils import database
+from utils.fetcher import CircuitBreaker, ScoreFetcher, save_cached_fingerprints
+from utils.monitor import monitor_account
+from utils import database, trace
 
 
 def fetch_scores():
@@ -17,11 +19,14 @@ def fetch_scores():
         raise Exception({"status": "error", "message": "未配置学号或密码"})
 
     print("--- 任务开始: 准备获取成绩 ---")
-    fetcher = ScoreFetcher(username=username, password=password)
+    breaker = CircuitBreaker()
+    if not breaker.allow():
+        return skipped_by_breaker(breaker)
+    fetcher = ScoreFetcher(username=username, password=password, session_store=database, circuit_breaker=breaker)
 
     try:
         # 1. 登录
-        login_success = fetcher.login()
+        login_success = fetcher.ensure_login()  # 优先复用保存的会话
         if not login_success:
             raise Exception({"status": "error", "message": "登录失败，请检查日志。"})
 
@@ -34,7 +39,9 @@ def fetch_scores():
         # 3. 将合并后的成绩数据存入
         print("正在将成绩数据存入数据库...")
         old = database.get_latest_scores()
-        upsert_results = database.save_scores(combined_scores)
+        upsert_results = database.save_scores(combined_scores, fingerprints=fetcher.fingerprints)
+        if upsert_results:
+            save_cached_fingerprints(username, fetcher.fingerprints)
         new = database.get_latest_scores()
         print("--- 任务完成 ---")
         return {
@@ -61,7 +68,9 @@ def check_login_connection():
         raise Exception({"status": "error", "message": "未配置学号或密码"})
     
     try:
-        fetcher = ScoreFetcher(username=username, password=password)
+        # 手动检查不受熔断限制，但登录结果会更新熔断器状态
+        fetcher = ScoreFetcher(username=username, password=password, session_store=database,
+                               circuit_breaker=CircuitBreaker())
         login_success = fetcher.login()
     except Exception as e:
         print(f"检查登录有效性时发生错误: {e}")
@@ -92,135 +101,27 @@ def monitor_scores():
         raise Exception({"status": "error", "message": "未配置邮件环境变量"})
     
     print("--- 任务开始: 监控成绩变化 ---")
+    breaker = CircuitBreaker()
+    if not breaker.allow():
+        print("--- 任务完成 ---")
+        return skipped_by_breaker(breaker)
     
-    try:
-        # 1. 获取数据库中的旧成绩
-        print("正在从数据库获取历史成绩...")
-        old_scores = database.get_latest_scores()
-        
-        # 2. 登录并获取最新成绩
-        print("正在登录教务系统获取最新成绩...")
-        fetcher = ScoreFetcher(username=username, password=password)
-        login_success = fetcher.login()
-        
-        if not login_success:
-            raise Exception({"status": "error", "message": "登录失败，请检查日志。"})
-        
-        new_scores = fetcher.get_combined_scores()
-        
-        # 3. 比较成绩变化
-        print("正在比较成绩变化...")
-        changes = []
-        
-        # 创建旧成绩的快速查找字典 (课程名称+教师) -> 成绩记录
-        old_scores_map = {}
-        if old_scores:
-            for score in old_scores:
-                key = (score.get('课程名称'), score.get('教师'))
-                old_scores_map[key] = score
-        
-        # 检查新成绩中的变化
-        for new_score in new_scores:
-            key = (new_score.get('课程名称'), new_score.get('教师'))
-            
-            if key not in old_scores_map:
-                # 课程不存在于旧数据中，检查新增的内容
-                
-                # 新增总成绩
-                if new_score.get('成绩'):
-                    changes.append({
-                        'type': '新增总成绩',
-                        'course': new_score
-                    })
-                
-                # 新增平时成绩
-                if new_score.get('平时成绩详情'):
-                    changes.append({
-                        'type': '新增平时成绩',
-                        'course': new_score,
-                        'new_details': new_score.get('平时成绩详情')
-                    })
-            else:
-                # 课程存在，检查是否有变化
-                old_score = old_scores_map[key]
-                
-                # 检查总成绩
-                old_grade = old_score.get('成绩')
-                new_grade = new_score.get('成绩')
-                
-                if old_grade != new_grade:
-                    if not old_grade and new_grade:
-                        # 之前没有总成绩，现在有了
-                        changes.append({
-                            'type': '新增总成绩',
-                            'course': new_score
-                        })
-                    else:
-                        # 总成绩发生变化
-                        changes.append({
-                            'type': '总成绩变化',
-                            'course': new_score,
-                            'old_value': old_grade,
-                            'new_value': new_grade
-                        })
-                
-                # 检查平时成绩详情
-                old_details = old_score.get('平时成绩详情') or []
-                new_details = new_score.get('平时成绩详情') or []
-                
-                if old_details != new_details:
-                    if not old_details and new_details:
-                        # 之前没有平时成绩，现在有了
-                        changes.append({
-                            'type': '新增平时成绩',
-                            'course': new_score,
-                            'new_details': new_details
-                        })
-                    else:
-                        # 平时成绩发生变化
-                        changes.append({
-                            'type': '平时成绩变化',
-                            'course': new_score,
-                            'old_details': old_details,
-                            'new_details': new_details
-                        })
-        
-        # 4. 如果有变化，发送邮件
-        if changes:
-            print(f"检测到 {len(changes)} 项成绩变化，正在发送邮件通知...")
-            
-            # 生成 HTML 表格
+    def notify(changes):
+        with trace.span('render', changes=len(changes)):
             html_body = generate_change_notification_html(changes)
-            
-            # 发送邮件
-            send_email(
-                smtp_server=smtp_host,
-                smtp_port=smtp_port,
-                sender_email=notify_email,
-                sender_password=email_password,
-                receiver_email=notify_email,
-                subject="🎓 成绩更新通知",
-                body=html_body
-            )
-            
-            # 保存新成绩到数据库
-            print("正在将新成绩保存到数据库...")
-            database.save_scores(new_scores)
-            
-            return {
-                "status": "success",
-                "message": f"检测到 {len(changes)} 项成绩变化，已发送邮件通知。",
-                "changes_count": len(changes),
-                "old_scores_count": len(old_scores) if old_scores else 0,
-                "new_scores_count": len(new_scores) if new_scores else 0,
-            }
-        else:
-            print("未检测到成绩变化。")
-            return {
-                "status": "success",
-                "message": "成绩无变化。",
-                "changes": []
-            }
+        send_email(
+            smtp_server=smtp_host,
+            smtp_port=smtp_port,
+            sender_email=notify_email,
+            sender_password=email_password,
+            receiver_email=notify_email,
+            subject="🎓 成绩更新通知",
+            body=html_body
+        )
+    
+    try:
+        fetcher = ScoreFetcher(username=username, password=password, session_store=database, circuit_breaker=breaker)
+        return monitor_account(fetcher, database, notify)
     
     except Exception as e:
         print(f"监控成绩时发生错误: {e}")
@@ -229,6 +130,59 @@ def monitor_scores():
     finally:
         print("--- 任务完成 ---")
 
+def batch_monitor(accounts_path=None):
+    """批量监控账号列表中的每个账号（见 utils/batch.py），有变动时分别发送邮件通知"""
+    from utils.notify import send_email
+    from utils import batch
+    
+    # 邮件配置（所有账号共用发件邮箱，收件邮箱取账号的 email，未设置时发给 NOTIFY_EMAIL）
+    smtp_host = os.environ.get("SMTP_HOST")
+    smtp_port = int(os.environ.get("SMTP_PORT", "465"))
+    notify_email = os.environ.get("NOTIFY_EMAIL")
+    email_password = os.environ.get("EMAIL_PASSWORD")
+    
+    if not smtp_host or not notify_email or not email_password:
+        raise Exception({"status": "error", "message": "未配置邮件环境变量"})
+    
+    try:
+        accounts = batch.load_accounts(accounts_path or batch.ACCOUNTS_FILE)
+    except (OSError, ValueError) as e:
+        raise Exception({"status": "error", "message": f"读取账号列表失败: {e}"})
+    
+    print(f"--- 任务开始: 批量监控 {len(accounts)} 个账号 ---")
+    breaker = CircuitBreaker()
+    if not breaker.allow():
+        print("--- 任务完成 ---")
+        return skipped_by_breaker(breaker)
+    
+    def notify(account, changes):
+        with trace.span('render', changes=len(changes)):
+            html_body = generate_change_notification_html(changes)
+        send_email(
+            smtp_server=smtp_host,
+            smtp_port=smtp_port,
+            sender_email=notify_email,
+            sender_password=email_password,
+            receiver_email=account.get("email") or notify_email,
+            subject=f"🎓 成绩更新通知（{account['username']}）",
+            body=html_body
+        )
+    
+    report = batch.monitor_accounts(accounts, notify, breaker=breaker)
+    batch.print_report(report)
+    print("--- 任务完成 ---")
+    return {
+        "status": "success" if not report["failed"] else "partial",
+        "message": f"{report['succeeded']}/{report['total']} 个账号监控完成。",
+        "report": report
+    }
+
+def skipped_by_breaker(breaker):
+    """熔断期间跳过定时任务，不访问教务与 GitHub"""
+    retry_at = time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(breaker.open_until))
+    print(f"教务服务器近期持续不可达，熔断至 {retry_at}，跳过本次运行。")
+    return {"status": "skipped", "message": f"教务服务器近期持续不可达，{retry_at} 前跳过定时任务。"}
+
 def generate_change_notification_html(changes):
     """生成成绩变化通知的 HTML 表格"""
     html = """
@@ -330,9 +284,10 @@ if __name__ == "__main__":
     parser = argparse.ArgumentParser(description="SWJTU 成绩监控工具")
     parser.add_argument(
         "action",
-        choices=["fetch", "check", "monitor"],
-        help="要执行的操作: fetch(获取成绩), check(检查登录), monitor(监控变化)"
+        choices=["fetch", "check", "monitor", "batch"],
+        help="要执行的操作: fetch(获取成绩), check(检查登录), monitor(监控变化), batch(批量监控多个账号)"
     )
+    parser.add_argument("--accounts", help="batch 使用的账号列表文件（默认取 ACCOUNTS_FILE，仍为空则从 Gist 读取）")
     
     args = parser.parse_args()
     
@@ -340,10 +295,16 @@ if __name__ == "__main__":
         "fetch": fetch_scores,
         "check": check_login_connection,
         "monitor": monitor_scores,
+        "batch": lambda: batch_monitor(args.accounts),
     }
     
     try:
-        result = actions_map[args.action]()
+        # 设置 TRACE_FILE 时各阶段的 span 以 JSON 行输出（见 utils/trace.py），结果中附上按阶段的汇总
+        with trace.collect() as spans:
+            with trace.span(f"actions.{args.action}"):
+                result = actions_map[args.action]()
+        if isinstance(result, dict):
+            result["trace"] = trace.summarize(spans)
         print(result)
     except Exception as e:
         print(f"执行失败: {e}")
@@ -1,4 +1,6 @@
 # api/index.py
+import asyncio
+import functools
 import os
 from fastapi import FastAPI, HTTPException, Security
 from fastapi.security.api_key import APIKeyQuery
@@ -7,11 +9,26 @@ from pathlib import Path
 import sys, os
 sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
 
-from utils.fetcher import ScoreFetcher
-from utils import database
+from utils.fetcher import ScoreFetcher, save_cached_fingerprints
+from utils.monitor import MonitorFailure, async_monitor_account
+from utils import database, trace, transport
 
 app = FastAPI()
 
+def traced(name):
+    """把路由的执行过程记录为 span，返回的字典中附上 trace（各阶段的 span 与汇总，见 utils/trace.py）"""
+    def decorator(route):
+        @functools.wraps(route)
+        async def wrapper(*args, **kwargs):
+            with trace.collect() as spans:
+                with trace.span(name):
+                    result = await route(*args, **kwargs)
+            if isinstance(result, dict):
+                result["trace"] = trace.report(spans)
+            return result
+        return wrapper
+    return decorator
+
 api_key_query = APIKeyQuery(name="secret", auto_error=False)
 
 def get_api_key(api_key: str = Security(api_key_query)):
@@ -25,6 +42,7 @@ def get_api_key(api_key: str = Security(api_key_query)):
 
 @app.get("/api/fetch-scores") 
 @app.post("/api/fetch-scores")
+@traced("api.fetch_scores")
 async def trigger_fetch_scores(api_key: str = Security(get_api_key)):
     username = os.environ.get("SWJTU_USERNAME")
     password = os.environ.get("SWJTU_PASSWORD")
@@ -32,26 +50,32 @@ async def trigger_fetch_scores(api_key: str = Security(get_api_key)):
     if not username or not password:
         raise HTTPException(status_code=500, detail="服务器未配置学号或密码环境变量")
 
+    from utils.async_fetcher import AsyncScoreFetcher  # 导入 httpx，只在用到的路由中导入，不拖慢冷启动
+
     print("--- 任务开始: 准备获取成绩 ---")
-    fetcher = ScoreFetcher(username=username, password=password)
+    # 进程会处理多个请求，每个请求重新下载一次 Gist；其他请求正在下载时 refresh 会等待锁，不能阻塞事件循环
+    await asyncio.to_thread(database.refresh)
+    fetcher = AsyncScoreFetcher(username=username, password=password, session_store=database)
 
     try:
         # 1. 登录
-        login_success = fetcher.login()
+        login_success = await fetcher.ensure_login()  # 优先复用保存的会话
         if not login_success:
             return {"status": "error", "message": "登录失败，请检查Vercel日志。"}
 
         # 2. 获取并合并总成绩和平时成绩
-        combined_scores = fetcher.get_combined_scores()
+        combined_scores = await fetcher.get_combined_scores()
 
         if not combined_scores:
             return {"status": "error", "message": "未能获取到任何成绩数据。"}
 
         # 3. 将合并后的成绩数据存入
         print("正在将成绩数据存入数据库...")
-        old = database.get_latest_scores()
-        upsert_results = database.save_scores(combined_scores)
-        new = database.get_latest_scores()
+        old = await asyncio.to_thread(database.get_latest_scores)
+        upsert_results = await asyncio.to_thread(database.save_scores, combined_scores, fingerprints=fetcher.fingerprints)
+        if upsert_results:
+            await asyncio.to_thread(save_cached_fingerprints, username, fetcher.fingerprints)
+        new = await asyncio.to_thread(database.get_latest_scores)
         print("--- 任务完成 ---")
         return {
             "status": "success",
@@ -67,21 +91,32 @@ async def trigger_fetch_scores(api_key: str = Security(get_api_key)):
         print(f"执行任务时发生严重错误: {e}")
         raise HTTPException(status_code=500, detail=f"执行爬虫任务时发生内部错误: {str(e)}")
 
+    finally:
+        await fetcher.aclose()
+
 @app.get("/")
 def read_root():
     return {"status": "online", "message": "SWJTU Score Fetcher API is running with upstash."}
 
+@app.get("/api/transport-stats")
+def read_transport_stats(api_key: str = Security(get_api_key)):
+    """本进程内各主机的请求数、新建连接数与连接复用数（见 utils/transport.py）"""
+    return {"status": "success", "hosts": transport.stats()}
+
 @app.get("/api/check-login-usability") 
 @app.post("/api/check-login-usability")
+@traced("api.check_login")
 async def trigger_check_login_usability(api_key: str = Security(get_api_key)):
     """检查当前配置的学号和密码是否能成功登录教务系统"""
+    from utils.async_fetcher import AsyncScoreFetcher
+
     username = os.environ.get("SWJTU_USERNAME")
     password = os.environ.get("SWJTU_PASSWORD")
     if not username or not password:
         raise HTTPException(status_code=500, detail="服务器未配置学号或密码环境变量")
     try:
-        fetcher = ScoreFetcher(username=username, password=password)
-        login_success = fetcher.login()
+        async with AsyncScoreFetcher(username=username, password=password, session_store=database) as fetcher:
+            login_success = await fetcher.login()
     except Exception as e:
         print(f"检查登录有效性时发生错误: {e}")
         raise HTTPException(status_code=500, detail=f"检查登录有效性时发生内部错误: {str(e)}")
@@ -92,9 +127,11 @@ async def trigger_check_login_usability(api_key: str = Security(get_api_key)):
     
 @app.get("/api/monitor-scores")
 @app.post("/api/monitor-scores")
+@traced("api.monitor_scores")
 async def trigger_monitor_scores(api_key: str = Security(get_api_key)):
     """监控成绩变化，如有变动则发送邮件通知"""
     from utils.notify import send_email
+    from utils.async_fetcher import AsyncScoreFetcher
     
     username = os.environ.get("SWJTU_USERNAME")
     password = os.environ.get("SWJTU_PASSWORD")
@@ -112,141 +149,33 @@ async def trigger_monitor_scores(api_key: str = Security(get_api_key)):
         raise HTTPException(status_code=500, detail="服务器未配置邮件环境变量")
     
     print("--- 任务开始: 监控成绩变化 ---")
-    
-    try:
-        # 1. 获取数据库中的旧成绩
-        print("正在从数据库获取历史成绩...")
-        old_scores = database.get_latest_scores()
-        
-        # 2. 登录并获取最新成绩
-        print("正在登录教务系统获取最新成绩...")
-        fetcher = ScoreFetcher(username=username, password=password)
-        login_success = fetcher.login()
-        
-        if not login_success:
-            return {"status": "error", "message": "登录失败，请检查日志。"}
-        
-        new_scores = fetcher.get_combined_scores()
-        
-        if not new_scores:
-            return {"status": "error", "message": "未能获取到任何成绩数据。"}
-        
-        # 3. 比较成绩变化
-        print("正在比较成绩变化...")
-        changes = []
-        
-        # 创建旧成绩的快速查找字典 (课程名称+教师) -> 成绩记录
-        old_scores_map = {}
-        if old_scores:
-            for score in old_scores:
-                key = (score.get('课程名称'), score.get('教师'))
-                old_scores_map[key] = score
-        
-        # 检查新成绩中的变化
-        for new_score in new_scores:
-            key = (new_score.get('课程名称'), new_score.get('教师'))
-            
-            if key not in old_scores_map:
-                # 课程不存在于旧数据中，检查新增的内容
-                
-                # 新增总成绩
-                if new_score.get('成绩'):
-                    changes.append({
-                        'type': '新增总成绩',
-                        'course': new_score
-                    })
-                
-                # 新增平时成绩
-                if new_score.get('平时成绩详情'):
-                    changes.append({
-                        'type': '新增平时成绩',
-                        'course': new_score,
-                        'new_details': new_score.get('平时成绩详情')
-                    })
-            else:
-                # 课程存在，检查是否有变化
-                old_score = old_scores_map[key]
-                
-                # 检查总成绩
-                old_grade = old_score.get('成绩')
-                new_grade = new_score.get('成绩')
-                
-                if old_grade != new_grade:
-                    if not old_grade and new_grade:
-                        # 之前没有总成绩，现在有了
-                        changes.append({
-                            'type': '新增总成绩',
-                            'course': new_score
-                        })
-                    else:
-                        # 总成绩发生变化
-                        changes.append({
-                            'type': '总成绩变化',
-                            'course': new_score,
-                            'old_value': old_grade,
-                            'new_value': new_grade
-                        })
-                
-                # 检查平时成绩详情
-                old_details = old_score.get('平时成绩详情') or []
-                new_details = new_score.get('平时成绩详情') or []
-                
-                if old_details != new_details:
-                    if not old_details and new_details:
-                        # 之前没有平时成绩，现在有了
-                        changes.append({
-                            'type': '新增平时成绩',
-                            'course': new_score,
-                            'new_details': new_details
-                        })
-                    else:
-                        # 平时成绩发生变化
-                        changes.append({
-                            'type': '平时成绩变化',
-                            'course': new_score,
-                            'old_details': old_details,
-                            'new_details': new_details
-                        })
-        
-        # 4. 如果有变化，发送邮件
-        if changes:
-            print(f"检测到 {len(changes)} 项成绩变化，正在发送邮件通知...")
-            
-            # 生成 HTML 表格
+    await asyncio.to_thread(database.refresh)
+
+    def notify(changes):
+        with trace.span('render', changes=len(changes)):
             html_body = generate_change_notification_html(changes)
-            
-            # 发送邮件
-            send_email(
-                smtp_server=smtp_host,
-                smtp_port=smtp_port,
-                sender_email=notify_email,
-                sender_password=email_password,
-                receiver_email=notify_email,
-                subject="🎓 成绩更新通知",
-                body=html_body
-            )
-            
-            # 保存新成绩到数据库
-            print("正在将新成绩保存到数据库...")
-            database.save_scores(new_scores)
-            
-            return {
-                "status": "success",
-                "message": f"检测到 {len(changes)} 项成绩变化，已发送邮件通知。",
-                "changes_count": len(changes)
-            }
-        else:
-            print("未检测到成绩变化。")
-            return {
-                "status": "success",
-                "message": "成绩无变化。",
-                "changes": []
-            }
-    
+        send_email(
+            smtp_server=smtp_host,
+            smtp_port=smtp_port,
+            sender_email=notify_email,
+            sender_password=email_password,
+            receiver_email=notify_email,
+            subject="🎓 成绩更新通知",
+            body=html_body
+        )
+
+    try:
+        async with AsyncScoreFetcher(username=username, password=password, session_store=database) as fetcher:
+            return await async_monitor_account(fetcher, database, notify)
+
+    except MonitorFailure as e:
+        # 登录失败或没有成绩数据不是服务器内部错误，照常返回 {"status": "error", ...}
+        return e.args[0]
+
     except Exception as e:
         print(f"监控成绩时发生错误: {e}")
         raise HTTPException(status_code=500, detail=f"监控成绩时发生内部错误: {str(e)}")
-    
+
     finally:
         print("--- 任务完成 ---")
 
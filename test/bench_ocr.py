@@ -0,0 +1,202 @@
+"""
+OCR 离线准确率与耗时基准
+
+对一个带标注的验证码目录运行 utils/ocr.classify，统计：
+    - 单字符准确率与整张验证码准确率
+    - 每张验证码识别耗时的 p50/p95
+    - 每个字符实际评分的模板数
+    - 识别过程的峰值内存（tracemalloc）
+
+标注取自文件名：'ABCD.png'、'ABCD_0001.jpg' 的标注均为 'ABCD'。
+
+合成语料默认字符互不粘连（间距 2~3），衡量的是识别本身；--touching 额外混入间距 0~1 的
+粘连字符，是切分方式的压力集，projection 切分在其上明显偏低，基线应按切分方式分别记录。
+结果中记录了语料类型与识别参数，与参数不一致的基线比较会直接报错。
+
+用法:
+    python test/bench_ocr.py captchas/ --output result.json
+    python test/bench_ocr.py captchas/ --baseline baseline.json   # 准确率低于基线时退出码为 1
+    python test/bench_ocr.py --synthetic 200                      # 无语料时使用模板合成的验证码（字符分离）
+    python test/bench_ocr.py --synthetic 200 --touching --segmentation auto   # 粘连字符的切分压力集
+    python test/bench_ocr.py captchas/ --threshold otsu --segmentation auto --ensemble
+"""
+import argparse
+import json
+import os
+import random
+import statistics
+import tempfile
+import time
+import tracemalloc
+from pathlib import Path
+import sys
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+
+from utils import ocr
+
+def write_synthetic_corpus(corpus_dir, count, seed=1, touching=False):
+    """
+    用模板合成带标注的验证码，写入 corpus_dir
+
+    默认字符间距 2~3、互不粘连（含少量噪点）；touching=True 时混入间距 0~1 的粘连字符，
+    用作切分方式的压力集
+    """
+    from test_matcher import make_captcha
+    rng = random.Random(seed)
+    letters = [chr(ord('A') + i) for i in range(26)]
+    spacings = [3, 2, 1, 0] if touching else [3, 2]
+    for i in range(count):
+        label = ''.join(rng.sample(letters, 4))
+        image_bytes = make_captcha(label, rng, size=(64, 20), spacing=rng.choice(spacings),
+                                   noise=rng.choice([0.0, 0.0, 0.01, 0.02]))
+        with open(os.path.join(corpus_dir, f"{label}_{i:04d}.png"), 'wb') as f:
+            f.write(image_bytes)
+
+def percentile(values, q):
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(q / 100 * (len(ordered) - 1))))]
+
+def run_benchmark(corpus, corpus_kind='directory', **options):
+    """
+    对语料逐张识别并汇总指标
+
+    参数:
+        corpus: ocr.load_labeled_captchas 返回的语料
+        corpus_kind: 语料类型（'directory'/'synthetic'/'synthetic-touching'），随结果记录
+        options: 透传给 ocr.classify 的预处理参数
+
+    返回:
+        可直接序列化为 JSON 的结果字典
+    """
+    # 预热：构建模板库，避免首张验证码计入冷启动耗时
+    ocr.get_template_bank()
+
+    latencies = []
+    scored_per_glyph = []
+    captcha_hits = 0
+    char_hits = 0
+    char_total = 0
+    failures = []
+
+    for filename, label, image_bytes in corpus:
+        start = time.perf_counter()
+        result = ocr.classify(image_bytes, debug=False, return_details=True, use_memo=False, **options)
+        latencies.append((time.perf_counter() - start) * 1000)
+
+        text = result.text if result else ''
+        scored_per_glyph.extend(match.scored for match in (result.chars if result else []))
+        captcha_hits += text == label
+        char_hits += sum(a == b for a, b in zip(text, label))
+        char_total += len(label)
+        if text != label:
+            failures.append({'file': filename, 'label': label, 'result': text})
+
+    # 峰值内存单独统计一遍，避免 tracemalloc 的开销计入耗时
+    tracemalloc.start()
+    for _, _, image_bytes in corpus:
+        ocr.classify(image_bytes, debug=False, use_memo=False, **options)
+    _, peak_memory = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    template_count = len(ocr.get_template_bank())
+    return {
+        'corpus': corpus_kind,
+        'options': {key: value for key, value in options.items()},
+        'samples': len(corpus),
+        'captcha_accuracy': captcha_hits / len(corpus) if corpus else 0.0,
+        'char_accuracy': char_hits / char_total if char_total else 0.0,
+        'latency_ms': {
+            'p50': percentile(latencies, 50),
+            'p95': percentile(latencies, 95),
+            'mean': statistics.fmean(latencies) if latencies else 0.0,
+        },
+        'templates_scored_per_glyph': statistics.fmean(scored_per_glyph) if scored_per_glyph else 0.0,
+        'template_count': template_count,
+        'peak_memory_kb': peak_memory / 1024,
+        'failures': failures,
+    }
+
+def compare_with_baseline(result, baseline, max_accuracy_drop=0.0):
+    """与基线比较，返回退化项列表（为空表示没有退化）；语料类型或识别参数不一致时抛出 ValueError"""
+    for key in ('corpus', 'options'):
+        if key in baseline and baseline[key] != result[key]:
+            raise ValueError(f"基线的 {key} 与本次运行不一致: {baseline[key]} ≠ {result[key]}")
+    regressions = []
+    for key in ('captcha_accuracy', 'char_accuracy'):
+        if result[key] < baseline[key] - max_accuracy_drop:
+            regressions.append(f"{key}: {baseline[key]:.4f} → {result[key]:.4f}")
+    return regressions
+
+def print_summary(result):
+    latency = result['latency_ms']
+    print(f"样本数: {result['samples']}")
+    print(f"整张准确率: {result['captcha_accuracy']:.2%}  单字符准确率: {result['char_accuracy']:.2%}")
+    print(f"耗时: p50 {latency['p50']:.2f} ms  p95 {latency['p95']:.2f} ms  平均 {latency['mean']:.2f} ms")
+    print(f"每字符评分模板数: {result['templates_scored_per_glyph']:.1f}/{result['template_count']}")
+    print(f"峰值内存: {result['peak_memory_kb']:.1f} KB")
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="OCR 离线准确率与耗时基准")
+    parser.add_argument("corpus_dir", nargs='?', help="带标注的验证码目录（文件名即标注）")
+    parser.add_argument("--synthetic", type=int, default=0, help="不提供语料时，合成指定数量的验证码")
+    parser.add_argument("--touching", action='store_true', help="合成语料混入粘连字符（切分压力集）")
+    parser.add_argument("--output", help="结果 JSON 输出路径（默认输出到标准输出）")
+    parser.add_argument("--baseline", help="基线结果 JSON，准确率低于基线时退出码为 1")
+    parser.add_argument("--max-accuracy-drop", type=float, default=0.0, help="允许的准确率下降幅度")
+    parser.add_argument("--threshold", default=str(ocr.BINARY_THRESHOLD), help="二值化阈值或 'otsu'")
+    parser.add_argument("--segmentation", default='projection', choices=ocr.SEGMENTATION_MODES)
+    parser.add_argument("--median-size", type=int, default=0)
+    parser.add_argument("--despeckle", type=int, default=0)
+    parser.add_argument("--ensemble", action='store_true')
+    args = parser.parse_args(argv)
+
+    options = {
+        'threshold': int(args.threshold) if args.threshold.isdigit() else args.threshold,
+        'segmentation': args.segmentation,
+        'median_size': args.median_size,
+        'despeckle_strength': args.despeckle,
+        'ensemble': args.ensemble,
+    }
+
+    if args.corpus_dir:
+        corpus = ocr.load_labeled_captchas(args.corpus_dir)
+        corpus_kind = 'directory'
+    elif args.synthetic:
+        corpus_kind = 'synthetic-touching' if args.touching else 'synthetic'
+        with tempfile.TemporaryDirectory() as corpus_dir:
+            write_synthetic_corpus(corpus_dir, args.synthetic, touching=args.touching)
+            corpus = ocr.load_labeled_captchas(corpus_dir)
+    else:
+        parser.error("需要提供语料目录或 --synthetic")
+    if not corpus:
+        parser.error("语料目录中没有验证码图片")
+
+    result = run_benchmark(corpus, corpus_kind, **options)
+    print_summary(result)
+
+    output = json.dumps(result, ensure_ascii=False, indent=2)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            f.write(output)
+    else:
+        print(output)
+
+    if args.baseline:
+        with open(args.baseline, encoding='utf-8') as f:
+            baseline = json.load(f)
+        try:
+            regressions = compare_with_baseline(result, baseline, args.max_accuracy_drop)
+        except ValueError as e:
+            print(f"❌ {e}")
+            return 1
+        if regressions:
+            print("❌ 准确率低于基线: " + "; ".join(regressions))
+            return 1
+        print("✅ 准确率不低于基线")
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
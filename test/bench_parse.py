@@ -0,0 +1,113 @@
+"""
+成绩页解析耗时与内存基准
+
+比较原 BeautifulSoup 实现与 utils/table_extractor 在同一批页面上的：
+    - 每页解析耗时的 p50/p95
+    - 解析过程的峰值内存（tracemalloc）
+    - 两者结果是否一致
+
+用法:
+    python test/bench_parse.py all.html normal.html --kind all normal   # 使用保存下来的教务页面
+    python test/bench_parse.py --courses 2000                          # 无页面时使用合成的大页面
+"""
+import argparse
+import json
+import statistics
+import time
+import tracemalloc
+from pathlib import Path
+import sys
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+
+from utils import table_extractor
+from jwc_pages import sample_courses, render_all_scores, render_normal_scores
+from test_table_extractor import reference_all_scores, reference_normal_scores
+from bench_ocr import percentile
+
+PARSERS = {
+    'all': {'bs4': reference_all_scores, 'extractor': table_extractor.extract_all_scores},
+    'normal': {'bs4': reference_normal_scores, 'extractor': table_extractor.extract_normal_scores},
+}
+
+def measure(func, html, repeat):
+    latencies = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func(html)
+        latencies.append((time.perf_counter() - start) * 1000)
+
+    # 峰值内存单独统计一遍，避免 tracemalloc 的开销计入耗时
+    tracemalloc.start()
+    func(html)
+    _, peak_memory = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    return {
+        'latency_ms': {
+            'p50': percentile(latencies, 50),
+            'p95': percentile(latencies, 95),
+            'mean': statistics.fmean(latencies),
+        },
+        'peak_memory_kb': peak_memory / 1024,
+    }
+
+def run_benchmark(pages, repeat=5):
+    """
+    pages: [(名称, 页面类型 'all'/'normal', html), ...]
+
+    返回:
+        可直接序列化为 JSON 的结果列表
+    """
+    results = []
+    for name, kind, html in pages:
+        parsers = PARSERS[kind]
+        result = {'page': name, 'kind': kind, 'size_kb': len(html.encode('utf-8')) / 1024,
+                  'identical': parsers['bs4'](html) == parsers['extractor'](html)}
+        for parser_name, func in parsers.items():
+            result[parser_name] = measure(func, html, repeat)
+        results.append(result)
+    return results
+
+def print_summary(results):
+    for result in results:
+        print(f"{result['page']} ({result['kind']}, {result['size_kb']:.1f} KB)  结果一致: {result['identical']}")
+        for parser_name in ('bs4', 'extractor'):
+            latency = result[parser_name]['latency_ms']
+            print(f"  {parser_name:<9} p50 {latency['p50']:.2f} ms  p95 {latency['p95']:.2f} ms"
+                  f"  峰值内存 {result[parser_name]['peak_memory_kb']:.1f} KB")
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="成绩页解析耗时与内存基准")
+    parser.add_argument("pages", nargs='*', help="保存下来的成绩页 HTML 文件")
+    parser.add_argument("--kind", nargs='*', choices=PARSERS, help="每个文件的页面类型（默认均为 all）")
+    parser.add_argument("--courses", type=int, default=0, help="不提供页面时，合成指定课程数的全部成绩页与平时成绩页")
+    parser.add_argument("--repeat", type=int, default=5, help="每个页面的解析次数")
+    parser.add_argument("--output", help="结果 JSON 输出路径（默认输出到标准输出）")
+    args = parser.parse_args(argv)
+
+    if args.pages:
+        kinds = args.kind or ['all'] * len(args.pages)
+        if len(kinds) != len(args.pages):
+            parser.error("--kind 的数量需与页面文件数量一致")
+        pages = [(path, kind, Path(path).read_text(encoding='utf-8')) for path, kind in zip(args.pages, kinds)]
+    elif args.courses:
+        records, normal = sample_courses(args.courses)
+        pages = [(f"synthetic-{args.courses}", 'all', render_all_scores(records)),
+                 (f"synthetic-{args.courses}", 'normal', render_normal_scores(normal))]
+    else:
+        parser.error("需要提供页面文件或 --courses")
+
+    results = run_benchmark(pages, args.repeat)
+    print_summary(results)
+
+    output = json.dumps(results, ensure_ascii=False, indent=2)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            f.write(output)
+    else:
+        print(output)
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,128 @@
+"""
+登录 + 抓取成绩的端到端基准（离线，使用 test/jwc_server.py 的本地模拟服务器）
+
+每轮新建一个 ScoreFetcher（或 AsyncScoreFetcher），执行 login() 与 get_combined_scores()，统计：
+    - 每轮耗时的 p50/p95
+    - 每轮发出的请求数，其中登录相关的请求数
+    - 每轮收发的字节数（HTTP 报文体，服务器端统计）
+    - 成功率
+
+用法:
+    python test/bench_pipeline.py --runs 20 --latency 0.05 --captcha-failure-rate 0.3 --courses 200
+    python test/bench_pipeline.py --parallel-sessions 3 --concurrent --output result.json
+    python test/bench_pipeline.py --async
+"""
+import argparse
+import asyncio
+import contextlib
+import io
+import json
+import statistics
+import time
+from pathlib import Path
+import sys
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+
+from utils import fetcher
+from utils.async_fetcher import AsyncScoreFetcher
+from jwc_server import JwcState, start_server
+from bench_ocr import percentile
+
+LOGIN_PATHS = (fetcher.CAPTCHA_PATH, fetcher.LOGIN_API_PATH, fetcher.LOADING_PATH)
+
+def run_once(base_url, options):
+    """执行一轮登录与抓取，返回是否成功"""
+    if options['use_async']:
+        async def run():
+            async with AsyncScoreFetcher('2024000000', 'password', captcha_corpus_dir=None, base_url=base_url) as score_fetcher:
+                if not await score_fetcher.login(max_retries=options['max_retries'], retry_delay=0):
+                    return False
+                return bool(await score_fetcher.get_combined_scores(concurrent=options['concurrent'], delay=0))
+        return asyncio.run(run())
+
+    score_fetcher = fetcher.ScoreFetcher('2024000000', 'password', captcha_corpus_dir=None, base_url=base_url)
+    if not score_fetcher.login(max_retries=options['max_retries'], retry_delay=0,
+                               parallel_sessions=options['parallel_sessions'], stagger=0):
+        return False
+    return bool(score_fetcher.get_combined_scores(concurrent=options['concurrent'], delay=0))
+
+def run_benchmark(state, base_url, runs, **options):
+    """
+    返回:
+        可直接序列化为 JSON 的结果字典
+    """
+    # 预热：构建 OCR 模板库，避免首轮计入冷启动耗时
+    fetcher.ocr.get_template_bank()
+
+    latencies, requests_per_run, login_requests, bytes_per_run = [], [], [], []
+    successes = 0
+    for _ in range(runs):
+        state.reset_stats()
+        start = time.perf_counter()
+        successes += run_once(base_url, options)
+        latencies.append((time.perf_counter() - start) * 1000)
+        stats = dict(state.stats)
+        requests_per_run.append(stats.get('requests', 0))
+        login_requests.append(sum(count for key, count in stats.items() if key.split(' ')[-1] in LOGIN_PATHS))
+        bytes_per_run.append(stats.get('bytes_sent', 0) + stats.get('bytes_received', 0))
+
+    return {
+        'options': options,
+        'server': {'latency': state.latency, 'captcha_failure_rate': state.captcha_failure_rate,
+                   'courses': len(state.records)},
+        'runs': runs,
+        'success_rate': successes / runs if runs else 0.0,
+        'wall_time_ms': {
+            'p50': percentile(latencies, 50),
+            'p95': percentile(latencies, 95),
+            'mean': statistics.fmean(latencies) if latencies else 0.0,
+        },
+        'requests_per_run': statistics.fmean(requests_per_run) if requests_per_run else 0.0,
+        'login_requests_per_run': statistics.fmean(login_requests) if login_requests else 0.0,
+        'bytes_per_run': statistics.fmean(bytes_per_run) if bytes_per_run else 0.0,
+    }
+
+def print_summary(result):
+    wall = result['wall_time_ms']
+    print(f"轮数: {result['runs']}  成功率: {result['success_rate']:.0%}")
+    print(f"耗时: p50 {wall['p50']:.1f} ms  p95 {wall['p95']:.1f} ms  平均 {wall['mean']:.1f} ms")
+    print(f"每轮请求数: {result['requests_per_run']:.1f}（登录 {result['login_requests_per_run']:.1f}）"
+          f"  每轮传输: {result['bytes_per_run'] / 1024:.1f} KB")
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="登录 + 抓取成绩的端到端离线基准")
+    parser.add_argument("--runs", type=int, default=10)
+    parser.add_argument("--latency", type=float, default=0.02, help="模拟服务器每个请求的延迟（秒）")
+    parser.add_argument("--captcha-failure-rate", type=float, default=0.2)
+    parser.add_argument("--courses", type=int, default=50)
+    parser.add_argument("--max-retries", type=int, default=10)
+    parser.add_argument("--parallel-sessions", type=int, default=1)
+    parser.add_argument("--concurrent", action='store_true', help="两个成绩页同时请求")
+    parser.add_argument("--async", dest='use_async', action='store_true', help="使用 AsyncScoreFetcher")
+    parser.add_argument("--output", help="结果 JSON 输出路径（默认输出到标准输出）")
+    parser.add_argument("--verbose", action='store_true', help="显示登录与抓取过程的输出")
+    args = parser.parse_args(argv)
+
+    state = JwcState(args.latency, args.captcha_failure_rate, args.courses)
+    server, base_url = start_server(state)
+    try:
+        with contextlib.nullcontext() if args.verbose else contextlib.redirect_stdout(io.StringIO()):
+            result = run_benchmark(state, base_url, args.runs, max_retries=args.max_retries,
+                                   parallel_sessions=args.parallel_sessions, concurrent=args.concurrent,
+                                   use_async=args.use_async)
+    finally:
+        server.shutdown()
+        server.server_close()
+    print_summary(result)
+
+    output = json.dumps(result, ensure_ascii=False, indent=2)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            f.write(output)
+    else:
+        print(output)
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,81 @@
+"""测试共用的替身：假响应、内存存储，以及按路径返回页面的 ScoreFetcher（同 jwc_pages，由测试文件直接导入）"""
+import time
+from pathlib import Path
+import sys
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from utils import fetcher
+
+BASE = 'http://127.0.0.1:8000'
+
+class FakeResponse:
+    """requests.Response 的替身，只有各测试用到的属性"""
+    def __init__(self, text='', url=None, content=b'', payload=None, status_code=200, history=()):
+        self.text = text
+        self.url = url
+        self.content = content
+        self.payload = payload
+        self.status_code = status_code
+        self.reason = 'OK'
+        self.history = list(history)
+
+    def raise_for_status(self):
+        pass
+
+    def json(self):
+        return self.payload
+
+class MemoryStore:
+    """单个账号的内存存储，接口与 database.GistStore 相同（会话、成绩与指纹）"""
+    def __init__(self, token=None):
+        self.token = token
+        self.scores, self.fingerprints = [], None
+        # saves 为会话的保存次数，writes 为成绩与指纹的写入次数
+        self.saves, self.writes = 0, 0
+
+    def get_session(self):
+        return self.token
+
+    def save_session(self, token):
+        self.token, self.saves = token, self.saves + 1
+        return True
+
+    def get_latest_scores(self):
+        return self.scores
+
+    def save_scores(self, scores, ttl_seconds=None, fingerprints=None):
+        self.scores, self.writes = scores, self.writes + 1
+        if fingerprints:
+            self.fingerprints = fingerprints
+        return 'saved'
+
+    def get_fingerprints(self):
+        return self.fingerprints
+
+    def save_fingerprints(self, fingerprints):
+        self.fingerprints, self.writes = fingerprints, self.writes + 1
+        return True
+
+def make_fetcher(**kwargs):
+    """地址为 BASE 的 ScoreFetcher，不做协议检测；kwargs 透传给 ScoreFetcher"""
+    return fetcher.ScoreFetcher('2024000000', 'password', base_url=BASE, **kwargs)
+
+def serve_pages(score_fetcher, pages, latency=0):
+    """
+    把 score_fetcher.session.get 换成按路径返回 pages[路径] 的假请求
+
+    参数:
+        pages: {路径: HTML}；为字符串时所有路径都返回它
+        latency: 每个请求的模拟网络耗时（秒）
+
+    返回:
+        依次记录请求路径的列表
+    """
+    requested = []
+    def fake_get(url, **kwargs):
+        time.sleep(latency)
+        path = url[len(BASE):]
+        requested.append(path)
+        return FakeResponse(pages if isinstance(pages, str) else pages[path], url=url)
+    score_fetcher.session.get = fake_get
+    return requested
@@ -0,0 +1,61 @@
+"""
+仿照教务成绩页结构生成的测试页面
+
+    - 全部成绩页：id 为 table3 的表格，首行为表头（th），其余每行一门课程
+    - 平时成绩页：id 为 table3 的表格，每行 11 列为一条平时成绩，
+      colspan="11" 的单列行为上一门课程的总结
+"""
+import random
+from html import escape
+
+ALL_SCORES_HEADER = ['序号', '学期', '课程代码', '课程名称', '课程性质', '学分', '成绩', '教师', '考试类型', '备注', '提交时间']
+ITEM_NAMES = ['作业', '考勤', '实验', '期中', '课堂测验']
+
+def sample_courses(count, seed=1):
+    """生成 count 门课程的 (全部成绩记录, 平时成绩明细)，按提交时间从新到旧排列"""
+    rng = random.Random(seed)
+    records = []
+    normal = []
+    for i in range(count):
+        course = f"课程{i:03d}"
+        teacher = f"教师{rng.randrange(50):02d}"
+        date = f"2024-{12 - i % 12:02d}-{28 - i % 28:02d} 10:{i % 60:02d}"
+        records.append({
+            '序号': str(i + 1), '学期': f"2024-2025-{i % 2 + 1}", '课程代码': f"C{i:05d}",
+            '课程名称': course, '课程性质': rng.choice(['必修', '选修']), '学分': str(rng.choice([1, 2, 3, 4])),
+            '成绩': str(rng.randrange(60, 100)), '教师': teacher, '考试类型': '正常考试', '备注': '',
+            '提交时间': date,
+        })
+        details = [{
+            '平时成绩名称': name,
+            '成绩': str(rng.randrange(60, 100)),
+            '占比': f"{rng.choice([10, 20, 30])}%",
+            '提交时间': date,
+        } for name in rng.sample(ITEM_NAMES, rng.randrange(1, 4))]
+        normal.append({'课程名称': course, '教师': teacher, '详情': details, '总结': f"{course} 平时成绩合计"})
+    return records, normal
+
+def _cell(text, attrs=''):
+    return f"<td{attrs}>\n\t\t\t{escape(text)}\n\t\t</td>"
+
+def render_all_scores(records):
+    rows = ["<tr>" + "".join(f"<th>{escape(h)}</th>" for h in ALL_SCORES_HEADER) + "</tr>"]
+    for record in records:
+        rows.append("<tr>" + "".join(_cell(record[h]) for h in ALL_SCORES_HEADER) + "</tr>")
+    return _page("全部成绩", rows)
+
+def render_normal_scores(courses):
+    rows = ["<tr>" + "".join(f"<th>列{i}</th>" for i in range(11)) + "</tr>"]
+    for n, course in enumerate(courses):
+        for detail in course['详情']:
+            cols = [str(n + 1), '2024-2025-1', f"C{n:05d}", course['课程名称'], '01', course['教师'],
+                    detail['平时成绩名称'], detail['占比'], detail['成绩'], '', detail['提交时间']]
+            rows.append("<tr>" + "".join(_cell(c) for c in cols) + "</tr>")
+        rows.append("<tr>" + _cell(course['总结'], ' colspan="11"') + "</tr>")
+    return _page("平时成绩", rows)
+
+def _page(title, rows):
+    return (f"<html><head><title>{title}</title></head><body>"
+            f"<table id='table1'><tr><td>导航</td></tr></table>"
+            f"<table id=\"table3\" class=\"table_border\">\n" + "\n".join(rows) + "\n</table>"
+            f"</body></html>")
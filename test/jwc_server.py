@@ -0,0 +1,185 @@
+"""
+本地模拟的教务服务器，用于离线测试与基准
+
+提供 ScoreFetcher 用到的全部接口：
+    - GetRandomNumberToJPEG   返回验证码图片（模板合成），答案记在该会话中
+    - UserLoginAction         校验密码与验证码，返回与教务相同格式的 JSON
+    - UserLoadingAction       登录后的加载页
+    - StudentScoreInfoAction  全部成绩页（studentScoreQuery）与平时成绩页（studentNormalMark），
+                              未登录时与教务一样跳回登录页
+会话用 JSESSIONID Cookie 区分。可配置每个请求的延迟、验证码失败率（按该概率让服务器的答案与图片不一致，
+模拟识别错误）、成绩页规模（课程数），也可以改为回放保存下来的成绩页 HTML。
+客户端声明支持 gzip 时压缩响应。stats 记录请求数与收发字节数。
+
+用法:
+    python test/jwc_server.py --port 8000 --latency 0.05 --captcha-failure-rate 0.3 --courses 200
+    JWC_BASE_URL=http://127.0.0.1:8000 python actions/index.py check
+"""
+import argparse
+import gzip
+import json
+import random
+import secrets
+import string
+import threading
+import time
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from urllib.parse import parse_qs, urlparse
+import sys
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+
+from utils import fetcher
+from jwc_pages import sample_courses, render_all_scores, render_normal_scores
+
+class JwcState:
+    """服务器配置、各会话状态与统计"""
+    def __init__(self, latency=0.0, captcha_failure_rate=0.0, courses=20, password='password',
+                 all_scores_html=None, normal_scores_html=None, seed=1):
+        self.latency = latency
+        self.captcha_failure_rate = captcha_failure_rate
+        self.password = password
+        records, normal = sample_courses(courses, seed)
+        self.records, self.normal = records, normal
+        self.pages = {
+            'studentScoreQuery': all_scores_html or render_all_scores(records),
+            'studentNormalMark': normal_scores_html or render_normal_scores(normal),
+        }
+        self.rng = random.Random(seed)
+        self.lock = threading.Lock()
+        self.sessions = {}  # {JSESSIONID: {'captcha': 答案, 'logged_in': bool}}
+        self.captcha_images = {}
+        self.stats = Counter()
+
+    def captcha(self):
+        """返回 (图片中的文字, 服务器认可的答案)"""
+        from test_matcher import make_captcha
+        with self.lock:
+            text = ''.join(self.rng.choice(string.ascii_uppercase) for _ in range(4))
+            answer = text
+            if self.rng.random() < self.captcha_failure_rate:
+                answer = text[::-1] if text != text[::-1] else text.lower()
+            if text not in self.captcha_images:
+                self.captcha_images[text] = make_captcha(text, random.Random(text))
+            return self.captcha_images[text], answer
+
+    def reset_stats(self):
+        with self.lock:
+            self.stats.clear()
+
+class JwcHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    state = None  # 由 start_server 绑定
+
+    def log_message(self, *args):
+        pass
+
+    def _session(self):
+        cookies = dict(part.strip().split('=', 1) for part in self.headers.get('Cookie', '').split(';') if '=' in part)
+        session_id = cookies.get('JSESSIONID')
+        with self.state.lock:
+            if session_id in self.state.sessions:
+                return session_id, self.state.sessions[session_id], False
+            session_id = secrets.token_hex(8)
+            self.state.sessions[session_id] = {'captcha': None, 'logged_in': False}
+            return session_id, self.state.sessions[session_id], True
+
+    def _send(self, status, body=b'', content_type='text/html; charset=utf-8', headers=()):
+        if isinstance(body, str):
+            body = body.encode('utf-8')
+        extra = list(headers)
+        if body and 'gzip' in self.headers.get('Accept-Encoding', ''):
+            body = gzip.compress(body)
+            extra.append(('Content-Encoding', 'gzip'))
+        self.send_response(status)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        for name, value in extra:
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+        with self.state.lock:
+            self.state.stats['bytes_sent'] += len(body)
+
+    def _handle(self, method):
+        time.sleep(self.state.latency)
+        url = urlparse(self.path)
+        length = int(self.headers.get('Content-Length') or 0)
+        form = {key: values[0] for key, values in parse_qs(self.rfile.read(length).decode('utf-8')).items()}
+        with self.state.lock:
+            self.state.stats['requests'] += 1
+            self.state.stats[f"{method} {url.path}"] += 1
+            self.state.stats['bytes_received'] += length
+        session_id, session, created = self._session()
+        cookie = [('Set-Cookie', f"JSESSIONID={session_id}; Path=/")] if created else []
+
+        if url.path == fetcher.CAPTCHA_PATH:
+            image, session['captcha'] = self.state.captcha()
+            return self._send(200, image, 'image/png', cookie)
+        if url.path == fetcher.LOGIN_API_PATH and method == 'POST':
+            if form.get('ranstring', '') != session['captcha']:
+                result = {'loginStatus': '0', 'loginMsg': '验证码错误'}
+            elif form.get('password') != self.state.password:
+                result = {'loginStatus': '0', 'loginMsg': '用户名或密码错误'}
+            else:
+                session['logged_in'] = True
+                result = {'loginStatus': '1', 'loginMsg': '登录成功，正在进入系统'}
+            session['captcha'] = None  # 验证码只能使用一次
+            return self._send(200, json.dumps(result, ensure_ascii=False), 'application/json; charset=utf-8', cookie)
+        if url.path == fetcher.LOADING_PATH:
+            return self._send(200, '<html>正在进入系统</html>', headers=cookie)
+        if url.path == urlparse(fetcher.ALL_SCORES_PATH).path:
+            if not session['logged_in']:
+                return self._send(302, headers=cookie + [('Location', fetcher.LOGIN_PAGE_PATH)])
+            page = self.state.pages.get(parse_qs(url.query).get('setAction', [''])[0])
+            if page is not None:
+                return self._send(200, page, headers=cookie)
+        if url.path == fetcher.LOGIN_PAGE_PATH:
+            return self._send(200, '<html><form id="login">请登录</form></html>', headers=cookie)
+        return self._send(404, 'not found', headers=cookie)
+
+    def do_GET(self):
+        self._handle('GET')
+
+    def do_POST(self):
+        self._handle('POST')
+
+def start_server(state, host='127.0.0.1', port=0):
+    """在后台线程启动服务器，返回 (server, base_url)；用完调用 server.shutdown() 与 server.server_close()"""
+    handler = type('BoundJwcHandler', (JwcHandler,), {'state': state})
+    server = ThreadingHTTPServer((host, port), handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://{host}:{server.server_address[1]}"
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="本地模拟的教务服务器")
+    parser.add_argument("--host", default='127.0.0.1')
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--latency", type=float, default=0.0, help="每个请求的延迟（秒）")
+    parser.add_argument("--captcha-failure-rate", type=float, default=0.0, help="验证码答案与图片不一致的概率")
+    parser.add_argument("--courses", type=int, default=20, help="合成成绩页的课程数")
+    parser.add_argument("--password", default='password')
+    parser.add_argument("--all-scores-html", help="回放保存下来的全部成绩页")
+    parser.add_argument("--normal-scores-html", help="回放保存下来的平时成绩页")
+    args = parser.parse_args(argv)
+
+    read = lambda path: Path(path).read_text(encoding='utf-8') if path else None
+    state = JwcState(args.latency, args.captcha_failure_rate, args.courses, args.password,
+                     read(args.all_scores_html), read(args.normal_scores_html))
+    server, base_url = start_server(state, args.host, args.port)
+    print(f"模拟教务服务器已启动: {base_url}（Ctrl+C 退出）")
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.shutdown()
+        server.server_close()
+        print(json.dumps(dict(state.stats), ensure_ascii=False, indent=2))
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -11,9 +11,10 @@ sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
 from ocr import ocr  # 导入自定义OCR模块
 
 import config  # 从配置文件导入账号密码
+from utils.fetcher import resolve_base_url
 
 # --- 配置与常量 ---
-BASE_URL = "https://jwc.swjtu.edu.cn"
+BASE_URL = resolve_base_url()  # 协议检测结果带缓存，见 utils/fetcher.py
 LOGIN_PAGE_URL = f"{BASE_URL}/service/login.html"
 LOGIN_API_URL = f"{BASE_URL}/vatuu/UserLoginAction"
 CAPTCHA_URL = f"{BASE_URL}/vatuu/GetRandomNumberToJPEG"
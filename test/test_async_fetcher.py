@@ -0,0 +1,92 @@
+import asyncio
+from pathlib import Path
+import sys
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import httpx
+
+from utils import fetcher
+from utils.async_fetcher import AsyncScoreFetcher
+from jwc_pages import sample_courses, render_all_scores, render_normal_scores
+from test_matcher import make_captcha
+
+BASE = 'http://127.0.0.1:8000'
+CAPTCHA = 'ABCD'
+
+def make_handler(courses=5, latency=0.0, stats=None):
+    """模拟教务接口的 httpx 异步处理函数；stats 记录同时处理中的最大请求数"""
+    records, normal = sample_courses(courses)
+    pages = {fetcher.ALL_SCORES_PATH: render_all_scores(records), fetcher.NORMAL_SCORES_PATH: render_normal_scores(normal)}
+    captcha_bytes = make_captcha(CAPTCHA)
+    stats = stats if stats is not None else {}
+
+    async def handler(request):
+        stats['active'] = stats.get('active', 0) + 1
+        stats['peak'] = max(stats.get('peak', 0), stats['active'])
+        try:
+            await asyncio.sleep(latency)
+            path = request.url.raw_path.decode()
+            if path.startswith(fetcher.CAPTCHA_PATH):
+                return httpx.Response(200, content=captcha_bytes)
+            if path == fetcher.LOGIN_API_PATH:
+                ok = f"ranstring={CAPTCHA}" in request.content.decode()
+                return httpx.Response(200, json={'loginStatus': '1' if ok else '0', 'loginMsg': '登录成功' if ok else '验证码错误'})
+            if path == fetcher.LOADING_PATH:
+                return httpx.Response(200, text='ok')
+            return httpx.Response(200, text=pages[path])
+        finally:
+            stats['active'] -= 1
+    return handler
+
+def make_fetcher(handler, **kwargs):
+    score_fetcher = AsyncScoreFetcher('2024000000', 'password', base_url=BASE, **kwargs)
+    score_fetcher.client = httpx.AsyncClient(transport=httpx.MockTransport(handler), follow_redirects=True)
+    return score_fetcher
+
+def sync_combined(courses=5):
+    records, normal = sample_courses(courses)
+    return fetcher.merge_scores(fetcher.parse_all_scores(render_all_scores(records)),
+                                fetcher.parse_normal_scores(render_normal_scores(normal)))
+
+def test_login_and_combined_scores_match_sync():
+    async def run():
+        async with make_fetcher(make_handler()) as score_fetcher:
+            assert await score_fetcher.login(max_retries=1, retry_delay=0)
+            return await score_fetcher.get_combined_scores(delay=0)
+    assert asyncio.run(run()) == sync_combined()
+
+def test_host_concurrency_limit_shared_across_fetchers():
+    stats = {}
+    handler = make_handler(latency=0.02, stats=stats)
+
+    async def one_account():
+        async with make_fetcher(handler, host_concurrency=2) as score_fetcher:
+            score_fetcher.is_logged_in = True
+            return await score_fetcher.get_combined_scores(concurrent=True)
+
+    async def run():
+        return await asyncio.gather(*(one_account() for _ in range(6)))
+
+    results = asyncio.run(run())
+    assert all(result == sync_combined() for result in results)
+    assert stats['peak'] == 2
+
+def test_event_loop_not_blocked_during_fetch():
+    ticks = []
+
+    async def ticker(stop):
+        while not stop.is_set():
+            ticks.append(1)
+            await asyncio.sleep(0.01)
+
+    async def run():
+        stop = asyncio.Event()
+        tick_task = asyncio.create_task(ticker(stop))
+        async with make_fetcher(make_handler(latency=0.1)) as score_fetcher:
+            score_fetcher.is_logged_in = True
+            await score_fetcher.get_combined_scores(delay=0)
+        stop.set()
+        await tick_task
+
+    asyncio.run(run())
+    assert len(ticks) >= 10
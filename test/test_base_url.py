@@ -0,0 +1,71 @@
+from pathlib import Path
+import sys
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import pytest
+import requests
+
+from utils import fetcher
+from fakes import FakeResponse
+
+@pytest.fixture
+def probes(monkeypatch):
+    """把协议探测改为本地假响应：https 被重定向到 http，并记录探测次数"""
+    calls = []
+    def fake_get(url, **kwargs):
+        calls.append(url)
+        redirect = FakeResponse(url=url, status_code=302)
+        return FakeResponse(url=url.replace('https://', 'http://'), history=[redirect])
+    monkeypatch.setattr(fetcher.requests, 'get', fake_get)
+    monkeypatch.setattr(fetcher, '_resolved_base_url', None)
+    return calls
+
+def test_resolve_uses_cache_file(tmp_path, probes):
+    cache_path = str(tmp_path / 'base_url.json')
+    assert fetcher.resolve_base_url(cache_path=cache_path) == 'http://jwc.swjtu.edu.cn'
+    assert len(probes) == 1
+    details = fetcher.load_cached_base_url(cache_path)
+    assert details['redirects'] == [['https://jwc.swjtu.edu.cn/', 302]]
+
+    # 新进程（进程内缓存为空）直接读取缓存文件，不再探测
+    fetcher._resolved_base_url = None
+    assert fetcher.resolve_base_url(cache_path=cache_path) == 'http://jwc.swjtu.edu.cn'
+    assert len(probes) == 1
+
+    # 过期或强制刷新时重新探测
+    fetcher._resolved_base_url = None
+    fetcher.resolve_base_url(cache_path=cache_path, ttl=0)
+    fetcher.resolve_base_url(cache_path=cache_path, refresh=True)
+    assert len(probes) == 3
+
+def test_failed_probe_is_not_cached(tmp_path, monkeypatch):
+    def unreachable(url, **kwargs):
+        raise requests.exceptions.ConnectionError(url)
+    monkeypatch.setattr(fetcher.requests, 'get', unreachable)
+    monkeypatch.setattr(fetcher, '_resolved_base_url', None)
+    cache_path = str(tmp_path / 'base_url.json')
+    assert fetcher.resolve_base_url(cache_path=cache_path) == 'http://jwc.swjtu.edu.cn'
+    assert fetcher.load_cached_base_url(cache_path) is None
+
+def test_corrupt_cache_is_ignored(tmp_path):
+    cache_path = tmp_path / 'base_url.json'
+    cache_path.write_text('{not json')
+    assert fetcher.load_cached_base_url(str(cache_path)) is None
+
+def test_explicit_base_url_skips_detection(probes):
+    score_fetcher = fetcher.ScoreFetcher('user', 'password', base_url='http://127.0.0.1:8000/')
+    assert score_fetcher.url(fetcher.LOGIN_PAGE_PATH) == 'http://127.0.0.1:8000/service/login.html'
+    assert score_fetcher.session.headers['Origin'] == 'http://127.0.0.1:8000'
+    assert not probes
+
+def test_origin_set_when_base_url_resolved(monkeypatch):
+    monkeypatch.setattr(fetcher, 'BASE_URL_OVERRIDE', None)
+    monkeypatch.setattr(fetcher, 'resolve_base_url', lambda refresh=False: 'http://jwc.swjtu.edu.cn')
+    score_fetcher = fetcher.ScoreFetcher('user', 'password')
+    assert 'Origin' not in score_fetcher.session.headers
+    assert score_fetcher.base_url == 'http://jwc.swjtu.edu.cn'
+    assert score_fetcher.session.headers['Origin'] == 'http://jwc.swjtu.edu.cn'
+    # 读取 base_url 没有副作用
+    del score_fetcher.session.headers['Origin']
+    assert score_fetcher.url('/') == 'http://jwc.swjtu.edu.cn/'
+    assert 'Origin' not in score_fetcher.session.headers
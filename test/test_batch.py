@@ -0,0 +1,96 @@
+import asyncio
+from pathlib import Path
+import sys
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import pytest
+
+from utils import batch, fetcher, monitor, session_cache, transport
+from utils.async_fetcher import AsyncScoreFetcher
+from jwc_server import JwcState, start_server
+from fakes import MemoryStore
+
+@pytest.fixture
+def jwc(tmp_path, monkeypatch):
+    cache_path = str(tmp_path / 'fingerprints.json')
+    monkeypatch.setattr(monitor, 'load_cached_fingerprints', lambda username: fetcher.load_cached_fingerprints(username, cache_path))
+    monkeypatch.setattr(monitor, 'save_cached_fingerprints',
+                        lambda username, fingerprints: fetcher.save_cached_fingerprints(username, fingerprints, cache_path))
+    state = JwcState(captcha_failure_rate=0.3, courses=12, seed=5)
+    server, base_url = start_server(state)
+    monkeypatch.setattr(fetcher, 'BASE_URL_OVERRIDE', base_url)
+    yield state
+    transport.set_rate_limit(base_url, 0)
+    server.shutdown()
+    server.server_close()
+
+def test_batch_isolates_accounts_and_reuses_fingerprints(jwc, tmp_path):
+    accounts = [{'username': f'202400000{i}', 'password': 'password'} for i in range(3)]
+    accounts.append({'username': '2024000009', 'password': 'wrong', 'email': 'other@example.com'})
+    stores = {account['username']: MemoryStore() for account in accounts}
+    notified = []
+    breaker = fetcher.CircuitBreaker(str(tmp_path / 'breaker.json'), threshold=1)
+    breaker.state['failures'] = 1
+
+    def run():
+        return batch.monitor_accounts(accounts, lambda account, changes: notified.append(account['username']),
+                                      store_for=stores.get, breaker=breaker, workers=3, rate_limit=200,
+                                      captcha_corpus_dir=None)
+
+    report = run()
+    assert [entry['status'] for entry in report['accounts']] == ['success'] * 3 + ['error']
+    assert report['succeeded'] == 3 and report['failed'] == 1
+    assert sorted(notified) == [account['username'] for account in accounts[:3]]
+    expected = fetcher.merge_scores([dict(record) for record in jwc.records], jwc.normal)
+    assert all(stores[account['username']].scores == expected for account in accounts[:3])
+    assert stores['2024000009'].writes == 0
+    assert report['host_requests'] == jwc.stats['requests']
+    assert report['accounts'][0]['result']['timings'].keys() >= {'login', 'fetch', 'notify', 'save'}
+    # 有账号连上了服务器，熔断器复位
+    assert breaker.state['failures'] == 0
+
+    # 第二次运行：各账号的指纹互不干扰，全部走快速路径
+    report = run()
+    assert [entry['result']['fast_path'] for entry in report['accounts'][:3]] == ['fingerprint'] * 3
+    assert len(notified) == 3
+
+def test_async_monitor_matches_sync_flow(jwc):
+    store, notified = MemoryStore(), []
+
+    async def run():
+        async with AsyncScoreFetcher('2024000000', 'password', captcha_corpus_dir=None) as score_fetcher:
+            return await monitor.async_monitor_account(score_fetcher, store, notified.append)
+
+    result = asyncio.run(run())
+    assert result['changes_count'] == len(notified[0]) > 0
+    assert store.scores == fetcher.merge_scores([dict(record) for record in jwc.records], jwc.normal)
+    assert result['timings'].keys() >= {'login', 'fetch', 'notify', 'save'}
+    # 第二次运行走指纹快速路径，不再通知、不再写存储
+    assert asyncio.run(run())['fast_path'] == 'fingerprint'
+    assert len(notified) == 1 and store.writes == 1
+
+def test_async_monitor_login_failure_is_reported(jwc):
+    async def run():
+        async with AsyncScoreFetcher('2024000000', 'wrong', captcha_corpus_dir=None) as score_fetcher:
+            return await monitor.async_monitor_account(score_fetcher, MemoryStore(), print)
+
+    with pytest.raises(monitor.MonitorFailure) as failure:
+        asyncio.run(run())
+    assert failure.value.args[0]['status'] == 'error'
+
+def test_rate_limiter_spaces_requests():
+    now = [0.0]
+    limiter = transport.RateLimiter(rate=10, burst=2, clock=lambda: now[0])
+    assert [limiter.reserve() for _ in range(4)] == pytest.approx([0, 0, 0.1, 0.2])
+    now[0] = 1.0
+    assert limiter.reserve() == 0
+
+def test_parse_accounts():
+    content = '[{"username": 2024000000, "password": "p"}, {"username": "2024000001", "password": "q", "email": "a@b.c"}]'
+    accounts = batch.parse_accounts(content, key=None)
+    assert [account['username'] for account in accounts] == ['2024000000', '2024000001']
+    assert batch.parse_accounts(session_cache.encrypt(content.encode(), 'secret'), key='secret') == accounts
+    for bad in ('[{"username": "1", "password": "p"}, {"username": "1", "password": "q"}]',
+                '[{"username": "1"}]', '{"username": "1"}', 'not json'):
+        with pytest.raises(ValueError):
+            batch.parse_accounts(bad, key=None)
@@ -0,0 +1,83 @@
+import io
+import random
+from pathlib import Path
+import sys
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import pytest
+from PIL import Image
+
+from utils import fetcher, ocr
+from test_matcher import make_captcha
+
+LETTERS = [chr(ord('A') + i) for i in range(26)]
+
+# 离线语料：(名称, 背景灰度, 字符灰度, 噪点密度)
+CORPORA = [
+    ("标准", 200, 0, 0.0),
+    ("低对比度", 170, 110, 0.0),
+    ("暗背景", 90, 20, 0.0),
+    ("噪点", 200, 0, 0.03),
+    ("低对比度+噪点", 170, 110, 0.03),
+]
+
+# 预处理方案：(名称, classify 参数)
+VARIANTS = [
+    ("固定阈值94", {}),
+    ("Otsu", {'threshold': 'otsu'}),
+    ("Otsu+去噪点", {'threshold': 'otsu', 'despeckle_strength': 2}),
+    ("中值滤波+Otsu", {'threshold': 'otsu', 'median_size': 3}),
+]
+
+def build_corpus(background, foreground, noise, count=40, seed=3):
+    rng = random.Random(seed)
+    corpus = []
+    for _ in range(count):
+        label = ''.join(rng.sample(LETTERS, 4))
+        corpus.append((label, make_captcha(label, rng, size=(64, 20), noise=noise,
+                                           background=background, foreground=foreground)))
+    return corpus
+
+def single_attempt_rate(corpus, **options):
+    hits = sum(ocr.classify(image_bytes, debug=False, **options) == label for label, image_bytes in corpus)
+    return hits / len(corpus)
+
+def test_otsu_threshold_separates_modes():
+    img = Image.new('L', (20, 10), 170)
+    img.paste(110, (5, 2, 12, 8))
+    threshold = ocr.otsu_threshold(img)
+    assert 110 < threshold <= 170
+
+def test_despeckle_removes_isolated_pixels():
+    img = Image.new('1', (12, 12), 1)
+    img.putpixel((2, 2), 0)
+    img.paste(0, (6, 6, 10, 10))
+    cleaned = ocr.despeckle(img, 2)
+    assert cleaned.getpixel((2, 2)) != 0
+    assert all(cleaned.getpixel((x, y)) == 0 for x in range(6, 10) for y in range(6, 10))
+    assert ocr.despeckle(img, 0) is img
+
+def test_parse_ocr_threshold():
+    assert fetcher.parse_ocr_threshold('94') == 94
+    assert fetcher.parse_ocr_threshold(' OTSU ') == 'otsu'
+    for bad in ('auto', '128.0', '-1', '300', ''):
+        with pytest.raises(ValueError):
+            fetcher.parse_ocr_threshold(bad)
+
+def test_parse_ocr_segmentation():
+    assert fetcher.parse_ocr_segmentation(' Auto ') == 'auto'
+    for bad in ('projectoin', ''):
+        with pytest.raises(ValueError):
+            fetcher.parse_ocr_segmentation(bad)
+
+def test_adaptive_binarization_not_worse():
+    for _, background, foreground, noise in CORPORA:
+        corpus = build_corpus(background, foreground, noise, count=10)
+        assert single_attempt_rate(corpus, threshold='otsu') >= single_attempt_rate(corpus)
+
+if __name__ == '__main__':
+    print(f"{'语料':<12}" + "".join(f"{name:>14}" for name, _ in VARIANTS))
+    for name, background, foreground, noise in CORPORA:
+        corpus = build_corpus(background, foreground, noise)
+        rates = [single_attempt_rate(corpus, **options) for _, options in VARIANTS]
+        print(f"{name:<12}" + "".join(f"{rate:>14.1%}" for rate in rates))
@@ -0,0 +1,42 @@
+import time
+from pathlib import Path
+import sys
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from utils import fetcher
+from jwc_pages import sample_courses, render_all_scores, render_normal_scores
+from fakes import make_fetcher, serve_pages
+
+# 每个页面请求的模拟网络耗时（秒）
+LATENCY = 0.2
+
+def timed_combined(courses=5, **options):
+    records, normal = sample_courses(courses)
+    score_fetcher = make_fetcher()
+    score_fetcher.is_logged_in = True
+    serve_pages(score_fetcher, {fetcher.ALL_SCORES_PATH: render_all_scores(records),
+                                fetcher.NORMAL_SCORES_PATH: render_normal_scores(normal)}, LATENCY)
+    start = time.perf_counter()
+    result = score_fetcher.get_combined_scores(**options)
+    return result, time.perf_counter() - start, records, normal
+
+def test_combined_scores_merge():
+    result, _, records, normal = timed_combined(delay=0)
+    assert [r['课程名称'] for r in result] == [r['课程名称'] for r in records]
+    assert all(r['平时成绩详情'] == n['详情'] and r['平时成绩总结'] == n['总结'] for r, n in zip(result, normal))
+
+def test_concurrent_matches_sequential_and_is_faster():
+    sequential, sequential_time, _, _ = timed_combined(delay=0)
+    concurrent, concurrent_time, _, _ = timed_combined(concurrent=True)
+    assert concurrent == sequential
+    assert sequential_time >= 2 * LATENCY
+    assert concurrent_time < 1.5 * LATENCY
+
+def test_politeness_delay_is_configurable():
+    _, elapsed, _, _ = timed_combined(delay=0.1)
+    assert elapsed >= 2 * LATENCY + 0.1
+
+if __name__ == '__main__':
+    for name, options in [("顺序+间隔1秒（原行为）", {'delay': 1}), ("顺序无间隔", {'delay': 0}), ("并发", {'concurrent': True})]:
+        _, elapsed, _, _ = timed_combined(**options)
+        print(f"{name:<16}{elapsed * 1000:>8.0f} ms")
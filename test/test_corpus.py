@@ -0,0 +1,65 @@
+import io
+import os
+import random
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+import sys
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from PIL import Image
+
+from utils import ocr
+from utils.train_templates import train_templates
+from test_matcher import make_captcha
+
+def test_classify_memo():
+    image_bytes = make_captcha('MEMO')
+    ocr._OCR_MEMO.clear()
+    first = ocr.classify(image_bytes, debug=False, return_details=True)
+    assert len(ocr._OCR_MEMO) == 1
+    assert ocr.classify(image_bytes, debug=False, return_details=True) is first
+    assert ocr.classify(image_bytes, debug=False, return_details=True, use_memo=False) is not first
+    ocr.classify(image_bytes, debug=False, threshold='otsu')
+    assert len(ocr._OCR_MEMO) == 2
+
+def test_classify_memo_is_thread_safe(monkeypatch):
+    # 容量很小时多个线程同时命中、写入和淘汰缓存
+    monkeypatch.setattr(ocr, 'OCR_MEMO_SIZE', 2)
+    ocr._OCR_MEMO.clear()
+    images = [make_captcha(text) for text in ('ABCD', 'EFGH', 'JKLM', 'NPQR')]
+    expected = [ocr.classify(image_bytes, debug=False, use_memo=False) for image_bytes in images]
+    with ThreadPoolExecutor(max_workers=8) as pool:
+        results = list(pool.map(lambda image_bytes: ocr.classify(image_bytes, debug=False), images * 25))
+    assert results == expected * 25
+    assert len(ocr._OCR_MEMO) <= 2
+
+def test_labeled_corpus_round_trip():
+    with tempfile.TemporaryDirectory() as corpus_dir:
+        image_bytes = make_captcha('ABCD')
+        path = ocr.save_labeled_captcha(corpus_dir, 'abcd', image_bytes)
+        assert os.path.basename(path).startswith('ABCD_') and path.endswith('.png')
+        assert ocr.load_labeled_captchas(corpus_dir) == [(os.path.basename(path), 'ABCD', image_bytes)]
+
+def test_train_templates_from_corpus():
+    rng = random.Random(2)
+    letters = [chr(ord('A') + i) for i in range(26)]
+    with tempfile.TemporaryDirectory() as corpus_dir, tempfile.TemporaryDirectory() as output_dir:
+        for _ in range(40):
+            label = ''.join(rng.sample(letters, 4))
+            ocr.save_labeled_captcha(corpus_dir, label, make_captcha(label, rng))
+        written = train_templates(corpus_dir, output_dir, mode='rebuild', min_samples=2)
+        assert written and sorted(os.listdir(output_dir)) == [f"{char}.png" for char in written]
+
+        bank = ocr.TemplateBank(output_dir).build()
+        assert bank.source == 'png'
+        for _, label, image_bytes in ocr.load_labeled_captchas(corpus_dir)[:5]:
+            if set(label) <= set(written):
+                glyphs = ocr.segment_characters(ocr.binarize(Image.open(io.BytesIO(image_bytes))), debug=False)
+                assert ''.join(ocr.recognize_character(g, bank, debug=False) for g in glyphs) == label
+
+if __name__ == '__main__':
+    test_classify_memo()
+    test_labeled_corpus_round_trip()
+    test_train_templates_from_corpus()
+    print("✅ 识别缓存与语料工具正常")
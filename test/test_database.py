@@ -0,0 +1,55 @@
+import json
+import os
+from pathlib import Path
+import sys
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+os.environ.setdefault("GIST_PAT", "test-token")
+
+import pytest
+
+from utils import database
+from fakes import FakeResponse
+
+class FakeGistApi:
+    """内存中的 Gist，记录读取次数"""
+    def __init__(self, files):
+        self.files = dict(files)
+        self.reads = 0
+
+    def get(self, url, **kwargs):
+        self.reads += 1
+        return FakeResponse(payload={"files": {name: {"content": content} for name, content in self.files.items()}})
+
+    def patch(self, url, json=None, **kwargs):
+        self.files.update({name: file["content"] for name, file in json["files"].items()})
+        return FakeResponse(payload={})
+
+@pytest.fixture
+def gist(monkeypatch):
+    api = FakeGistApi({
+        database.GIST_FILENAME: json.dumps([{"课程名称": "高等数学"}]),
+        database.ACCOUNTS_FILENAME: "[]",
+    })
+    monkeypatch.setattr(database, "_http", api)
+    monkeypatch.setattr(database, "_CACHED_GIST_ID", "gist-id")
+    database.refresh()
+    yield api
+    database.refresh()
+
+def test_one_download_per_run(gist):
+    store = database.store_for("2024000000")
+    assert database.get_session() is None
+    assert database.get_fingerprints() is None
+    assert database.get_latest_scores() == [{"课程名称": "高等数学"}]
+    assert store.get_latest_scores() == [] and database.get_accounts() == "[]"
+    assert gist.reads == 1
+
+    # 写入后读取到的是新内容，不再下载
+    store.save_scores([{"课程名称": "线性代数"}], fingerprints={"all_scores": "abc"})
+    assert store.get_latest_scores() == [{"课程名称": "线性代数"}]
+    assert store.get_fingerprints() == {"all_scores": "abc"}
+    assert gist.reads == 1
+
+    database.refresh()
+    assert store.get_latest_scores() == [{"课程名称": "线性代数"}]
+    assert gist.reads == 2
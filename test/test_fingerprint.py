@@ -0,0 +1,62 @@
+from pathlib import Path
+import sys
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from utils import fetcher
+from jwc_pages import sample_courses, render_all_scores, render_normal_scores
+from fakes import make_fetcher, serve_pages
+
+def logged_in_fetcher(pages):
+    score_fetcher = make_fetcher()
+    score_fetcher.is_logged_in = True
+    return score_fetcher, serve_pages(score_fetcher, pages)
+
+def score_pages(courses=10):
+    records, normal = sample_courses(courses)
+    return {fetcher.ALL_SCORES_PATH: render_all_scores(records), fetcher.NORMAL_SCORES_PATH: render_normal_scores(normal)}
+
+def test_fingerprint_covers_only_score_table():
+    html = render_all_scores(sample_courses(5)[0])
+    fingerprint = fetcher.table_fingerprint(html)
+    assert fetcher.table_fingerprint(html.replace('<title>全部成绩', '<title>全部成绩 10:00')) == fingerprint
+    assert fetcher.table_fingerprint(html.replace('\n', '\r\n')) == fingerprint
+    assert fetcher.table_fingerprint(html.replace('课程004', '课程005')) != fingerprint
+    assert fetcher.table_fingerprint('<p>请登录</p>') is None
+
+def test_unchanged_pages_take_fast_path_and_are_reused():
+    pages = score_pages()
+    first, _ = logged_in_fetcher(pages)
+    first.get_combined_scores(delay=0)
+    known = dict(first.fingerprints)
+    assert set(known) == {'all_scores', 'normal_scores'}
+
+    second, requested = logged_in_fetcher(pages)
+    assert second.scores_unchanged(known, delay=0)
+    assert requested == [fetcher.ALL_SCORES_PATH, fetcher.NORMAL_SCORES_PATH]
+
+    # 慢路径复用已下载的页面，不重复请求
+    changed = dict(known, normal_scores='0' * 64)
+    third, requested = logged_in_fetcher(pages)
+    assert not third.scores_unchanged(changed, delay=0)
+    assert third.get_combined_scores(delay=0) == first.get_combined_scores(delay=0)
+    assert requested == [fetcher.ALL_SCORES_PATH, fetcher.NORMAL_SCORES_PATH]
+
+def test_changed_all_scores_page_skips_second_download():
+    pages = score_pages()
+    first, _ = logged_in_fetcher(pages)
+    first.get_combined_scores(delay=0)
+    known = dict(first.fingerprints)
+
+    pages[fetcher.ALL_SCORES_PATH] = render_all_scores(sample_courses(11)[0])
+    second, requested = logged_in_fetcher(pages)
+    assert not second.scores_unchanged(known, delay=0)
+    assert requested == [fetcher.ALL_SCORES_PATH]
+    assert not second.scores_unchanged(None)
+
+def test_cached_fingerprints_per_account(tmp_path):
+    cache_path = str(tmp_path / 'fingerprints.json')
+    assert fetcher.load_cached_fingerprints('a', cache_path) is None
+    fetcher.save_cached_fingerprints('a', {'all_scores': '1'}, cache_path)
+    fetcher.save_cached_fingerprints('b', {'all_scores': '2'}, cache_path)
+    assert fetcher.load_cached_fingerprints('a', cache_path) == {'all_scores': '1'}
+    assert fetcher.load_cached_fingerprints('b', cache_path) == {'all_scores': '2'}
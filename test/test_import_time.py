@@ -0,0 +1,55 @@
+import os
+import subprocess
+import sys
+from pathlib import Path
+
+PROJECT_ROOT = Path(__file__).resolve().parent.parent
+
+# utils.fetcher 的累计导入耗时上限（微秒），包含 requests 本身约 100ms；
+# 导入时的网络探测（超时 5s）或顺带导入 PIL/bs4 都会明显超出
+IMPORT_BUDGET_US = 400_000
+# 导入时不应加载的重量级依赖
+LAZY_MODULES = ('PIL', 'bs4')
+
+def import_times(module):
+    """在新进程中用 -X importtime 导入 module，返回 {模块名: 累计耗时(微秒)}"""
+    result = subprocess.run([sys.executable, '-X', 'importtime', '-c', f'import {module}'],
+                            cwd=PROJECT_ROOT, capture_output=True, text=True, timeout=60, check=True)
+    times = {}
+    for line in result.stderr.splitlines():
+        if not line.startswith('import time:') or 'cumulative' in line:
+            continue
+        _, cumulative, name = line.split('|')
+        times[name.strip()] = int(cumulative)
+    return times
+
+def test_import_is_lazy_and_within_budget():
+    for module in ('utils.ocr', 'utils.fetcher'):
+        times = import_times(module)
+        heavy = [name for name in times if name.split('.')[0] in LAZY_MODULES]
+        assert not heavy, f"{module} 导入时加载了 {heavy}"
+    assert times['utils.fetcher'] < IMPORT_BUDGET_US
+
+# 在导入前禁止建目录和建立网络连接，导入成功即说明没有导入时的 I/O
+NO_SIDE_EFFECTS = """
+import os, socket
+def forbidden(*args, **kwargs):
+    raise AssertionError('import-time I/O')
+os.makedirs = os.mkdir = forbidden
+socket.socket.connect = forbidden
+import utils.ocr, utils.fetcher
+"""
+
+def test_import_has_no_side_effects():
+    subprocess.run([sys.executable, '-c', NO_SIDE_EFFECTS], cwd=PROJECT_ROOT, check=True, timeout=60)
+
+def test_api_import_skips_async_client():
+    # httpx 只在用到 AsyncScoreFetcher 的路由中导入，不计入 API 冷启动
+    env = dict(os.environ, GIST_PAT=os.environ.get('GIST_PAT', 'test-token'))
+    check = "import sys, api.index; assert 'httpx' not in sys.modules, 'api.index 导入时加载了 httpx'"
+    subprocess.run([sys.executable, '-c', check], cwd=PROJECT_ROOT, env=env, check=True, timeout=60)
+
+if __name__ == '__main__':
+    for module in ('utils.ocr', 'utils.fetcher'):
+        times = import_times(module)
+        print(f"{module}: {times[module] / 1000:.1f} ms")
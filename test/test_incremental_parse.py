@@ -0,0 +1,64 @@
+import copy
+from pathlib import Path
+import sys
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from utils import fetcher
+from jwc_pages import sample_courses, render_all_scores, render_normal_scores
+
+def renumber(records):
+    return [dict(record, 序号=str(i + 1)) for i, record in enumerate(records)]
+
+def stored_snapshot(records, normal):
+    """模拟数据库中保存的合并成绩"""
+    return fetcher.merge_scores(copy.deepcopy(records), normal)
+
+def test_unchanged_page_stops_at_first_row():
+    records, normal = sample_courses(50)
+    result, reused = fetcher.parse_all_scores_incremental(render_all_scores(records), stored_snapshot(records, normal))
+    assert result == records
+    assert reused == 49
+
+def test_new_records_on_top_reuse_tail_with_shifted_serials():
+    records, normal = sample_courses(50)
+    stored = stored_snapshot(records[2:], normal[2:])
+    stored = renumber(stored)
+    current = renumber(records)
+    result, reused = fetcher.parse_all_scores_incremental(render_all_scores(current), stored)
+    assert result == current == fetcher.parse_all_scores(render_all_scores(current))
+    assert reused == 47
+
+def test_regraded_record_moves_to_top_without_duplicate():
+    records, normal = sample_courses(20)
+    stored = stored_snapshot(records, normal)
+    regraded = dict(records[10], 成绩='100', 提交时间='2025-01-01 10:00')
+    current = renumber([regraded] + records[:10] + records[11:])
+    result, reused = fetcher.parse_all_scores_incremental(render_all_scores(current), renumber(stored))
+    assert result == current
+    assert reused == 18
+
+def test_missing_anchor_falls_back_to_full_parse():
+    records, normal = sample_courses(20)
+    stored = stored_snapshot(records, normal)
+    stored[0]['成绩'] = '0'
+    html = render_all_scores(records)
+    assert fetcher.parse_all_scores_incremental(html, stored) == (records, 0)
+    assert fetcher.parse_all_scores_incremental(html, None) == (records, 0)
+    assert fetcher.parse_all_scores_incremental('<p>请登录</p>', stored) == (None, 0)
+
+def test_combined_scores_incremental_matches_full():
+    records, normal = sample_courses(30)
+    normal[25]['详情'].append({'平时成绩名称': '补交作业', '成绩': '90', '占比': '5%', '提交时间': '2025-01-02 10:00'})
+    pages = {fetcher.ALL_SCORES_PATH: render_all_scores(records), fetcher.NORMAL_SCORES_PATH: render_normal_scores(normal)}
+    stored = stored_snapshot(records, sample_courses(30)[1])
+
+    def combined(**options):
+        score_fetcher = fetcher.ScoreFetcher('2024000000', 'password', base_url='http://127.0.0.1:8000')
+        score_fetcher.is_logged_in = True
+        score_fetcher._prefetched = dict(pages)
+        return score_fetcher.get_combined_scores(delay=0, **options)
+
+    full = combined()
+    assert combined(known_scores=stored, incremental=True) == full
+    # 平时成绩页始终完整解析，尾部沿用的记录也会合并最新的平时成绩
+    assert full[25]['平时成绩详情'][-1]['平时成绩名称'] == '补交作业'
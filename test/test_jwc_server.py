@@ -0,0 +1,67 @@
+import asyncio
+from pathlib import Path
+import sys
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import pytest
+
+from utils import fetcher
+from utils.async_fetcher import AsyncScoreFetcher
+from jwc_server import JwcState, start_server
+
+@pytest.fixture
+def jwc():
+    state = JwcState(captcha_failure_rate=0.5, courses=15, seed=3)
+    server, base_url = start_server(state)
+    yield state, base_url
+    server.shutdown()
+    server.server_close()
+
+def expected_scores(state):
+    return fetcher.merge_scores([dict(record) for record in state.records], state.normal)
+
+def test_login_and_scores_end_to_end(jwc):
+    state, base_url = jwc
+    score_fetcher = fetcher.ScoreFetcher('2024000000', 'password', captcha_corpus_dir=None, base_url=base_url)
+    assert score_fetcher.login(max_retries=20, retry_delay=0)
+    assert score_fetcher.get_combined_scores(delay=0) == expected_scores(state)
+    assert state.stats[f"POST {fetcher.LOGIN_API_PATH}"] >= 1
+    assert state.stats['requests'] == sum(count for key, count in state.stats.items() if ' ' in key)
+
+def test_async_end_to_end(jwc):
+    state, base_url = jwc
+
+    async def run():
+        async with AsyncScoreFetcher('2024000000', 'password', captcha_corpus_dir=None, base_url=base_url) as score_fetcher:
+            assert await score_fetcher.login(max_retries=20, retry_delay=0)
+            return await score_fetcher.get_combined_scores(concurrent=True)
+
+    assert asyncio.run(run()) == expected_scores(state)
+
+def test_async_parallel_login_keeps_single_winner(jwc):
+    state, base_url = jwc
+
+    async def run():
+        async with AsyncScoreFetcher('2024000000', 'password', captcha_corpus_dir=None, base_url=base_url) as score_fetcher:
+            first_client = score_fetcher.client
+            assert await score_fetcher.login(max_retries=20, retry_delay=0, parallel_sessions=4, stagger=0)
+            # 被替换的客户端已关闭，保留的是登录成功的那个
+            assert first_client.is_closed and not score_fetcher.client.is_closed
+            return await score_fetcher.get_combined_scores(concurrent=True)
+
+    assert asyncio.run(run()) == expected_scores(state)
+    assert sum(session['logged_in'] for session in state.sessions.values()) == 1
+
+def test_wrong_password_and_expired_session(jwc):
+    _, base_url = jwc
+    score_fetcher = fetcher.ScoreFetcher('2024000000', 'wrong', captcha_corpus_dir=None, base_url=base_url)
+    assert not score_fetcher.login(max_retries=20, retry_delay=0)
+    response = score_fetcher.session.get(score_fetcher.url(fetcher.ALL_SCORES_PATH))
+    assert fetcher.is_session_expired(str(response.url), response.text)
+
+def test_base_url_override(monkeypatch):
+    monkeypatch.setattr(fetcher, 'BASE_URL_OVERRIDE', 'http://127.0.0.1:8000/')
+    score_fetcher = fetcher.ScoreFetcher('2024000000', 'password')
+    assert score_fetcher.base_url == 'http://127.0.0.1:8000'
+    assert not score_fetcher._base_url_detected
+    assert AsyncScoreFetcher('2024000000', 'password')._base_url == 'http://127.0.0.1:8000'
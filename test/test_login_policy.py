@@ -0,0 +1,100 @@
+import json
+import random
+from pathlib import Path
+import sys
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import requests
+
+from utils import fetcher
+from fakes import FakeResponse
+from test_parallel_login import FakeJwc, make_fetcher
+
+def test_classify_login_message():
+    assert fetcher.classify_login_message('验证码错误') == fetcher.LOGIN_FAILURE_CAPTCHA
+    assert fetcher.classify_login_message('用户名或密码错误') == fetcher.LOGIN_FAILURE_CREDENTIAL
+    assert fetcher.classify_login_message('弱密码已被限制登录') == fetcher.LOGIN_FAILURE_POLICY
+    assert fetcher.classify_login_message('系统繁忙') == fetcher.LOGIN_FAILURE_UNKNOWN
+    assert fetcher.classify_login_message(None) == fetcher.LOGIN_FAILURE_UNKNOWN
+
+def test_classify_login_exception():
+    assert fetcher.classify_login_exception(requests.exceptions.ConnectTimeout()) == fetcher.LOGIN_FAILURE_TRANSPORT
+    server_error = requests.Response()
+    server_error.status_code = 502
+    assert fetcher.classify_login_exception(requests.HTTPError(response=server_error)) == fetcher.LOGIN_FAILURE_TRANSPORT
+    assert fetcher.classify_login_exception(json.JSONDecodeError('not json', '<html>', 0)) == fetcher.LOGIN_FAILURE_TRANSPORT
+    assert fetcher.classify_login_exception(requests.JSONDecodeError('not json', '<html>', 0)) == fetcher.LOGIN_FAILURE_TRANSPORT
+    # 本地配置错误不是网络错误，不应触发退避与熔断
+    assert fetcher.classify_login_exception(ValueError("未知的分割方式: x")) == fetcher.LOGIN_FAILURE_UNKNOWN
+    assert fetcher.classify_login_exception(KeyError('x')) == fetcher.LOGIN_FAILURE_UNKNOWN
+
+def test_retry_wait_by_failure():
+    rng = random.Random(1)
+    assert fetcher.login_retry_wait(fetcher.LOGIN_FAILURE_CAPTCHA, 0, 2) == 0
+    assert fetcher.login_retry_wait(fetcher.LOGIN_FAILURE_UNKNOWN, 0, 2) == 2
+    waits = [fetcher.login_retry_wait(fetcher.LOGIN_FAILURE_TRANSPORT, n, 2, backoff_max=10, rng=rng) for n in range(1, 6)]
+    assert 1 <= waits[0] <= 2 and 2 <= waits[1] <= 4 and 4 <= waits[2] <= 8
+    assert all(5 <= wait <= 10 for wait in waits[3:])
+
+class RejectingJwc(FakeJwc):
+    """验证码总能识别正确，但登录接口返回指定的失败信息"""
+    def __init__(self, message):
+        super().__init__(['WXYZ'], latency=0)
+        self.message = message
+
+    def session(self):
+        session = super().session()
+        jwc = self
+        def post(url, data=None, **kwargs):
+            jwc.logins += 1
+            return FakeResponse(payload={'loginStatus': '0', 'loginMsg': jwc.message})
+        session.post = post
+        return session
+
+def test_credential_and_policy_errors_abort(tmp_path):
+    for message in ('用户名或密码错误', '弱密码已被限制登录'):
+        jwc = RejectingJwc(message)
+        breaker = fetcher.CircuitBreaker(str(tmp_path / 'breaker.json'))
+        score_fetcher = make_fetcher(jwc)
+        score_fetcher.circuit_breaker = breaker
+        assert not score_fetcher.login(max_retries=10, retry_delay=5)
+        assert jwc.logins == 1
+        assert breaker.state['failures'] == 0
+
+def test_transport_errors_back_off_and_open_breaker(tmp_path, monkeypatch):
+    waits = []
+    monkeypatch.setattr(fetcher.time, 'sleep', waits.append)
+    score_fetcher = make_fetcher(FakeJwc(['WXYZ'], latency=0))
+    def unreachable(url, **kwargs):
+        raise requests.exceptions.ConnectTimeout('connect timeout')
+    score_fetcher.session.get = unreachable
+    path = str(tmp_path / 'breaker.json')
+    score_fetcher.circuit_breaker = fetcher.CircuitBreaker(path, threshold=2, cooldown=100)
+
+    assert not score_fetcher.login(max_retries=4, retry_delay=1)
+    assert len(waits) == 3 and waits[0] <= 1 < waits[1] <= 2 < waits[2] <= 4
+    assert fetcher.CircuitBreaker(path).allow()
+    assert not score_fetcher.login(max_retries=1, retry_delay=1)
+    assert not fetcher.CircuitBreaker(path).allow()
+
+def test_breaker_half_open_doubles_cooldown_and_resets(tmp_path):
+    path = str(tmp_path / 'breaker.json')
+    breaker = fetcher.CircuitBreaker(path, threshold=1, cooldown=100, max_cooldown=150)
+    breaker.record_failure(now=1000)
+    assert not breaker.allow(now=1050) and breaker.allow(now=1100)
+    breaker.record_failure(now=1100)
+    assert breaker.open_until == 1250
+    breaker.record_success()
+    assert fetcher.CircuitBreaker(path).allow(now=0)
+    assert fetcher.CircuitBreaker(str(tmp_path / 'missing.json')).allow()
+
+def test_low_confidence_rejection_is_opt_in():
+    # 默认不提前放弃：第一张验证码就提交登录
+    jwc = FakeJwc(['WXYZ'], latency=0)
+    assert make_fetcher(jwc).login(max_retries=3, retry_delay=0)
+    assert fetcher.OCR_MIN_CONFIDENCE == 0 and jwc.served == 1
+
+    # 阈值高于任何置信度时，除最后一次外都不提交，直接重新获取验证码
+    jwc = FakeJwc(['WXYZ'], latency=0)
+    assert make_fetcher(jwc).login(max_retries=3, retry_delay=0, min_confidence=1.01)
+    assert jwc.served == 3 and jwc.logins == 1
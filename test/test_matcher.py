@@ -0,0 +1,203 @@
+import io
+import os
+import random
+import shutil
+import tempfile
+from pathlib import Path
+import sys
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from PIL import Image
+
+from utils import ocr
+
+# --- 参照实现：逐像素滑动窗口匹配（位打包匹配器之前的版本） ---
+def reference_match(char_img, templates, offset_range=3):
+    """返回 [(字符名, 最佳相似度, 最佳偏移), ...]"""
+    char_width, char_height = char_img.size
+    char_pixels = char_img.load()
+    match_results = []
+    for char_name, template_img in templates.items():
+        template_width, template_height = template_img.size
+        template_pixels = template_img.load()
+        best_offset_similarity = 0.0
+        best_offset = (0, 0)
+        template_black_count = 0
+        for x in range(template_width):
+            for y in range(template_height):
+                if template_pixels[x, y] == 0:
+                    template_black_count += 1
+        char_black_count = 0
+        for x in range(char_width):
+            for y in range(char_height):
+                if char_pixels[x, y] == 0:
+                    char_black_count += 1
+        for offset_x in range(-offset_range, offset_range + 1):
+            for offset_y in range(-offset_range, offset_range + 1):
+                overlap_black_count = 0
+                for template_x in range(template_width):
+                    for template_y in range(template_height):
+                        if template_pixels[template_x, template_y] == 0:
+                            char_x = template_x + offset_x
+                            char_y = template_y + offset_y
+                            if 0 <= char_x < char_width and 0 <= char_y < char_height:
+                                if char_pixels[char_x, char_y] == 0:
+                                    overlap_black_count += 1
+                if template_black_count > 0:
+                    template_ratio = overlap_black_count / template_black_count
+                else:
+                    template_ratio = 0.0
+                if char_black_count > 0:
+                    char_ratio = overlap_black_count / char_black_count
+                else:
+                    char_ratio = 0.0
+                if template_ratio + char_ratio > 0:
+                    similarity = 2 * template_ratio * char_ratio / (template_ratio + char_ratio)
+                else:
+                    similarity = 0.0
+                if similarity > best_offset_similarity:
+                    best_offset_similarity = similarity
+                    best_offset = (offset_x, offset_y)
+        match_results.append((char_name, best_offset_similarity, best_offset))
+    return match_results
+
+def make_glyph(template_img, rng, noise=0.08):
+    """把模板随机平移、加噪后裁剪，模拟分割出的字符"""
+    canvas = Image.new('L', (24, 22), 255)
+    canvas.paste(template_img.convert('L'), (rng.randint(0, 8), rng.randint(0, 6)))
+    pixels = canvas.load()
+    for x in range(canvas.width):
+        for y in range(canvas.height):
+            if rng.random() < noise:
+                pixels[x, y] = 255 - pixels[x, y]
+    glyph = canvas.point(lambda v: 0 if v < 128 else 255, '1')
+    left, top = rng.randint(0, 4), rng.randint(0, 3)
+    return glyph.crop((left, top, left + rng.randint(8, 18), top + rng.randint(10, 17)))
+
+def make_captcha(text, rng=None, size=(60, 20), noise=0.0, spacing=3, background=200, foreground=0):
+    """
+    用模板拼出一张验证码图片，返回 PNG 字节流
+    
+    spacing 为字符间距，可为负数（字符粘连）；background/foreground 为背景和字符（及噪点）的灰度
+    """
+    rng = rng or random.Random(0)
+    templates = ocr.load_templates()
+    canvas = Image.new('L', size, background)
+    x = 3
+    for char in text:
+        template_img = templates[char].convert('L')
+        y = 3 + rng.randint(0, 3)
+        canvas.paste(foreground, (x, y, x + template_img.width, y + template_img.height),
+                     template_img.point(lambda v: 255 - v))
+        x += template_img.width + spacing
+    if noise:
+        pixels = canvas.load()
+        for px in range(canvas.width):
+            for py in range(canvas.height):
+                if rng.random() < noise:
+                    pixels[px, py] = foreground
+    buffer = io.BytesIO()
+    canvas.convert('RGB').save(buffer, format='PNG')
+    return buffer.getvalue()
+
+def test_matcher_equivalence():
+    templates = ocr.load_templates()
+    rng = random.Random(20240501)
+    packed_templates = {name: ocr.pack_glyph(img) for name, img in templates.items()}
+    for template_img in list(templates.values()) * 2:
+        glyph = make_glyph(template_img, rng)
+        expected = reference_match(glyph, templates)
+        actual = ocr.match_glyph(ocr.pack_glyph(glyph), packed_templates)
+        assert actual == expected
+
+def test_matcher_edge_cases():
+    templates = ocr.load_templates()
+    packed_templates = {name: ocr.pack_glyph(img) for name, img in templates.items()}
+    for glyph in (Image.new('1', (5, 5), 1), Image.new('1', (1, 1), 0), Image.new('1', (30, 14), 0)):
+        assert ocr.match_glyph(ocr.pack_glyph(glyph), packed_templates) == reference_match(glyph, templates)
+
+def test_pruned_matcher_matches_full_scan():
+    templates = ocr.load_templates()
+    bank = ocr.get_template_bank()
+    rng = random.Random(5)
+    glyphs = [make_glyph(img, rng) for img in templates.values()]
+    glyphs += [Image.new('1', (5, 5), 1), Image.new('1', (30, 14), 0)]
+    total_scored = 0
+    for glyph in glyphs:
+        full = ocr.recognize_character(glyph, bank, debug=False, return_details=True, prune=False)
+        pruned = ocr.recognize_character(glyph, bank, debug=False, return_details=True)
+        assert pruned[:4] == full[:4]
+        assert full.scored == len(bank)
+        total_scored += pruned.scored
+    assert total_scored < len(glyphs) * len(bank)
+
+def test_prefilters_are_upper_bounds():
+    templates = ocr.load_templates()
+    bank = ocr.get_template_bank()
+    rng = random.Random(11)
+    glyphs = [make_glyph(img, rng) for img in templates.values()]
+    glyphs += [Image.new('1', (5, 5), 1), Image.new('1', (3, 20), 0), Image.new('1', (30, 14), 0)]
+    tighter = 0
+    for glyph in map(ocr.pack_glyph, glyphs):
+        for name, similarity, _ in ocr.match_glyph(glyph, bank.glyphs):
+            template = bank.glyphs[name]
+            bound = ocr.shape_bound(glyph, template)
+            assert similarity <= bound + 1e-9
+            assert bound <= ocr.black_count_bound(glyph, template)
+            tighter += bound < ocr.black_count_bound(glyph, template)
+    # 尺寸悬殊的字符（如细长的噪声块）上宽高约束更紧
+    assert tighter > 0
+
+def test_template_bank_invalidation():
+    with tempfile.TemporaryDirectory() as template_dir:
+        for name in ('A.png', 'B.png'):
+            shutil.copy(os.path.join(ocr.TEMPLATE_DIR, name), template_dir)
+        bank = ocr.get_template_bank(template_dir)
+        assert sorted(bank.glyphs) == ['A', 'B']
+        assert ocr.get_template_bank(template_dir) is bank
+
+        shutil.copy(os.path.join(ocr.TEMPLATE_DIR, 'C.png'), template_dir)
+        rebuilt = ocr.get_template_bank(template_dir)
+        assert rebuilt is not bank
+        assert sorted(rebuilt.glyphs) == ['A', 'B', 'C']
+
+def test_template_bank_matches_images():
+    templates = ocr.load_templates()
+    bank = ocr.get_template_bank()
+    glyph = make_glyph(templates['K'], random.Random(7))
+    assert ocr.recognize_character(glyph, bank, debug=False) == ocr.recognize_character(glyph, templates, debug=False)
+
+def test_compiled_templates():
+    compiled = ocr.load_compiled_templates()
+    assert compiled is not None, "预编译模板已过期，请运行 python utils/compile_templates.py"
+    packed_templates = {name: ocr.pack_glyph(img) for name, img in ocr.load_templates().items()}
+    assert list(compiled.items()) == list(packed_templates.items())
+
+    with tempfile.TemporaryDirectory() as template_dir:
+        for name in os.listdir(ocr.TEMPLATE_DIR):
+            shutil.copy(os.path.join(ocr.TEMPLATE_DIR, name), template_dir)
+        assert ocr.load_compiled_templates(template_dir) is not None
+        Image.new('1', (11, 13), 0).save(os.path.join(template_dir, 'A.png'))
+        assert ocr.load_compiled_templates(template_dir) is None
+        assert ocr.TemplateBank(template_dir).build().source == 'png'
+
+def test_classify_details():
+    result = ocr.classify(make_captcha('SWJT'), debug=False, return_details=True)
+    assert result.text == 'SWJT'
+    assert result.text == ocr.classify(make_captcha('SWJT'), debug=False)
+    assert len(result.chars) == 4
+    assert result.confidence == min(match.similarity for match in result.chars)
+    for match in result.chars:
+        assert match.candidates[0] == (match.char, match.similarity)
+        assert match.margin == match.similarity - match.candidates[1][1]
+
+if __name__ == '__main__':
+    test_matcher_equivalence()
+    test_matcher_edge_cases()
+    test_pruned_matcher_matches_full_scan()
+    test_prefilters_are_upper_bounds()
+    test_template_bank_invalidation()
+    test_template_bank_matches_images()
+    test_compiled_templates()
+    test_classify_details()
+    print("✅ 位打包匹配器与逐像素实现结果一致")
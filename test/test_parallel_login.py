@@ -0,0 +1,85 @@
+import threading
+import time
+from pathlib import Path
+import sys
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from utils import fetcher
+from test_matcher import make_captcha
+from fakes import FakeResponse, make_fetcher as base_fetcher
+
+class FakeJwc:
+    """
+    模拟教务登录接口：第 n 次获取的验证码为 captchas[n]；
+    提交的验证码与该会话最近一次获取的一致时登录成功
+    """
+    def __init__(self, captchas, latency=0.05):
+        self.captchas = captchas
+        self.latency = latency
+        self.lock = threading.Lock()
+        self.served = 0
+        self.logins = 0
+        self.closed = 0
+
+    def session(self):
+        jwc = self
+
+        class Session:
+            headers = {}
+            expected = None
+
+            def get(self, url, **kwargs):
+                time.sleep(jwc.latency)
+                if fetcher.CAPTCHA_PATH in url:
+                    with jwc.lock:
+                        text = jwc.captchas[jwc.served % len(jwc.captchas)]
+                        jwc.served += 1
+                    self.expected = text
+                    return FakeResponse(content=make_captcha(text.replace('?', 'A')))
+                return FakeResponse()
+
+            def post(self, url, data=None, **kwargs):
+                time.sleep(jwc.latency)
+                ok = data['ranstring'] == self.expected
+                if ok:
+                    with jwc.lock:
+                        jwc.logins += 1
+                return FakeResponse(payload={'loginStatus': '1' if ok else '0', 'loginMsg': '登录成功' if ok else '验证码错误'})
+
+            def close(self):
+                with jwc.lock:
+                    jwc.closed += 1
+        return Session()
+
+def make_fetcher(jwc):
+    score_fetcher = base_fetcher()
+    score_fetcher.session = jwc.session()
+    score_fetcher._new_session = jwc.session
+    return score_fetcher
+
+def test_sequential_login_retries_until_success():
+    # '?' 表示服务器实际的验证码与图片不同，识别结果必然被拒绝
+    jwc = FakeJwc(['ABC?', 'ABC?', 'WXYZ'])
+    score_fetcher = make_fetcher(jwc)
+    assert score_fetcher.login(max_retries=5, retry_delay=0, parallel_sessions=1)
+    assert score_fetcher.is_logged_in and jwc.served == 3 and jwc.logins == 1
+
+def test_parallel_login_keeps_single_winner():
+    jwc = FakeJwc(['ABC?', 'WXYZ', 'ABC?', 'MNOP'])
+    score_fetcher = make_fetcher(jwc)
+    start = time.perf_counter()
+    assert score_fetcher.login(max_retries=8, retry_delay=1, parallel_sessions=4, stagger=0)
+    elapsed = time.perf_counter() - start
+    assert score_fetcher.is_logged_in
+    assert jwc.logins == 1
+    assert score_fetcher.session.expected in ('WXYZ', 'MNOP')
+    # 三个落选的会话与被替换的原会话都已关闭
+    assert jwc.closed == 4
+    # 一轮即成功，不会经历 retry_delay
+    assert elapsed < 1
+
+def test_parallel_login_respects_attempt_budget():
+    jwc = FakeJwc(['ABC?'])
+    score_fetcher = make_fetcher(jwc)
+    assert not score_fetcher.login(max_retries=5, retry_delay=0, parallel_sessions=2, stagger=0)
+    assert jwc.served == 5 and jwc.logins == 0 and jwc.closed == 5
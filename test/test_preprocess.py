@@ -0,0 +1,112 @@
+import io
+import random
+import time
+from pathlib import Path
+import sys
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from PIL import Image
+
+from utils import ocr
+from test_matcher import make_captcha
+
+# --- 参照实现：逐像素二值化与投影分割（改用字节缓冲之前的版本） ---
+def reference_binarize(img, threshold):
+    table = []
+    for i in range(256):
+        if i < threshold:
+            table.append(0)
+        else:
+            table.append(1)
+    img_bin = img.convert('L').point(table, '1')
+    width, height = img_bin.size
+    img_data = img_bin.load()
+    for x in range(width):
+        for y in range(height):
+            if x == 0 or y == 0:
+                img_data[x, y] = 1
+    return img_bin
+
+def reference_segment(img):
+    width, height = img.size
+    pixels = img.load()
+    vertical_projection = [0] * width
+    for x in range(width):
+        for y in range(height):
+            if pixels[x, y] == 0:
+                vertical_projection[x] += 1
+    in_char = False
+    char_boundaries = []
+    start_x = 0
+    for x, val in enumerate(vertical_projection):
+        if val > 1 and not in_char:
+            in_char = True
+            start_x = x
+        elif val <= 1 and in_char:
+            in_char = False
+            char_boundaries.append((start_x, x))
+    if in_char:
+        char_boundaries.append((start_x, width))
+    char_images = []
+    for start, end in char_boundaries:
+        char_img = img.crop((start, 0, end, height))
+        char_width, char_height = char_img.size
+        char_pixels = char_img.load()
+        horizontal_projection = [0] * char_height
+        for y in range(char_height):
+            for x in range(char_width):
+                if char_pixels[x, y] == 0:
+                    horizontal_projection[y] += 1
+        top_boundary = 0
+        bottom_boundary = char_height - 1
+        for y in range(char_height):
+            if horizontal_projection[y] > 1:
+                top_boundary = y
+                break
+        for y in range(char_height - 1, -1, -1):
+            if horizontal_projection[y] > 1:
+                bottom_boundary = y
+                break
+        if bottom_boundary > top_boundary:
+            char_img = char_img.crop((0, top_boundary, char_width, bottom_boundary + 1))
+        char_images.append(char_img)
+    return char_images
+
+def sample_captchas(count=20, seed=11):
+    rng = random.Random(seed)
+    letters = [chr(ord('A') + i) for i in range(26)]
+    return [make_captcha(''.join(rng.sample(letters, 4)), rng, noise=rng.choice([0.0, 0.02, 0.05]))
+            for _ in range(count)]
+
+def test_preprocess_matches_reference():
+    for image_bytes in sample_captchas():
+        img = Image.open(io.BytesIO(image_bytes))
+        for threshold in (94, 128):
+            expected_bin = reference_binarize(img, threshold)
+            actual_bin = ocr.binarize(img, threshold)
+            assert actual_bin.tobytes() == expected_bin.tobytes()
+
+            expected = reference_segment(expected_bin)
+            actual = ocr.segment_characters(actual_bin, debug=False)
+            assert [(c.size, c.tobytes()) for c in actual] == [(c.size, c.tobytes()) for c in expected]
+
+def benchmark(rounds=20):
+    """对比每张验证码的预处理耗时（二值化 + 分割）"""
+    images = [Image.open(io.BytesIO(b)).convert('RGB') for b in sample_captchas()]
+
+    def run(binarize_fn, segment_fn):
+        start = time.perf_counter()
+        for _ in range(rounds):
+            for img in images:
+                segment_fn(binarize_fn(img, 94))
+        return (time.perf_counter() - start) / (rounds * len(images)) * 1000
+
+    before = run(reference_binarize, reference_segment)
+    after = run(ocr.binarize, lambda img: ocr.segment_characters(img, debug=False))
+    print(f"逐像素实现: {before:.3f} ms/张")
+    print(f"字节缓冲实现: {after:.3f} ms/张（{before / after:.1f}x）")
+
+if __name__ == '__main__':
+    test_preprocess_matches_reference()
+    print("✅ 预处理结果与逐像素实现一致")
+    benchmark()
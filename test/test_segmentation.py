@@ -0,0 +1,71 @@
+import random
+from pathlib import Path
+import sys
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from utils import ocr
+from test_matcher import make_captcha
+
+LETTERS = [chr(ord('A') + i) for i in range(26)]
+
+# 离线语料：(名称, 字符间距, 噪点密度)
+CORPORA = [
+    ("分离", 3, 0.0),
+    ("分离+噪点", 3, 0.02),
+    ("粘连", 0, 0.0),
+    ("粘连+噪点", 0, 0.02),
+    ("重叠", -1, 0.0),
+]
+
+def build_corpus(spacing, noise, count=60, seed=1):
+    """生成带标注的验证码语料 [(标注, 图片字节流), ...]"""
+    rng = random.Random(seed)
+    corpus = []
+    for _ in range(count):
+        label = ''.join(rng.sample(LETTERS, 4))
+        corpus.append((label, make_captcha(label, rng, size=(64, 20), noise=noise, spacing=spacing)))
+    return corpus
+
+def first_attempt_success(corpus, mode):
+    """单次识别即完全正确的比例"""
+    hits = sum(ocr.classify(image_bytes, debug=False, segmentation=mode) == label for label, image_bytes in corpus)
+    return hits / len(corpus)
+
+def test_components_not_worse_than_projection():
+    for _, spacing, noise in CORPORA:
+        corpus = build_corpus(spacing, noise, count=20)
+        projection = first_attempt_success(corpus, 'projection')
+        assert first_attempt_success(corpus, 'components') >= projection
+        assert first_attempt_success(corpus, 'auto') >= projection
+
+def test_auto_keeps_projection_result_when_count_matches():
+    for label, image_bytes in build_corpus(3, 0.0, count=10):
+        assert ocr.classify(image_bytes, debug=False, segmentation='auto') == \
+            ocr.classify(image_bytes, debug=False, segmentation='projection') == label
+
+def test_ensemble_resolves_ambiguous_captchas():
+    corpus = build_corpus(0, 0.02, count=10)
+    hits = sum(ocr.classify(image_bytes, debug=False, ensemble=True) == label for label, image_bytes in corpus)
+    assert hits > sum(ocr.classify(image_bytes, debug=False) == label for label, image_bytes in corpus)
+
+def test_ensemble_budget_and_clear_captchas():
+    label, image_bytes = build_corpus(0, 0.02, count=1)[0]
+    primary = ocr.classify(image_bytes, debug=False, return_details=True, use_memo=False)
+    assert ocr.classify(image_bytes, debug=False, return_details=True, ensemble=True, ensemble_budget=0,
+                        use_memo=False) == primary
+    label, image_bytes = build_corpus(3, 0.0, count=1)[0]
+    result = ocr.classify(image_bytes, debug=False, return_details=True, ensemble=True)
+    assert result.text == label and result.options['segmentation'] == 'projection'
+
+if __name__ == '__main__':
+    print(f"{'语料':<10}" + "".join(f"{mode:>12}" for mode in ocr.SEGMENTATION_MODES))
+    for name, spacing, noise in CORPORA:
+        corpus = build_corpus(spacing, noise)
+        rates = [first_attempt_success(corpus, mode) for mode in ocr.SEGMENTATION_MODES]
+        print(f"{name:<10}" + "".join(f"{rate:>12.1%}" for rate in rates))
+    print()
+    print("多假设集成（默认参数 + ensemble=True）：")
+    for name, spacing, noise in CORPORA:
+        corpus = build_corpus(spacing, noise)
+        hits = sum(ocr.classify(image_bytes, debug=False, ensemble=True) == label for label, image_bytes in corpus)
+        print(f"{name:<10}{hits / len(corpus):>12.1%}")
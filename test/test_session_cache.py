@@ -0,0 +1,53 @@
+import base64
+from pathlib import Path
+import sys
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import pytest
+import requests
+
+from utils import fetcher, session_cache
+from fakes import BASE, MemoryStore, make_fetcher, serve_pages
+
+def store_fetcher(store, page, key='secret'):
+    score_fetcher = make_fetcher(session_store=store, session_key=key)
+    serve_pages(score_fetcher, page)
+    return score_fetcher
+
+def saved_token(key='secret', username='2024000000'):
+    session = requests.Session()
+    session.cookies.set('JSESSIONID', 'abc', domain='127.0.0.1', path='/')
+    return session_cache.encrypt(session_cache.dump_session(session.cookies, username, BASE), key)
+
+def test_encrypt_round_trip_and_tamper():
+    token = session_cache.encrypt(b'cookie jar' * 10, 'secret')
+    assert session_cache.decrypt(token, 'secret') == b'cookie jar' * 10
+    assert session_cache.encrypt(b'cookie jar', 'secret') != session_cache.encrypt(b'cookie jar', 'secret')
+    with pytest.raises(ValueError):
+        session_cache.decrypt(token, 'wrong key')
+    tampered = token[:30] + ('A' if token[30] != 'A' else 'B') + token[31:]
+    with pytest.raises(ValueError):
+        session_cache.decrypt(tampered, 'secret')
+    # 早期标准库实现（版本 1）的会话不再支持，解密失败后重新登录
+    with pytest.raises(ValueError):
+        session_cache.decrypt(base64.urlsafe_b64encode(b'\x01' + bytes(80)).decode(), 'secret')
+
+def test_restore_valid_session_reuses_page():
+    page = '<table id="table3"><tr><th>课程名称</th></tr></table>'
+    score_fetcher = store_fetcher(MemoryStore(saved_token()), page)
+    assert score_fetcher.ensure_login()
+    assert score_fetcher.session.cookies.get('JSESSIONID') == 'abc'
+    assert score_fetcher._prefetched[fetcher.ALL_SCORES_PATH] == page
+
+def test_expired_or_foreign_session_falls_back_to_login(monkeypatch):
+    monkeypatch.setattr(fetcher.ScoreFetcher, 'login', lambda self, **kwargs: 'login')
+    assert store_fetcher(MemoryStore(saved_token()), '<html>请登录</html>').ensure_login() == 'login'
+    assert store_fetcher(MemoryStore(saved_token(username='other')), 'table3').ensure_login() == 'login'
+    assert store_fetcher(MemoryStore(saved_token(key='old')), 'table3').ensure_login() == 'login'
+    assert store_fetcher(MemoryStore(), 'table3').ensure_login() == 'login'
+
+def test_session_not_saved_without_key():
+    store = MemoryStore()
+    score_fetcher = store_fetcher(store, 'table3', key=None)
+    score_fetcher.save_session()
+    assert score_fetcher.session_store is None and store.saves == 0
@@ -0,0 +1,106 @@
+import random
+from pathlib import Path
+import sys
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from bs4 import BeautifulSoup
+
+from utils import table_extractor
+from jwc_pages import sample_courses, render_all_scores, render_normal_scores
+
+# --- 原 BeautifulSoup 实现（参考）---
+def reference_all_scores(html):
+    soup = BeautifulSoup(html, 'html.parser')
+    score_table = soup.find('table', id='table3')
+    if not score_table:
+        return None
+    all_rows_data = []
+    header = [th.text.strip() for th in score_table.find('tr').find_all('th')]
+    for row in score_table.find_all('tr')[1:]:
+        cols = [ele.text.strip() for ele in row.find_all('td')]
+        if len(cols) == len(header):
+            all_rows_data.append(dict(zip(header, cols)))
+    return all_rows_data
+
+def reference_normal_scores(html):
+    soup = BeautifulSoup(html, 'html.parser')
+    score_table = soup.find('table', id='table3')
+    if not score_table:
+        return None
+    normal_scores_data = []
+    current_course_info = {}
+    for row in score_table.find_all('tr')[1:]:
+        cols = row.find_all('td')
+        if len(cols) == 11:
+            course_name = cols[3].text.strip()
+            if not current_course_info or current_course_info.get("课程名称") != course_name:
+                if current_course_info:
+                    normal_scores_data.append(current_course_info)
+                current_course_info = {"课程名称": course_name, "教师": cols[5].text.strip(), "详情": []}
+            current_course_info["详情"].append({
+                "平时成绩名称": cols[6].text.strip(),
+                "成绩": cols[8].text.strip(),
+                "占比": cols[7].text.strip(),
+                "提交时间": cols[10].text.strip()
+            })
+        elif len(cols) == 1 and cols[0].get('colspan') == '11':
+            if current_course_info:
+                current_course_info["总结"] = cols[0].text.strip()
+    if current_course_info:
+        normal_scores_data.append(current_course_info)
+    return normal_scores_data
+
+def outcome(func, html):
+    try:
+        return func(html)
+    except Exception:
+        return 'error'
+
+# 随机替换进页面的不规范片段
+MUTATIONS = [
+    ('</td>', ''), ('</tr>', ''), ('</th>', ''), ('<td>', '<td><b>'), ('<td>', '<td><br>'),
+    ('<td>', '<td><!-- 注释 -->'), ('<td>', '<td><script>var x = "<td>";</script>'), ('<td>', '<td>&amp;&nbsp;&#150;&#x41;&foo;&#65x'),
+    ('<td>', '<td><![CDATA[cdata]]>'), ('<tr>', '<tr><td colspan="11">总结</td></tr><tr>'), ('</table>', ''),
+    ('<td>', '<td><table><tr><td>嵌套</td></tr></table>'), ('<td>', '<td/>'), ('<tr>', '</tr><tr>'), ('</td>', '</p></td>'),
+    ('<td>', '<td><pre> \n </pre>'), ('<td>', '<td><ruby>字<rt>zi</rt></ruby>'), ('<td>', '<td> \n<!--c--> '),
+]
+
+def mutate(html, rng, count):
+    for _ in range(count):
+        old, new = rng.choice(MUTATIONS)
+        positions = [i for i in range(len(html)) if html.startswith(old, i)]
+        if positions:
+            i = rng.choice(positions)
+            html = html[:i] + new + html[i + len(old):]
+    return html
+
+def test_well_formed_pages_identical():
+    records, normal = sample_courses(30)
+    all_html, normal_html = render_all_scores(records), render_normal_scores(normal)
+    assert table_extractor.extract_all_scores(all_html) == reference_all_scores(all_html) == records
+    assert table_extractor.extract_normal_scores(normal_html) == reference_normal_scores(normal_html) == normal
+
+def test_malformed_pages_identical():
+    rng = random.Random(7)
+    records, normal = sample_courses(6)
+    pages = [render_all_scores(records), render_normal_scores(normal)]
+    for _ in range(200):
+        html = mutate(rng.choice(pages), rng, rng.randrange(1, 6))
+        assert outcome(table_extractor.extract_all_scores, html) == outcome(reference_all_scores, html), html
+        assert outcome(table_extractor.extract_normal_scores, html) == outcome(reference_normal_scores, html), html
+
+def test_missing_or_empty_table():
+    assert table_extractor.extract_all_scores('<html><table id="table1"></table></html>') is None
+    assert table_extractor.extract_normal_scores('<p>请登录</p>') is None
+    assert outcome(table_extractor.extract_all_scores, '<table id="table3"></table>') == 'error'
+    assert table_extractor.extract_normal_scores('<table id="table3"></table>') == []
+
+def test_early_stop():
+    records, _ = sample_courses(20)
+    seen = []
+    def on_record(record):
+        seen.append(record)
+        if len(seen) == 5:
+            raise table_extractor.StopParsing
+    assert table_extractor.iter_all_score_records(render_all_scores(records), on_record)
+    assert seen == records[:5]
@@ -0,0 +1,91 @@
+import asyncio
+import json
+from collections import Counter
+from pathlib import Path
+import sys
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import pytest
+
+from utils import fetcher, ocr, trace
+from utils.async_fetcher import AsyncScoreFetcher
+from jwc_server import JwcState, start_server
+
+@pytest.fixture
+def jwc():
+    ocr._OCR_MEMO.clear()  # 保证验证码都经过完整识别，记录各字符的耗时
+    state = JwcState(captcha_failure_rate=0.3, courses=10, seed=7)
+    server, base_url = start_server(state)
+    yield state, base_url
+    server.shutdown()
+    server.server_close()
+
+def check_login_and_fetch_spans(spans, state):
+    by_name = Counter(item.name for item in spans)
+    by_id = {item.span_id: item for item in spans}
+    assert len({item.trace_id for item in spans}) == 1
+    assert all(item.parent_id is None or item.parent_id in by_id for item in spans)
+
+    login = next(item for item in spans if item.name == 'login')
+    assert login.counters['attempts'] == by_name['captcha.download'] == by_name['ocr']
+    assert login.attrs['failure'] is None
+    for name in ('captcha.download', 'ocr', 'login.post', 'session.establish'):
+        assert all(by_id[item.parent_id] is login for item in spans if item.name == name)
+    # 每次完整识别都记录各字符的耗时（命中识别缓存时没有）
+    recognized = [item for item in spans if item.name == 'ocr' and not item.attrs.get('memo_hit')]
+    assert by_name['ocr.segment'] == len(recognized) > 0
+    assert by_name['ocr.glyph'] == sum(item.attrs['glyphs'] for item in spans if item.name == 'ocr.segment')
+    assert all(by_id[item.parent_id].name == 'ocr' for item in spans if item.name == 'ocr.glyph')
+
+    fetches = {item.attrs['page']: item for item in spans if item.name == 'page.fetch'}
+    assert set(fetches) == {'all_scores', 'normal_scores'}
+    assert all(item.counters['bytes'] > 0 and item.attrs['status_code'] == 200 for item in fetches.values())
+    parses = {item.attrs['page']: item for item in spans if item.name == 'parse'}
+    assert parses['all_scores'].attrs['records'] == len(state.records)
+    assert parses['normal_scores'].attrs['courses'] == len(state.normal)
+
+    summary = trace.summarize(spans)
+    assert summary['captcha.download']['bytes'] == sum(item.counters['bytes'] for item in spans
+                                                       if item.name == 'captcha.download')
+
+def test_sync_fetcher_spans(jwc):
+    state, base_url = jwc
+    score_fetcher = fetcher.ScoreFetcher('2024000000', 'password', captcha_corpus_dir=None, base_url=base_url)
+    with trace.collect() as spans:
+        assert score_fetcher.login(max_retries=20, retry_delay=0)
+        # 平时成绩页在后台线程下载，span 仍属于同一次记录
+        assert score_fetcher.get_combined_scores(delay=0)
+    check_login_and_fetch_spans(spans, state)
+
+def test_async_fetcher_spans(jwc):
+    state, base_url = jwc
+
+    async def run():
+        async with AsyncScoreFetcher('2024000000', 'password', captcha_corpus_dir=None, base_url=base_url) as score_fetcher:
+            with trace.collect() as spans:
+                assert await score_fetcher.login(max_retries=20, retry_delay=0)
+                assert await score_fetcher.get_combined_scores(concurrent=True)
+            return spans
+
+    check_login_and_fetch_spans(asyncio.run(run()), state)
+
+def test_json_lines_and_errors(tmp_path, monkeypatch):
+    path = tmp_path / 'trace.jsonl'
+    monkeypatch.setattr(trace, 'TRACE_FILE', str(path))
+    with pytest.raises(ValueError):
+        with trace.span('outer', run=1) as outer:
+            outer.add('bytes', 10)
+            with trace.span('inner'):
+                raise ValueError('boom')
+    inner, outer = [json.loads(line) for line in path.read_text(encoding='utf-8').splitlines()]
+    assert inner['parent_id'] == outer['span_id'] and inner['trace_id'] == outer['trace_id']
+    assert inner['status'] == outer['status'] == 'error' and 'boom' in inner['error']
+    assert outer['attrs'] == {'run': 1} and outer['counters'] == {'bytes': 10}
+    assert outer['duration_ms'] >= inner['duration_ms'] >= 0
+
+def test_disabled_spans_record_nothing():
+    with trace.span('idle') as item:
+        item.set('key', 'value')
+        trace.record_response(item, object())
+    assert item is trace.current()
+    assert trace.report([]) == {'trace_id': None, 'spans': [], 'summary': {}}
@@ -0,0 +1,74 @@
+import asyncio
+import gzip
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+import sys
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import httpx
+import pytest
+
+from utils import transport
+
+class Handler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'  # 支持长连接
+
+    def do_GET(self):
+        body = 'table3'.encode() * 100
+        if 'gzip' in self.headers.get('Accept-Encoding', ''):
+            body = gzip.compress(body)
+            self.send_response(200)
+            self.send_header('Content-Encoding', 'gzip')
+        else:
+            self.send_response(200)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+@pytest.fixture
+def server():
+    httpd = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+    thread = threading.Thread(target=httpd.serve_forever, daemon=True)
+    thread.start()
+    yield f"http://127.0.0.1:{httpd.server_address[1]}"
+    httpd.shutdown()
+    httpd.server_close()
+
+def host_stats():
+    return transport.stats().get('127.0.0.1', {'requests': 0, 'connections': 0, 'reused': 0})
+
+def test_sessions_share_keep_alive_connections(server):
+    before = host_stats()
+    for _ in range(3):
+        session = transport.new_session({'User-Agent': 'test'})
+        response = session.get(server + '/page')
+        assert response.text == 'table3' * 100
+        assert response.headers['Content-Encoding'] == 'gzip'
+        session.close()  # 不会关闭共享连接池
+    after = host_stats()
+    assert after['requests'] - before['requests'] == 3
+    assert after['connections'] - before['connections'] <= 1
+    assert after['reused'] - before['reused'] >= 2
+
+def test_async_clients_share_connections(server):
+    before = host_stats()
+
+    async def run():
+        for _ in range(3):
+            async with httpx.AsyncClient(transport=transport.async_transport()) as client:
+                response = await client.get(server + '/page', headers={'Accept-Encoding': transport.ACCEPT_ENCODING})
+                assert response.text == 'table3' * 100
+
+    asyncio.run(run())
+    after = host_stats()
+    assert after['requests'] - before['requests'] == 3
+    assert after['connections'] - before['connections'] == 1
+
+def test_host_timeouts():
+    assert transport.timeout_for('https://jwc.swjtu.edu.cn/vatuu/UserLoadingAction') == transport.HOST_TIMEOUTS['jwc.swjtu.edu.cn']
+    assert transport.timeout_for('api.github.com') == transport.HOST_TIMEOUTS['api.github.com']
+    assert transport.timeout_for('http://127.0.0.1:8000/') == transport.DEFAULT_TIMEOUT
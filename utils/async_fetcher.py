@@ -0,0 +1,389 @@
+# utils/async_fetcher.py
+"""
+ScoreFetcher 的 asyncio 版本，供 api/index.py 的异步路由使用
+
+登录、会话恢复与成绩抓取的判断、解析与合并都在 fetcher.BaseScoreFetcher 中，与 ScoreFetcher 共用；这里只负责发请求和等待：
+    - HTTP 请求使用 httpx.AsyncClient（共享 utils/transport 的连接池），不阻塞事件循环
+    - 验证码识别、HTML 解析、协议检测、会话的加解密与存储读写、熔断器写文件等会阻塞的操作放到线程池执行
+    - 同一事件循环内，对同一主机的并发请求数不超过 JWC_HOST_CONCURRENCY，多个账号可共享一个事件循环
+"""
+import asyncio
+import contextlib
+import os
+import time
+import weakref
+from urllib.parse import urlparse
+
+from pathlib import Path
+import sys
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import httpx
+
+from utils import fetcher, session_cache, trace, transport
+from utils.fetcher import (
+    ALL_SCORES_PATH, CAPTCHA_PATH, LOADING_PATH, LOGIN_API_PATH, LOGIN_PAGE_PATH, NORMAL_SCORES_PATH,
+)
+
+# 同一事件循环内对同一主机的最大并发请求数
+HOST_CONCURRENCY = int(os.getenv("JWC_HOST_CONCURRENCY", "4"))
+# 使用自动检测的地址时出现这些错误，需要重新检测协议（对应 fetcher.REPROBE_ERRORS）
+REPROBE_ERRORS = (httpx.ConnectError, httpx.TooManyRedirects)
+# 按网络错误处理的登录异常（见 fetcher.classify_login_exception）
+TRANSPORT_ERRORS = (httpx.TransportError, httpx.TooManyRedirects)
+
+# {事件循环: {主机: 信号量}}，事件循环结束后自动释放
+_host_limits = weakref.WeakKeyDictionary()
+
+def host_semaphore(host, limit=HOST_CONCURRENCY):
+    """返回当前事件循环中限制对 host 并发请求数的信号量"""
+    limits = _host_limits.setdefault(asyncio.get_running_loop(), {})
+    if host not in limits:
+        limits[host] = asyncio.Semaphore(limit)
+    return limits[host]
+
+class AsyncScoreFetcher(fetcher.BaseScoreFetcher):
+    def __init__(self, username, password, captcha_corpus_dir=fetcher.CAPTCHA_CORPUS_DIR, base_url=None,
+                 session_store=None, session_key=session_cache.SESSION_ENCRYPTION_KEY,
+                 host_concurrency=HOST_CONCURRENCY, circuit_breaker=None):
+        """参数同 ScoreFetcher；host_concurrency 为对教务主机的最大并发请求数"""
+        self.client = self._new_client()
+        self.host_concurrency = host_concurrency
+        super().__init__(username, password, captcha_corpus_dir, base_url, session_store, session_key, circuit_breaker)
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc_info):
+        await self.aclose()
+
+    async def aclose(self):
+        await self.client.aclose()
+
+    def _new_client(self):
+        """新建一个独立 Cookie 的客户端（共享 transport 的连接池）"""
+        return httpx.AsyncClient(headers={'Accept-Encoding': transport.ACCEPT_ENCODING, **fetcher.HEADERS},
+                                 follow_redirects=True, transport=transport.async_transport())
+
+    def _set_base_url(self, base_url):
+        super()._set_base_url(base_url)
+        self.client.headers['Origin'] = base_url
+
+    async def resolve_base_url(self, refresh=False):
+        """返回教务地址；需要检测时在线程池中调用 fetcher.resolve_base_url"""
+        if self._base_url is None or refresh:
+            self._set_base_url(await asyncio.to_thread(fetcher.resolve_base_url, refresh))
+        return self._base_url
+
+    def url(self, path):
+        """拼接教务页面的完整 URL（需先 resolve_base_url）"""
+        return self._base_url + path
+
+    async def _request(self, method, path, referer=None, timeout=None, client=None, span=None, **kwargs):
+        """
+        参数:
+            timeout: 为空时使用教务主机的默认超时（见 transport.HOST_TIMEOUTS）
+            client: 发请求的客户端，默认 self.client（并行登录时为各会话自己的客户端）
+            span: 提供时在检查状态码之前记录响应
+        """
+        base_url = await self.resolve_base_url()
+        headers = {'Referer': self.url(referer)} if referer else None
+        timeout = transport.async_timeout_for(base_url) if timeout is None else timeout
+        async with host_semaphore(urlparse(base_url).netloc, self.host_concurrency):
+            response = await (client or self.client).request(method, self.url(path), headers=headers, timeout=timeout, **kwargs)
+        if span is not None:
+            trace.record_response(span, response)
+        response.raise_for_status()
+        return response
+
+    async def ensure_login(self, **login_kwargs):
+        """先尝试恢复保存的会话，会话不可用时才调用 login（参数透传）"""
+        with trace.span('session.restore') as restore_span:
+            restored = await self.restore_session()
+            restore_span.set('restored', restored)
+        if restored:
+            await asyncio.to_thread(self._record_restored)
+            return True
+        return await self.login(**login_kwargs)
+
+    async def login(self, max_retries=10, retry_delay=1, min_confidence=fetcher.OCR_MIN_CONFIDENCE,
+                    parallel_sessions=fetcher.LOGIN_PARALLEL_SESSIONS, stagger=fetcher.LOGIN_PARALLEL_STAGGER):
+        """识别验证码并登录，按失败类别重试；参数含义同 ScoreFetcher.login"""
+        with trace.span('login', parallel_sessions=parallel_sessions) as login_span:
+            if parallel_sessions > 1:
+                failure = await self._login_parallel(max_retries, retry_delay, min_confidence, parallel_sessions, stagger)
+            else:
+                failure = await self._login_sequential(max_retries, retry_delay, min_confidence)
+            login_span.set('failure', failure)
+        return await asyncio.to_thread(self._record_login, failure)
+
+    async def _login_sequential(self, max_retries, retry_delay, min_confidence):
+        """逐次尝试登录；返回 None 表示成功，否则为最后一次失败的类别"""
+        retry = fetcher.LoginRetry(retry_delay)
+        failure = None
+        for attempt in range(1, max_retries + 1):
+            print(f"--- 登录尝试 #{attempt}/{max_retries} ---")
+
+            try:
+                status, captcha_code, captcha_bytes = await self._attempt_login(
+                    self.client, min_confidence if attempt < max_retries else 0.0)
+                if status == 'low_confidence':
+                    continue
+                if status == 'success':
+                    await self._finish_login(captcha_code, captcha_bytes)
+                    return None
+                failure = status
+
+            except Exception as e:
+                print(f"登录过程中发生异常: {e}")
+                failure = fetcher.classify_login_exception(e, TRANSPORT_ERRORS)
+                if isinstance(e, REPROBE_ERRORS) and self._base_url_detected:
+                    print("连接或重定向异常，重新检测教务访问协议...")
+                    await self.resolve_base_url(refresh=True)
+
+            wait = retry.after_failure(failure, attempt < max_retries)
+            if wait is None:
+                return failure
+            if wait:
+                await asyncio.sleep(wait)
+
+        print(f"\n登录失败 {max_retries} 次，程序终止。")
+        return failure
+
+    async def _attempt_login(self, client, min_confidence, submit_lock=None, cancelled=None):
+        """
+        用 client 完成一次 获取验证码 → 识别 → 提交登录；返回值同 ScoreFetcher._attempt_login
+
+        参数:
+            submit_lock: 并行登录时串行化提交的 asyncio.Lock
+            cancelled: 并行登录时已有会话成功后被设置的 asyncio.Event
+        """
+        # 1. 获取并识别验证码
+        trace.current().add('attempts')
+        print("正在获取验证码...")
+        with trace.span('captcha.download') as download_span:
+            response = await self._request('GET', CAPTCHA_PATH, params={'test': int(time.time() * 1000)}, timeout=10,
+                                           client=client, span=download_span)
+        captcha_bytes = response.content
+        ocr_result = await asyncio.to_thread(fetcher.recognize_captcha, captcha_bytes)
+        status, captcha_code = fetcher.screen_captcha(ocr_result, min_confidence)
+        if status:
+            return status, captcha_code, captcha_bytes
+
+        # 2. 尝试API登录
+        async with submit_lock or contextlib.nullcontext():
+            if cancelled is not None and cancelled.is_set():
+                return 'cancelled', captcha_code, captcha_bytes
+            print("正在尝试登录API...")
+            with trace.span('login.post') as post_span:
+                response = await self._request('POST', LOGIN_API_PATH, referer=LOGIN_PAGE_PATH, data=self._login_payload(captcha_code),
+                                               timeout=10, client=client, span=post_span)
+                login_result = response.json()
+                post_span.set('login_status', login_result.get('loginStatus'))
+            status = fetcher.login_response_status(login_result)
+            if status == 'success' and cancelled is not None:
+                cancelled.set()
+        return status, captcha_code, captcha_bytes
+
+    async def _finish_login(self, captcha_code, captcha_bytes):
+        """登录API验证成功后建立完整会话"""
+        if self.captcha_corpus_dir:
+            await asyncio.to_thread(self._harvest_captcha, captcha_code, captcha_bytes)
+        print("正在访问加载页面以建立完整会话...")
+        with trace.span('session.establish') as establish_span:
+            await self._request('GET', LOADING_PATH, referer=LOGIN_PAGE_PATH, timeout=10, span=establish_span)
+            print("会话建立成功，已登录。")
+            self.is_logged_in = True
+            await self.save_session()
+
+    async def _login_parallel(self, max_retries, retry_delay, min_confidence, parallel_sessions, stagger):
+        """
+        每轮用 parallel_sessions 个独立客户端同时尝试登录，保留第一个成功的客户端；轮次、重试与返回值同 ScoreFetcher._login_parallel
+
+        提交登录由 submit_lock 串行化，并行的只有验证码下载与识别。有会话成功（或出现账号密码错误、登录受限）后，
+        其余尚未结束的尝试直接取消，不再占用连接。
+        """
+        await self.resolve_base_url()
+        retry = fetcher.LoginRetry(retry_delay)
+        remaining = max_retries
+        round_number = 0
+        while remaining > 0:
+            round_number += 1
+            count = min(parallel_sessions, remaining)
+            remaining -= count
+            print(f"--- 并行登录第 {round_number} 轮：{count} 个会话 ---")
+
+            submit_lock = asyncio.Lock()
+            cancelled = asyncio.Event()
+            round_min_confidence = 0.0 if remaining == 0 else min_confidence
+            login_round = fetcher.LoginRound(TRANSPORT_ERRORS, REPROBE_ERRORS)
+            tasks = {}
+            for i in range(count):
+                client = self._new_client()
+                client.headers['Origin'] = self._base_url
+                tasks[asyncio.create_task(self._staggered_attempt(client, i * stagger, round_min_confidence,
+                                                                  submit_lock, cancelled))] = client
+            pending = set(tasks)
+            done_round = False
+            while pending and not done_round:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    try:
+                        done_round = login_round.record(tasks[task], task.result()) or done_round
+                    except Exception as e:
+                        login_round.record(tasks[task], error=e)
+            cancelled.set()
+            for task in pending:
+                task.cancel()
+            await asyncio.gather(*pending, return_exceptions=True)
+
+            winner = login_round.winner[0] if login_round.winner else None
+            for client in tasks.values():
+                if client is not winner:
+                    await client.aclose()
+            if winner is not None:
+                _, captcha_code, captcha_bytes = login_round.winner
+                replaced, self.client = self.client, winner
+                await replaced.aclose()
+                try:
+                    await self._finish_login(captcha_code, captcha_bytes)
+                    return None
+                except Exception as e:
+                    print(f"登录过程中发生异常: {e}")
+                    login_round.failures.add(fetcher.classify_login_exception(e, TRANSPORT_ERRORS))
+            failure = login_round.failure
+            wait = retry.after_failure(failure, remaining > 0)
+            if wait is None:
+                return failure
+            if login_round.reprobe and self._base_url_detected:
+                print("连接或重定向异常，重新检测教务访问协议...")
+                await self.resolve_base_url(refresh=True)
+            if wait:
+                await asyncio.sleep(wait)
+
+        print(f"\n登录失败 {max_retries} 次，程序终止。")
+        return failure
+
+    async def _staggered_attempt(self, client, delay, min_confidence, submit_lock, cancelled):
+        if delay:
+            try:
+                await asyncio.wait_for(cancelled.wait(), delay)
+                return 'cancelled', None, None
+            except asyncio.TimeoutError:
+                pass
+        return await self._attempt_login(client, min_confidence, submit_lock, cancelled)
+
+    async def restore_session(self):
+        """载入保存的会话并访问全部成绩页验证其是否有效；有效时成绩页留给 get_all_scores 使用"""
+        if not self.session_store:
+            return False
+        # 读取存储与派生解密密钥都会阻塞
+        state = await asyncio.to_thread(self._read_saved_session)
+        if state is None or not self._load_session_state(self.client.cookies.jar, state, await self.resolve_base_url()):
+            return False
+
+        print("正在验证保存的登录会话...")
+        cookies_before = dict(self.client.cookies)
+        try:
+            with trace.span('page.fetch', page='all_scores') as fetch_span:
+                response = await self._request('GET', ALL_SCORES_PATH, referer=LOADING_PATH, span=fetch_span)
+        except Exception as e:
+            print(f"验证登录会话时出错: {e}")
+            self.client.cookies.clear()
+            return False
+        if not self._accept_restored_page(str(response.url), response.text):
+            self.client.cookies.clear()
+            return False
+
+        if dict(self.client.cookies) != cookies_before:
+            await self.save_session()
+        return True
+
+    async def save_session(self):
+        """加密保存当前会话的 Cookie；失败不影响登录"""
+        if self.session_store:
+            await asyncio.to_thread(self._store_session, self.client.cookies.jar)
+
+    async def _download_page(self, path, referer_path, delay=0):
+        """下载成绩页面 HTML 并记录其指纹；已在验证会话时下载过的页面直接返回"""
+        html = self._prefetched.pop(path, None)
+        if html is None:
+            if delay:
+                await asyncio.sleep(delay)
+            with trace.span('page.fetch', page=fetcher.FINGERPRINT_PAGES.get(path, path)) as fetch_span:
+                response = await self._request('GET', path, referer=referer_path, span=fetch_span)
+                html = response.text
+        return self._record_page(path, html)
+
+    async def scores_unchanged(self, known_fingerprints, delay=fetcher.SCORES_FETCH_DELAY):
+        """参数与返回值同 ScoreFetcher.scores_unchanged"""
+        if not self.is_logged_in or not known_fingerprints:
+            return False
+        for path, referer_path, wait in ((ALL_SCORES_PATH, LOADING_PATH, 0), (NORMAL_SCORES_PATH, ALL_SCORES_PATH, delay)):
+            try:
+                self._prefetched[path] = await self._download_page(path, referer_path, wait)
+            except Exception as e:
+                print(f"计算页面指纹时下载失败: {e}")
+                return False
+            if not self._page_unchanged(path, known_fingerprints):
+                return False
+        return True
+
+    async def get_all_scores(self, html=None, known_scores=None):
+        """参数含义同 ScoreFetcher.get_all_scores"""
+        if not self.is_logged_in:
+            print("错误：未登录。")
+            return None
+
+        print("\n正在查询全部成绩记录...")
+        try:
+            if html is None:
+                html = await self._download_page(ALL_SCORES_PATH, LOADING_PATH)
+            return await asyncio.to_thread(self._parse_all_scores, html, known_scores)
+
+        except Exception as e:
+            print(f"获取全部成绩时出错: {e}")
+            return None
+
+    async def get_normal_scores(self, html=None):
+        """html: 已下载的页面（由 get_combined_scores 传入），为空时自行请求"""
+        if not self.is_logged_in:
+            print("错误：未登录。")
+            return None
+
+        print("\n正在查询平时成绩明细...")
+        try:
+            if html is None:
+                html = await self._download_page(NORMAL_SCORES_PATH, ALL_SCORES_PATH)
+            return await asyncio.to_thread(self._parse_normal_scores, html)
+
+        except Exception as e:
+            print(f"获取平时成绩时出错: {e}")
+            return None
+
+    async def get_combined_scores(self, concurrent=fetcher.SCORES_FETCH_CONCURRENT, delay=fetcher.SCORES_FETCH_DELAY,
+                                  known_scores=None, incremental=fetcher.SCORES_INCREMENTAL):
+        """获取总成绩和平时成绩并合并；参数含义同 ScoreFetcher.get_combined_scores"""
+        if not self.is_logged_in:
+            print("错误：未登录。")
+            return None
+        known_scores = known_scores if incremental else None
+
+        if concurrent:
+            normal_task = asyncio.create_task(self._download_page(NORMAL_SCORES_PATH, ALL_SCORES_PATH))
+            all_scores = await self.get_all_scores(known_scores=known_scores)
+        else:
+            try:
+                all_html = await self._download_page(ALL_SCORES_PATH, LOADING_PATH)
+            except Exception as e:
+                print(f"获取全部成绩时出错: {e}")
+                all_html = None
+            normal_task = asyncio.create_task(self._download_page(NORMAL_SCORES_PATH, ALL_SCORES_PATH, delay))
+            all_scores = await self.get_all_scores(all_html, known_scores) if all_html is not None else None
+        try:
+            normal_html = await normal_task
+        except Exception as e:
+            print(f"获取平时成绩时出错: {e}")
+            normal_html = None
+        normal_scores = await self.get_normal_scores(normal_html) if normal_html is not None else None
+        return self._merge(all_scores, normal_scores)
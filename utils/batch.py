@@ -0,0 +1,178 @@
+# utils/batch.py
+"""
+批量监控多个账号
+
+账号列表来自 JSON 文件，或存储后端（Gist 中的 database.ACCOUNTS_FILENAME，内容可用 SESSION_ENCRYPTION_KEY 加密）:
+    [{"username": "2024000000", "password": "...", "email": "收件邮箱（可选）"}, ...]
+
+每个账号在线程池中各自执行一次 utils/monitor.py 的流程：
+    - 存储隔离：每个账号使用 Gist 中独立的一组文件（database.store_for），页面指纹缓存按学号区分
+    - 失败隔离：某个账号出错只记入该账号的结果，不影响其他账号
+    - 所有线程共享教务主机的请求速率上限（transport.set_rate_limit）
+报告中包含每个账号各阶段的耗时与 span 汇总（见 utils/trace.py），以及整批的吞吐量。
+"""
+import json
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlparse
+
+from utils import fetcher, session_cache, trace, transport
+from utils.monitor import monitor_account
+
+# 同时处理的账号数
+BATCH_WORKERS = int(os.getenv("BATCH_WORKERS", "4"))
+# 批量监控时对教务的总请求速率上限（每秒请求数，0 为不限制）
+BATCH_JWC_RATE_LIMIT = float(os.getenv("BATCH_JWC_RATE_LIMIT", "5"))
+# 账号列表文件；为空时从存储后端读取
+ACCOUNTS_FILE = os.getenv("ACCOUNTS_FILE")
+
+def parse_accounts(content, key=session_cache.SESSION_ENCRYPTION_KEY):
+    """
+    解析账号列表（JSON，或 session_cache.encrypt 加密后的 JSON）
+
+    异常:
+        ValueError: 无法解析、缺少学号或密码、学号重复
+    """
+    try:
+        data = json.loads(content)
+    except ValueError:
+        if not key:
+            raise ValueError("账号列表不是 JSON，且未设置 SESSION_ENCRYPTION_KEY，无法解密")
+        data = json.loads(session_cache.decrypt(content.strip(), key))
+    if not isinstance(data, list):
+        raise ValueError("账号列表应为 JSON 数组")
+
+    accounts = []
+    seen = set()
+    for entry in data:
+        if not isinstance(entry, dict) or not entry.get('username') or not entry.get('password'):
+            raise ValueError("每个账号都需要 username 与 password")
+        account = dict(entry, username=str(entry['username']))
+        # 同一学号出现两次会在同一组存储文件上相互覆盖
+        if account['username'] in seen:
+            raise ValueError(f"账号重复: {account['username']}")
+        seen.add(account['username'])
+        accounts.append(account)
+    return accounts
+
+def load_accounts(path=ACCOUNTS_FILE, store=None):
+    """
+    读取账号列表
+
+    参数:
+        path: 账号列表文件；为空时从 store 读取
+        store: 提供 get_accounts() 的存储后端，默认 utils.database
+    """
+    if path:
+        with open(path, encoding='utf-8') as f:
+            return parse_accounts(f.read())
+    if store is None:
+        from utils import database as store
+    content = store.get_accounts()
+    if not content:
+        raise ValueError("存储后端中没有账号列表")
+    return parse_accounts(content)
+
+def run_batch(accounts, job, workers=BATCH_WORKERS):
+    """
+    在线程池中对每个账号调用 job(account)
+
+    job 返回结果字典；抛出异常时该账号记为失败，其余账号照常执行。
+
+    返回:
+        {'accounts': [{'username', 'status', 'elapsed', 'result' 或 'error'}, ...]（与 accounts 顺序相同），
+         'total', 'succeeded', 'failed', 'wall_time'（秒）, 'accounts_per_minute'}
+    """
+    def run(account):
+        start = time.perf_counter()
+        entry = {'username': account['username']}
+        try:
+            entry['result'] = job(account)
+            entry['status'] = 'success'
+        except Exception as e:
+            print(f"[{account['username']}] 处理失败: {e}")
+            entry['status'] = 'error'
+            entry['error'] = str(e)
+        entry['elapsed'] = time.perf_counter() - start
+        return entry
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=max(1, workers)) as pool:
+        entries = list(pool.map(run, accounts))
+    wall_time = time.perf_counter() - start
+
+    succeeded = sum(entry['status'] == 'success' for entry in entries)
+    return {
+        'accounts': entries,
+        'total': len(entries),
+        'succeeded': succeeded,
+        'failed': len(entries) - succeeded,
+        'wall_time': wall_time,
+        'accounts_per_minute': len(entries) / wall_time * 60 if wall_time else 0.0,
+    }
+
+def monitor_accounts(accounts, notify, store_for=None, breaker=None, workers=BATCH_WORKERS,
+                     rate_limit=BATCH_JWC_RATE_LIMIT, **fetcher_kwargs):
+    """
+    批量执行成绩监控
+
+    参数:
+        notify: notify(account, changes)，某个账号检测到变化时调用
+        store_for: store_for(username) 返回该账号的存储，默认 database.store_for
+        breaker: CircuitBreaker；整批只记录一次：有账号连上服务器即复位，全部因网络错误登录失败才计一次失败
+        rate_limit: 教务主机的总请求速率上限（每秒请求数）
+        fetcher_kwargs: 透传给 ScoreFetcher（如 captcha_corpus_dir）
+
+    返回:
+        run_batch 的报告，另含 'host' 与 'host_requests'（本批对教务发出的请求数）、'requests_per_second'
+    """
+    if store_for is None:
+        from utils.database import store_for
+    # 协议检测与 OCR 模板库只在开始前准备一次，避免各线程同时探测、构建
+    base_url = fetcher.BASE_URL_OVERRIDE or fetcher.resolve_base_url()
+    host = urlparse(base_url).hostname
+    transport.set_rate_limit(host, rate_limit)
+    fetcher.ocr.get_template_bank()
+    requests_before = transport.stats().get(host, {}).get('requests', 0)
+
+    reached, unreachable = [], []
+
+    def job(account):
+        store = store_for(account['username'])
+        score_fetcher = fetcher.ScoreFetcher(account['username'], account['password'],
+                                             session_store=store, **fetcher_kwargs)
+        try:
+            with trace.collect() as spans:
+                with trace.span('monitor', username=account['username']):
+                    result = monitor_account(score_fetcher, store, lambda changes: notify(account, changes))
+            result['trace'] = trace.summarize(spans)
+            return result
+        finally:
+            if score_fetcher.is_logged_in or score_fetcher.login_failure not in (None, fetcher.LOGIN_FAILURE_TRANSPORT):
+                reached.append(account['username'])
+            elif score_fetcher.login_failure == fetcher.LOGIN_FAILURE_TRANSPORT:
+                unreachable.append(account['username'])
+
+    report = run_batch(accounts, job, workers)
+
+    if breaker:
+        if reached:
+            breaker.record_success()
+        elif unreachable:
+            breaker.record_failure()
+    report['host'] = host
+    report['host_requests'] = transport.stats().get(host, {}).get('requests', 0) - requests_before
+    report['requests_per_second'] = report['host_requests'] / report['wall_time'] if report['wall_time'] else 0.0
+    return report
+
+def print_report(report):
+    for entry in report['accounts']:
+        timings = (entry.get('result') or {}).get('timings', {})
+        stages = '  '.join(f"{stage} {seconds:.2f}s" for stage, seconds in timings.items())
+        outcome = entry['result']['message'] if entry['status'] == 'success' else entry['error']
+        print(f"[{entry['username']}] {entry['status']}  {entry['elapsed']:.2f}s  {stages}  {outcome}")
+    print(f"共 {report['total']} 个账号，成功 {report['succeeded']}，失败 {report['failed']}，"
+          f"耗时 {report['wall_time']:.1f}s，吞吐量 {report['accounts_per_minute']:.1f} 个账号/分钟")
+    if 'host_requests' in report:
+        print(f"{report['host']}: {report['host_requests']} 个请求，{report['requests_per_second']:.2f} 个/秒")
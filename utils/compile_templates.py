@@ -0,0 +1,56 @@
+# utils/compile_templates.py
+"""
+把 utils/templates/*.png 预编译为 utils/templates_compiled.py
+
+产物中保存每个模板的尺寸、逐行位掩码和黑色像素数，以及模板文件的摘要。
+utils/ocr 直接导入该产物，冷启动时无需解码 PNG；模板图片变化后产物
+会被判定为过期，此时自动回退到解码 PNG，重新运行本脚本即可更新。
+
+用法:
+    python utils/compile_templates.py          # 重新生成产物
+    python utils/compile_templates.py --check  # 仅检查产物是否过期（过期时退出码为 1）
+"""
+from pathlib import Path
+import sys, os
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from utils import ocr
+
+OUTPUT_PATH = os.path.join(ocr.PROJECT_ROOT, 'utils', 'templates_compiled.py')
+
+def render_compiled_templates(template_dir=ocr.TEMPLATE_DIR):
+    """生成预编译产物的源码"""
+    templates = ocr.load_templates(template_dir)
+    if not templates:
+        raise ValueError(f"模板文件夹为空或不存在: {template_dir}")
+
+    lines = [
+        "# 由 utils/compile_templates.py 自动生成，请勿手动修改",
+        "# 每项为 (字符名, 宽度, 高度, 逐行位掩码, 黑色像素数)",
+        f"DIGEST = {ocr.template_digest(template_dir)!r}",
+        "",
+        "TEMPLATES = (",
+    ]
+    for name, img in templates.items():
+        glyph = ocr.pack_glyph(img)
+        rows = ", ".join(hex(row) for row in glyph.rows)
+        lines.append(f"    ({name!r}, {glyph.width}, {glyph.height}, ({rows},), {glyph.black_count}),")
+    lines.append(")")
+    return "\n".join(lines) + "\n"
+
+def compile_templates(template_dir=ocr.TEMPLATE_DIR, output_path=OUTPUT_PATH):
+    """写出预编译产物，返回模板数量"""
+    source = render_compiled_templates(template_dir)
+    with open(output_path, 'w', encoding='utf-8') as f:
+        f.write(source)
+    return source.count("\n    (")
+
+if __name__ == '__main__':
+    if '--check' in sys.argv[1:]:
+        if ocr.load_compiled_templates() is None:
+            print("❌ 预编译模板已过期或不存在，请运行 python utils/compile_templates.py")
+            sys.exit(1)
+        print("✅ 预编译模板与模板图片一致")
+    else:
+        count = compile_templates()
+        print(f"✅ 已编译 {count} 个模板 → {os.path.relpath(OUTPUT_PATH, ocr.PROJECT_ROOT)}")
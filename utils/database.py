@@ -1,8 +1,12 @@
 import json
 import os
+import re
+import threading
 import requests
 from datetime import datetime, timezone
 
+from utils import trace, transport
+
 # --- 配置部分 ---
 GIST_PAT = os.getenv("GIST_PAT")
 # 默认文件名为 scores.json，用户也可以通过环境变量覆盖
@@ -17,13 +21,25 @@ if not GIST_PAT:
 if not GIST_FILENAME.endswith(".json"):
     GIST_FILENAME += ".json"
 
+
+# 批量监控时账号列表存放在同一个 Gist 的该文件中（见 utils/batch.py 的 load_accounts）
+ACCOUNTS_FILENAME = os.getenv("ACCOUNTS_GIST_NAME", "accounts.json")
+
 _CACHED_GIST_ID = None
+# 批量监控时多个线程同时写入同一个 Gist，串行提交以免相互冲突
+_write_lock = threading.Lock()
+# 已下载的 Gist 文件内容 {文件名: {"content": ...}}：一次运行只下载一次，各组文件（批量监控时的各账号）共用，
+# 写入后同步更新；长期运行的进程（API）在每次运行开始时调用 refresh
+_files_cache = None
+_files_lock = threading.Lock()
 
 BASE_URL = "https://api.github.com/gists"
 HEADERS = {
     "Authorization": f"token {GIST_PAT}",
     "Accept": "application/vnd.github.v3+json"
 }
+# Gist API 的请求共用一个会话，复用与 api.github.com 的长连接（见 utils/transport.py）
+_http = transport.new_session(HEADERS)
 
 def _get_or_create_gist_id():
     """
@@ -39,7 +55,7 @@ def _get_or_create_gist_id():
 
     try:
         # 获取用户的所有 Gist
-        response = requests.get(BASE_URL, headers=HEADERS)
+        response = _http.get(BASE_URL)
         response.raise_for_status()
         gists = response.json()
 
@@ -71,7 +87,7 @@ def _get_or_create_gist_id():
             }
         }
         
-        create_response = requests.post(BASE_URL, headers=HEADERS, json=create_payload)
+        create_response = _http.post(BASE_URL, json=create_payload)
         create_response.raise_for_status()
         
         new_gist = create_response.json()
@@ -83,49 +99,146 @@ def _get_or_create_gist_id():
         print(f"GitHub API 操作失败: {e}")
         raise e
 
-# 下面的 save_scores 和 get_latest_scores 函数逻辑不变，
-# 它们会自动调用上面更新过的 _get_or_create_gist_id
-def save_scores(scores: list, ttl_seconds: int = None):
-    try:
-        gist_id = _get_or_create_gist_id()
-        timestamp = datetime.now(timezone.utc).isoformat()
-        content_str = json.dumps(scores, ensure_ascii=False, indent=2)
-        
-        update_url = f"{BASE_URL}/{gist_id}"
-        payload = {
-            "files": {
-                GIST_FILENAME: {
-                    "content": content_str
-                }
-            }
-        }
-        
-        response = requests.patch(update_url, headers=HEADERS, json=payload)
-        response.raise_for_status()
-        
-        print(f"--- 成功保存到 Gist ---")
-        return f"saved@{timestamp}"
-    except Exception as e:
-        print(f"保存失败: {e}")
-        return None
+def refresh():
+    """丢弃已下载的 Gist 内容，下次读取时重新下载"""
+    global _files_cache
+    with _files_lock:
+        _files_cache = None
 
-def get_latest_scores():
-    try:
+def _read_files():
+    """返回 Gist 中全部文件的内容，本次运行第一次读取时才下载"""
+    global _files_cache
+    with _files_lock:
+        if _files_cache is None:
+            with trace.span('gist.read') as read_span:
+                gist_id = _get_or_create_gist_id()
+                response = _http.get(f"{BASE_URL}/{gist_id}")
+                trace.record_response(read_span, response)
+                response.raise_for_status()
+                _files_cache = response.json().get("files", {})
+        return _files_cache
+
+def _write_files(files):
+    with trace.span('gist.write', files=sorted(files)) as write_span:
         gist_id = _get_or_create_gist_id()
-        get_url = f"{BASE_URL}/{gist_id}"
-        
-        response = requests.get(get_url, headers=HEADERS)
-        response.raise_for_status()
-        
-        data = response.json()
-        files = data.get("files", {})
-        
-        if GIST_FILENAME not in files:
-            return []
-            
-        file_content = files[GIST_FILENAME].get("content")
-        return json.loads(file_content) if file_content else []
+        payload = {"files": {name: {"content": content} for name, content in files.items()}}
+        write_span.add('bytes_sent', sum(len(content.encode('utf-8')) for content in files.values()))
+        with _write_lock:
+            response = _http.patch(f"{BASE_URL}/{gist_id}", json=payload)
+            trace.record_response(write_span, response)
+            response.raise_for_status()
+            with _files_lock:
+                if _files_cache is not None:
+                    _files_cache.update({name: {"content": content} for name, content in files.items()})
+
+class GistStore:
+    """
+    一组成绩、登录会话与页面指纹文件，都存放在同一个 Gist 中
+
+    默认的一组（GIST_FILENAME）对应单账号运行，模块级的 save_scores 等函数即为它的方法；
+    批量监控时每个账号使用 store_for(username) 返回的独立文件，互不覆盖。
+    各组文件的读取共用同一份已下载的 Gist 内容（见 _read_files）。
+    """
+    def __init__(self, filename=GIST_FILENAME):
+        if not filename.endswith(".json"):
+            filename += ".json"
+        self.filename = filename
+        # 加密后的登录会话（见 utils/session_cache.py）
+        self.session_filename = filename[:-len(".json")] + ".session"
+        # 最近一次保存成绩时两个成绩页的指纹，与成绩在同一次请求中写入（见 utils/fetcher.py 的 table_fingerprint）
+        self.fingerprint_filename = filename[:-len(".json")] + ".fingerprints.json"
+
+    def save_scores(self, scores: list, ttl_seconds: int = None, fingerprints: dict = None):
+        """fingerprints: 对应这份成绩的页面指纹，提供时一并保存"""
+        try:
+            timestamp = datetime.now(timezone.utc).isoformat()
+            files = {self.filename: json.dumps(scores, ensure_ascii=False, indent=2)}
+            if fingerprints:
+                files[self.fingerprint_filename] = json.dumps(fingerprints)
+            _write_files(files)
+
+            print(f"--- 成功保存到 Gist ---")
+            return f"saved@{timestamp}"
+        except Exception as e:
+            print(f"保存失败: {e}")
+            return None
+
+    def get_latest_scores(self):
+        try:
+            files = _read_files()
+            if self.filename not in files:
+                return []
 
+            file_content = files[self.filename].get("content")
+            return json.loads(file_content) if file_content else []
+
+        except Exception as e:
+            print(f"读取失败: {e}")
+            return None
+
+    def save_session(self, token: str):
+        """保存加密后的登录会话，失败返回 None"""
+        try:
+            _write_files({self.session_filename: token})
+            print(f"--- 登录会话已保存到 Gist ---")
+            return True
+        except Exception as e:
+            print(f"保存登录会话失败: {e}")
+            return None
+
+    def get_session(self):
+        """读取加密后的登录会话，不存在或读取失败时返回 None"""
+        try:
+            files = _read_files()
+            if self.session_filename not in files:
+                return None
+            return files[self.session_filename].get("content") or None
+        except Exception as e:
+            print(f"读取登录会话失败: {e}")
+            return None
+
+    def save_fingerprints(self, fingerprints: dict):
+        """只更新页面指纹（成绩内容未变化时使用），失败返回 None"""
+        try:
+            _write_files({self.fingerprint_filename: json.dumps(fingerprints)})
+            return True
+        except Exception as e:
+            print(f"保存页面指纹失败: {e}")
+            return None
+
+    def get_fingerprints(self):
+        """读取最近一次保存成绩时的页面指纹，不存在或读取失败时返回 None"""
+        try:
+            files = _read_files()
+            if self.fingerprint_filename not in files:
+                return None
+            content = files[self.fingerprint_filename].get("content")
+            return json.loads(content) if content else None
+        except Exception as e:
+            print(f"读取页面指纹失败: {e}")
+            return None
+
+def store_for(username):
+    """批量监控时该账号独立的一组文件，如 scores-2024000000.json"""
+    safe_name = re.sub(r'[^0-9A-Za-z_.-]', '_', str(username))
+    return GistStore(f"{GIST_FILENAME[:-len('.json')]}-{safe_name}.json")
+
+def get_accounts():
+    """读取 ACCOUNTS_FILENAME 的原始内容（JSON 或加密后的字符串），不存在或读取失败时返回 None"""
+    try:
+        files = _read_files()
+        if ACCOUNTS_FILENAME not in files:
+            return None
+        return files[ACCOUNTS_FILENAME].get("content") or None
     except Exception as e:
-        print(f"读取失败: {e}")
-        return None
\ No newline at end of file
+        print(f"读取账号列表失败: {e}")
+        return None
+
+# 单账号运行使用默认的一组文件，保持原有的模块级接口
+_default_store = GistStore(GIST_FILENAME)
+save_scores = _default_store.save_scores
+get_latest_scores = _default_store.get_latest_scores
+save_session = _default_store.save_session
+get_session = _default_store.get_session
+save_fingerprints = _default_store.save_fingerprints
+get_fingerprints = _default_store.get_fingerprints
@@ -1,226 +1,1065 @@
 # scraper/fetcher.py
 import requests
-from bs4 import BeautifulSoup
+import hashlib
+import json
+import random
 import time
 import logging
+import contextlib
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
 
 from pathlib import Path
 import sys, os
 sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
 from utils import ocr  # 导入自定义OCR模块
+from utils import session_cache, table_extractor, trace, transport
 from urllib.parse import urlparse
 
 # --- 配置与常量 ---
-BASE_URL = "https://jwc.swjtu.edu.cn"
-
-# 发起请求，允许重定向
-response = requests.get(
-    BASE_URL,
-    timeout=5,
-    allow_redirects=True,  # 自动跟随重定向
-    verify=True  # 验证 SSL 证书
+# 导入本模块时不发起任何网络请求；教务实际使用的协议在第一次需要 URL 时才检测（见 resolve_base_url）
+JWC_DOMAIN = "jwc.swjtu.edu.cn"
+BASE_URL = f"https://{JWC_DOMAIN}"
+# 指定后 ScoreFetcher 默认使用该地址、不再检测协议，如指向 test/jwc_server.py 的本地模拟服务器
+BASE_URL_OVERRIDE = os.getenv("JWC_BASE_URL")
+
+LOGIN_PAGE_PATH = "/service/login.html"
+LOGIN_API_PATH = "/vatuu/UserLoginAction"
+CAPTCHA_PATH = "/vatuu/GetRandomNumberToJPEG"
+LOADING_PATH = "/vatuu/UserLoadingAction"
+ALL_SCORES_PATH = "/vatuu/StudentScoreInfoAction?setAction=studentScoreQuery&viewType=studentScore&orderType=submitDate&orderValue=desc"
+NORMAL_SCORES_PATH = "/vatuu/StudentScoreInfoAction?setAction=studentNormalMark"
+
+# 协议检测结果的本地缓存文件及其有效期（秒）；GitHub Actions 中由 actions/cache 在多次运行间保留
+BASE_URL_CACHE_PATH = os.getenv("JWC_BASE_URL_CACHE",
+                                str(Path(__file__).resolve().parent.parent / ".cache" / "jwc_base_url.json"))
+BASE_URL_CACHE_TTL = int(os.getenv("JWC_BASE_URL_CACHE_TTL", str(7 * 24 * 3600)))
+# 使用缓存的地址时出现这些错误，说明协议可能已变化，需要重新检测
+REPROBE_ERRORS = (requests.exceptions.ConnectionError, requests.exceptions.TooManyRedirects)
+
+_resolved_base_url = None
+
+def load_cached_base_url(cache_path=BASE_URL_CACHE_PATH, ttl=BASE_URL_CACHE_TTL, now=None):
+    """读取未过期的协议检测结果（detect_base_url 的详细结果），不存在、损坏或过期时返回 None"""
+    try:
+        with open(cache_path, encoding='utf-8') as f:
+            details = json.load(f)
+        checked_at = float(details['checked_at'])
+        base_url = details['base_url']
+    except (OSError, ValueError, KeyError, TypeError):
+        return None
+    now = time.time() if now is None else now
+    if not base_url or not 0 <= now - checked_at < ttl:
+        return None
+    return details
+
+def _write_json_cache(cache_path, data):
+    """原子地写入 JSON 缓存文件（先写临时文件再替换）"""
+    os.makedirs(os.path.dirname(cache_path) or '.', exist_ok=True)
+    tmp_path = f"{cache_path}.tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(data, f, ensure_ascii=False, indent=2)
+    os.replace(tmp_path, cache_path)
+
+def save_cached_base_url(details, cache_path=BASE_URL_CACHE_PATH):
+    """写入协议检测结果；写入失败只打印提示"""
+    try:
+        _write_json_cache(cache_path, details)
+    except OSError as e:
+        print(f"保存协议检测缓存失败: {e}")
+
+def resolve_base_url(refresh=False, cache_path=BASE_URL_CACHE_PATH, ttl=BASE_URL_CACHE_TTL):
+    """
+    返回教务实际使用的 BASE_URL
+
+    依次使用进程内缓存、未过期的缓存文件，都没有时才调用 detect_base_url 探测并写回缓存文件。
+    refresh=True 时忽略缓存重新探测（使用缓存地址遇到连接或重定向错误时由 ScoreFetcher 调用）。
+    """
+    global _resolved_base_url
+    if _resolved_base_url is not None and not refresh:
+        return _resolved_base_url
+
+    details = None if refresh else load_cached_base_url(cache_path, ttl)
+    if details:
+        print(f"使用缓存的协议检测结果: {details['base_url']}")
+    else:
+        details = detect_base_url(JWC_DOMAIN, return_details=True)
+        # 探测全部失败时的兜底地址不写入缓存，下次启动重新探测
+        if details['final_url']:
+            save_cached_base_url(details, cache_path)
+    _resolved_base_url = details['base_url']
+    return _resolved_base_url
+
+# 上次保存成绩时两个成绩页的指纹（见 table_fingerprint），与协议检测缓存一样由 actions/cache 保留；
+# 本地没有时再读取 Gist 中随成绩一起保存的指纹
+FINGERPRINT_CACHE_PATH = os.getenv("JWC_FINGERPRINT_CACHE",
+                                   str(Path(__file__).resolve().parent.parent / ".cache" / "jwc_fingerprints.json"))
+
+def load_cached_fingerprints(username, cache_path=FINGERPRINT_CACHE_PATH):
+    """读取该账号上次保存的页面指纹，不存在或损坏时返回 None"""
+    try:
+        with open(cache_path, encoding='utf-8') as f:
+            fingerprints = json.load(f)[username]
+    except (OSError, ValueError, KeyError, TypeError):
+        return None
+    return fingerprints if isinstance(fingerprints, dict) else None
+
+# 批量监控时多个线程会同时写入同一个指纹缓存文件
+_fingerprint_cache_lock = threading.Lock()
+
+def save_cached_fingerprints(username, fingerprints, cache_path=FINGERPRINT_CACHE_PATH):
+    """写入该账号的页面指纹（保留文件中其他账号的指纹）；写入失败只打印提示"""
+    with _fingerprint_cache_lock:
+        try:
+            with open(cache_path, encoding='utf-8') as f:
+                cached = json.load(f)
+            if not isinstance(cached, dict):
+                cached = {}
+        except (OSError, ValueError):
+            cached = {}
+        cached[username] = fingerprints
+        try:
+            _write_json_cache(cache_path, cached)
+        except OSError as e:
+            print(f"保存页面指纹缓存失败: {e}")
+
+# OCR 整体置信度低于该值时直接重新获取验证码，不提交登录请求；
+# 阈值尚未在真实验证码上标定，默认 0（不提前放弃），与 OCR_SEGMENTATION、OCR_DESPECKLE 一样需显式开启
+OCR_MIN_CONFIDENCE = float(os.getenv("OCR_MIN_CONFIDENCE", "0"))
+# 验证码字符分割方式，见 ocr.segment_characters；可选 'auto'（投影切分数量不对时改用连通域），
+# 在真实验证码上验证准确率之前默认仍为 'projection'
+def parse_ocr_segmentation(value):
+    """
+    解析 OCR_SEGMENTATION：ocr.SEGMENTATION_MODES 之一（不区分大小写）
+
+    异常:
+        ValueError: 其他取值；在导入时报错，否则每次识别都会失败
+    """
+    mode = value.strip().lower()
+    if mode not in ocr.SEGMENTATION_MODES:
+        raise ValueError(f"OCR_SEGMENTATION 应为 {'、'.join(ocr.SEGMENTATION_MODES)} 之一，当前为 {value!r}")
+    return mode
+
+OCR_SEGMENTATION = parse_ocr_segmentation(os.getenv("OCR_SEGMENTATION", "projection"))
+# 验证码二值化阈值（数字或 'otsu'）与去噪点强度，见 ocr.binarize
+def parse_ocr_threshold(value):
+    """
+    解析 OCR_THRESHOLD：0–256 的整数，或 'otsu'（不区分大小写）
+
+    异常:
+        ValueError: 其他取值；在导入时报错，而不是让每次识别都失败、耗尽登录重试
+    """
+    value = value.strip().lower()
+    if value == 'otsu':
+        return value
+    if value.isdigit() and int(value) <= 256:
+        return int(value)
+    raise ValueError(f"OCR_THRESHOLD 应为 0–256 的整数或 'otsu'，当前为 {value!r}")
+
+OCR_THRESHOLD = parse_ocr_threshold(os.getenv("OCR_THRESHOLD", str(ocr.BINARY_THRESHOLD)))
+OCR_DESPECKLE = int(os.getenv("OCR_DESPECKLE", "0"))
+# 是否启用多假设集成（结果有歧义时依次尝试多种预处理方案），以及其耗时上限（秒）；
+# 各方案串行评估而非并发（见 ocr.classify），开启后识别有歧义的验证码最多多花 OCR_ENSEMBLE_BUDGET 秒
+OCR_ENSEMBLE = os.getenv("OCR_ENSEMBLE", "0") == "1"
+OCR_ENSEMBLE_BUDGET = float(os.getenv("OCR_ENSEMBLE_BUDGET", "1.0"))
+# get_combined_scores 是否同时请求总成绩页与平时成绩页；顺序请求时两页之间的间隔（秒）
+SCORES_FETCH_CONCURRENT = os.getenv("SCORES_FETCH_CONCURRENT", "0") == "1"
+SCORES_FETCH_DELAY = float(os.getenv("SCORES_FETCH_DELAY", "1"))
+# 增量解析：全部成绩页按提交时间倒序，解析到已保存的最新记录即停止，其后沿用已保存的记录
+SCORES_INCREMENTAL = os.getenv("SCORES_INCREMENTAL", "0") == "1"
+# 并行登录：同时用多少个独立会话各自获取验证码并尝试登录（1 为逐次重试），以及各会话启动的间隔（秒）
+LOGIN_PARALLEL_SESSIONS = int(os.getenv("LOGIN_PARALLEL_SESSIONS", "1"))
+LOGIN_PARALLEL_STAGGER = float(os.getenv("LOGIN_PARALLEL_STAGGER", "0.2"))
+# 网络错误导致登录失败时按指数退避重试，等待时间的上限（秒）；起始值为 login 的 retry_delay
+LOGIN_BACKOFF_MAX = float(os.getenv("LOGIN_BACKOFF_MAX", "60"))
+# 熔断器：连续多少次运行因网络错误登录失败后熔断，熔断时长（秒）及其上限（再次失败时加倍）
+CIRCUIT_BREAKER_PATH = os.getenv("JWC_CIRCUIT_BREAKER",
+                                 str(Path(__file__).resolve().parent.parent / ".cache" / "jwc_circuit_breaker.json"))
+CIRCUIT_BREAKER_THRESHOLD = int(os.getenv("CIRCUIT_BREAKER_THRESHOLD", "2"))
+CIRCUIT_BREAKER_COOLDOWN = float(os.getenv("CIRCUIT_BREAKER_COOLDOWN", "3600"))
+CIRCUIT_BREAKER_MAX_COOLDOWN = float(os.getenv("CIRCUIT_BREAKER_MAX_COOLDOWN", str(6 * 3600)))
+# 登录成功后把验证码及其确认的标注保存到该目录（为空则不保存），供 utils/train_templates.py 使用
+CAPTCHA_CORPUS_DIR = os.getenv("CAPTCHA_CORPUS_DIR")
+
+# --- 登录失败分类 ---
+# 验证码错误（含识别失败）立即重试；账号密码错误与登录限制重试也不会成功，立即放弃；
+# 网络错误（教务外网访问关闭、服务器宕机等）指数退避；其余未知情况按固定间隔重试
+LOGIN_FAILURE_CAPTCHA = 'captcha'
+LOGIN_FAILURE_CREDENTIAL = 'credential'
+LOGIN_FAILURE_POLICY = 'policy'
+LOGIN_FAILURE_TRANSPORT = 'transport'
+LOGIN_FAILURE_UNKNOWN = 'unknown'
+LOGIN_ABORT_FAILURES = frozenset({LOGIN_FAILURE_CREDENTIAL, LOGIN_FAILURE_POLICY})
+
+# 按顺序匹配 loginMsg：如“弱密码已被限制登录”同时含“密码”，应归为登录限制
+LOGIN_MESSAGE_KEYWORDS = (
+    (LOGIN_FAILURE_POLICY, ('限制', '锁定', '冻结', '禁用', '停用', '禁止', '频繁')),
+    (LOGIN_FAILURE_CAPTCHA, ('验证码',)),
+    (LOGIN_FAILURE_CREDENTIAL, ('密码', '用户名', '账号', '学号', '不存在')),
 )
+TRANSPORT_ERRORS = (requests.exceptions.ConnectionError, requests.exceptions.Timeout,
+                    requests.exceptions.TooManyRedirects)
+# 登录接口返回的不是 JSON：requests 与 httpx 的 response.json() 抛出的异常
+JSON_DECODE_ERRORS = (json.JSONDecodeError, requests.exceptions.JSONDecodeError)
 
-# 解析最终的 URL
-final_url = response.url
-parsed = urlparse(final_url)
-final_protocol = parsed.scheme
-if final_protocol == "http":
-    BASE_URL = "http://jwc.swjtu.edu.cn"
-    print("检测到教务使用 HTTP，已切换为 HTTP 访问。")
-
-LOGIN_PAGE_URL = f"{BASE_URL}/service/login.html"
-LOGIN_API_URL = f"{BASE_URL}/vatuu/UserLoginAction"
-CAPTCHA_URL = f"{BASE_URL}/vatuu/GetRandomNumberToJPEG"
-LOADING_URL = f"{BASE_URL}/vatuu/UserLoadingAction"
-ALL_SCORES_URL = f"{BASE_URL}/vatuu/StudentScoreInfoAction?setAction=studentScoreQuery&viewType=studentScore&orderType=submitDate&orderValue=desc"
-NORMAL_SCORES_URL = f"{BASE_URL}/vatuu/StudentScoreInfoAction?setAction=studentNormalMark"
+def classify_login_message(login_msg):
+    """按登录接口返回的 loginMsg 判断失败类别"""
+    login_msg = login_msg or ''
+    for failure, keywords in LOGIN_MESSAGE_KEYWORDS:
+        if any(keyword in login_msg for keyword in keywords):
+            return failure
+    return LOGIN_FAILURE_UNKNOWN
+
+def classify_login_exception(error, transport_errors=TRANSPORT_ERRORS):
+    """
+    判断登录过程中异常的失败类别
+
+    连接、超时、重定向错误以及 5xx 响应属于网络错误；登录接口返回非 JSON（通常是网关错误页）也按网络错误处理。
+    其他 ValueError（如配置错误导致识别失败）不算网络错误，否则会触发退避与熔断，被误当成教务无法访问。
+    """
+    if isinstance(error, transport_errors):
+        return LOGIN_FAILURE_TRANSPORT
+    status_code = getattr(getattr(error, 'response', None), 'status_code', None)
+    if status_code is not None and status_code >= 500:
+        return LOGIN_FAILURE_TRANSPORT
+    if isinstance(error, JSON_DECODE_ERRORS):
+        return LOGIN_FAILURE_TRANSPORT
+    return LOGIN_FAILURE_UNKNOWN
+
+def login_retry_wait(failure, transport_failures, retry_delay, backoff_max=LOGIN_BACKOFF_MAX, rng=random):
+    """
+    下一次登录尝试前的等待秒数
+
+    参数:
+        failure: 本次失败的类别
+        transport_failures: 连续网络错误的次数（含本次）
+        retry_delay: 固定重试间隔，也是指数退避的起始值
+    """
+    if failure == LOGIN_FAILURE_CAPTCHA:
+        return 0
+    if failure == LOGIN_FAILURE_TRANSPORT:
+        # 等待时间在 [上限/2, 上限] 间随机，避免多个任务同时重试
+        ceiling = min(backoff_max, retry_delay * 2 ** (transport_failures - 1))
+        return ceiling / 2 + rng.uniform(0, ceiling / 2)
+    return retry_delay
+
+class CircuitBreaker:
+    """
+    跨运行保存在文件中的熔断器（GitHub Actions 中由 actions/cache 保留 .cache 目录）
+
+    连续 threshold 次运行都因网络错误登录失败后熔断，cooldown 秒内 allow() 返回 False，定时任务直接跳过；
+    冷却结束后放行一次，仍失败则再次熔断且时长加倍（不超过 max_cooldown），服务器可达后复位。
+    """
+    def __init__(self, path=CIRCUIT_BREAKER_PATH, threshold=CIRCUIT_BREAKER_THRESHOLD,
+                 cooldown=CIRCUIT_BREAKER_COOLDOWN, max_cooldown=CIRCUIT_BREAKER_MAX_COOLDOWN):
+        self.path = path
+        self.threshold = threshold
+        self.cooldown = cooldown
+        self.max_cooldown = max_cooldown
+        self.state = self._load()
+
+    @staticmethod
+    def _initial_state():
+        return {'failures': 0, 'trips': 0, 'open_until': 0}
+
+    def _load(self):
+        try:
+            with open(self.path, encoding='utf-8') as f:
+                state = json.load(f)
+            return {key: float(state[key]) if key == 'open_until' else int(state[key])
+                    for key in self._initial_state()}
+        except (OSError, ValueError, KeyError, TypeError):
+            return self._initial_state()
+
+    def _save(self):
+        try:
+            _write_json_cache(self.path, self.state)
+        except OSError as e:
+            print(f"保存熔断器状态失败: {e}")
+
+    @property
+    def open_until(self):
+        return self.state['open_until']
+
+    def allow(self, now=None):
+        """当前是否允许运行（未熔断或冷却已结束）"""
+        now = time.time() if now is None else now
+        return now >= self.state['open_until']
+
+    def record_success(self):
+        """服务器可达（登录成功，或被明确拒绝），复位"""
+        if self.state != self._initial_state():
+            self.state = self._initial_state()
+            self._save()
+
+    def record_failure(self, now=None):
+        """本次运行因网络错误登录失败"""
+        now = time.time() if now is None else now
+        self.state['failures'] += 1
+        if self.state['failures'] >= self.threshold:
+            self.state['trips'] += 1
+            cooldown = min(self.max_cooldown, self.cooldown * 2 ** (self.state['trips'] - 1))
+            self.state['open_until'] = now + cooldown
+            print(f"教务服务器已连续 {self.state['failures']} 次运行不可达，{cooldown:.0f} 秒内跳过定时任务。")
+        self._save()
 
 HEADERS = {
     'User-Agent': 'Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/123.0.0.0 Safari/537.36',
-    'Origin': BASE_URL,
 }
 
-class ScoreFetcher:
-    def __init__(self, username, password):
+def recognize_captcha(captcha_bytes):
+    """按环境变量配置的 OCR 参数识别验证码，返回 ocr.OcrResult（无法分割时为 None）"""
+    with trace.span('ocr') as ocr_span:
+        result = ocr.classify(
+            captcha_bytes, return_details=True, segmentation=OCR_SEGMENTATION,
+            threshold=OCR_THRESHOLD, despeckle_strength=OCR_DESPECKLE,
+            ensemble=OCR_ENSEMBLE, ensemble_budget=OCR_ENSEMBLE_BUDGET,
+        )
+        if result is not None:
+            ocr_span.set('text', result.text)
+            ocr_span.set('confidence', round(result.confidence, 4))
+        return result
+
+def parse_all_scores(html):
+    """解析全部成绩页，返回 [{表头: 值}, ...]；页面中没有成绩表格时返回 None"""
+    return table_extractor.extract_all_scores(html)
+
+# 全部成绩页中的行号列，插入新记录后旧记录的行号整体后移
+SERIAL_FIELD = '序号'
+# 识别同一条成绩记录的字段（成绩被修改后记录会以新的提交时间移到页面顶部）
+RECORD_KEY_FIELDS = ('学期', '课程名称', '教师')
+
+def parse_all_scores_incremental(html, known_records):
+    """
+    增量解析全部成绩页
+
+    页面按提交时间倒序排列。解析到与 known_records[0]（已保存的最新记录）除行号外完全相同的行时停止，
+    之后的行都更早提交且未变化，直接沿用 known_records 中的对应记录（行号按新增和移走的行数修正）。
+    已出现在新解析部分中的记录（成绩被修改后移到了顶部）不再从旧记录中沿用。
+
+    返回:
+        (记录列表, 沿用的旧记录数)；页面中没有成绩表格时为 (None, 0)
+    """
+    if not known_records:
+        return parse_all_scores(html), 0
+
+    anchor = known_records[0]
+    head = []
+    matched = None
+
+    def on_record(record):
+        nonlocal matched
+        head.append(record)
+        if all(anchor.get(name) == value for name, value in record.items() if name != SERIAL_FIELD):
+            matched = record
+            raise table_extractor.StopParsing
+
+    if not table_extractor.iter_all_score_records(html, on_record):
+        return None, 0
+    if matched is None:
+        # 没有遇到已保存的最新记录，整页都已解析
+        return head, 0
+
+    offset = None
+    if str(matched.get(SERIAL_FIELD, '')).isdigit() and str(anchor.get(SERIAL_FIELD, '')).isdigit():
+        offset = int(matched[SERIAL_FIELD]) - int(anchor[SERIAL_FIELD])
+    seen = {tuple(record.get(name) for name in RECORD_KEY_FIELDS) for record in head}
+    tail = []
+    for old in known_records[1:]:
+        if tuple(old.get(name) for name in RECORD_KEY_FIELDS) in seen:
+            if offset is not None:
+                offset -= 1  # 移走的记录之后的行号前移一位
+            continue
+        record = {name: old.get(name, '') for name in matched}
+        if offset and str(record.get(SERIAL_FIELD, '')).isdigit():
+            record[SERIAL_FIELD] = str(int(record[SERIAL_FIELD]) + offset)
+        tail.append(record)
+    return head + tail, len(tail)
+
+def parse_normal_scores(html):
+    """解析平时成绩页，返回按课程分组的明细；页面中没有成绩表格时返回 None"""
+    return table_extractor.extract_normal_scores(html)
+
+def merge_scores(all_scores, normal_scores):
+    """把平时成绩明细按 (课程名称, 教师) 合并进总成绩记录（原地修改 all_scores）"""
+    # 创建一个快速查找平时成绩的字典
+    # key: (课程名称, 教师)
+    normal_scores_map = {(ns['课程名称'], ns['教师']): {
+        '详情': ns['详情'],
+        '总结': ns.get('总结')  # 包含summary信息
+    } for ns in normal_scores}
+    
+    # 遍历总成绩，将平时成绩详情合并进去
+    for score_record in all_scores:
+        key = (score_record['课程名称'], score_record['教师'])
+        if key in normal_scores_map:
+            normal_data = normal_scores_map[key]
+            score_record['平时成绩详情'] = normal_data['详情']
+            score_record['平时成绩总结'] = normal_data['总结']
+        else:
+            score_record['平时成绩详情'] = None
+            score_record['平时成绩总结'] = None
+    return all_scores
+
+# 需要计算指纹的页面及其在指纹字典中的名称
+FINGERPRINT_PAGES = {ALL_SCORES_PATH: 'all_scores', NORMAL_SCORES_PATH: 'normal_scores'}
+
+def table_fingerprint(html):
+    """
+    成绩表格原始 HTML 的指纹（不解析页面）
+
+    只取 table3 本身，页面其余部分（导航、时间等）的变化不影响指纹；换行符统一为 \\n。
+    页面中没有成绩表格（如会话失效跳回登录页）时返回 None。
+    """
+    source = table_extractor.table_source(html)
+    if source is None:
+        return None
+    normalized = source.replace('\r\n', '\n').replace('\r', '\n').strip()
+    return hashlib.sha256(normalized.encode('utf-8')).hexdigest()
+
+def is_session_expired(url, html):
+    """会话失效时教务会跳回登录页，或返回不含成绩表格的提示页"""
+    return 'login' in urlparse(url).path.lower() or 'table3' not in html
+
+_NO_LOCK = contextlib.nullcontext()
+
+def screen_captcha(ocr_result, min_confidence):
+    """
+    判断验证码识别结果能否提交登录
+
+    返回:
+        (原因, 验证码)：可以提交时原因为 None；识别失败为 LOGIN_FAILURE_CAPTCHA，
+        置信度低于 min_confidence 为 'low_confidence'
+    """
+    captcha_code = ocr_result.text if ocr_result else None
+    print(f"OCR 识别结果: {captcha_code}")
+    if not captcha_code or len(captcha_code) != 4:
+        print("验证码识别失败，跳过本次尝试。")
+        return LOGIN_FAILURE_CAPTCHA, captcha_code
+    if ocr_result.confidence < min_confidence:
+        print(f"OCR 置信度 {ocr_result.confidence:.3f} 低于阈值 {min_confidence}，立即重新获取验证码。")
+        return 'low_confidence', captcha_code
+    return None, captcha_code
+
+def login_response_status(login_result):
+    """登录接口返回的 JSON 对应的状态：'success'，或按 loginMsg 分类的失败类别"""
+    if login_result.get('loginStatus') == '1':
+        print(f"API验证成功！{login_result.get('loginMsg')[0:5]}")
+        return 'success'
+    print(f"登录API失败: {login_result.get('loginMsg', '未知错误')}")
+    return classify_login_message(login_result.get('loginMsg'))
+
+class LoginRetry:
+    """登录失败后是否重试、等待多久；逐次登录每次尝试记录一次，并行登录每轮记录一次"""
+    def __init__(self, retry_delay):
+        self.retry_delay = retry_delay
+        # 连续网络错误的次数，决定指数退避的等待时间
+        self.transport_failures = 0
+
+    def after_failure(self, failure, more_attempts):
+        """
+        参数:
+            failure: 本次（本轮）失败的类别
+            more_attempts: 是否还有剩余的尝试次数
+
+        返回:
+            None 表示放弃（账号密码错误或登录受限），否则为下一次尝试前的等待秒数
+        """
+        if failure in LOGIN_ABORT_FAILURES:
+            print("账号密码错误或登录受限，重试不会成功，停止登录。")
+            return None
+        self.transport_failures = self.transport_failures + 1 if failure == LOGIN_FAILURE_TRANSPORT else 0
+        if not more_attempts:
+            return 0
+        wait = login_retry_wait(failure, self.transport_failures, self.retry_delay)
+        if wait:
+            print(f"等待 {wait:.1f} 秒后重试...")
+        return wait
+
+class LoginRound:
+    """并行登录一轮中各会话的结果：第一个成功的会话，以及其余会话的失败类别"""
+    def __init__(self, transport_errors=TRANSPORT_ERRORS, reprobe_errors=REPROBE_ERRORS):
+        self.transport_errors = transport_errors
+        self.reprobe_errors = reprobe_errors
+        # (会话, 验证码, 验证码图片)
+        self.winner = None
+        self.failures = set()
+        # 是否出现了需要重新检测协议的错误
+        self.reprobe = False
+
+    def record(self, session, outcome=None, error=None):
+        """
+        记录一个会话的 _attempt_login 结果 outcome，或其抛出的异常 error
+
+        返回:
+            True 表示本轮无需再等其他会话（已有会话成功，或账号密码错误、登录受限）
+        """
+        if error is not None:
+            print(f"登录过程中发生异常: {error}")
+            self.reprobe = self.reprobe or isinstance(error, self.reprobe_errors)
+            self.failures.add(classify_login_exception(error, self.transport_errors))
+            return False
+        status, captcha_code, captcha_bytes = outcome
+        if status == 'success':
+            self.winner = (session, captcha_code, captcha_bytes)
+            return True
+        if status in LOGIN_ABORT_FAILURES:
+            self.failures.add(status)
+            return True
+        if status != 'cancelled':
+            self.failures.add(LOGIN_FAILURE_CAPTCHA if status == 'low_confidence' else status)
+        return False
+
+    @property
+    def failure(self):
+        """决定本轮之后如何处理的失败类别：账号密码错误或登录受限 > 网络错误 > 未知 > 验证码"""
+        for failure in (LOGIN_FAILURE_CREDENTIAL, LOGIN_FAILURE_POLICY, LOGIN_FAILURE_TRANSPORT, LOGIN_FAILURE_UNKNOWN):
+            if failure in self.failures:
+                return failure
+        return LOGIN_FAILURE_CAPTCHA
+
+class BaseScoreFetcher:
+    """
+    ScoreFetcher 与 AsyncScoreFetcher（utils/async_fetcher.py）共用的状态与步骤
+
+    这里只有不发 HTTP 请求的部分：登录载荷与响应的判断、会话的加密存取、页面指纹、解析与合并。
+    子类负责发请求和等待；其中会阻塞的步骤（会话存储读写与加解密、保存语料、熔断器写文件、解析页面）
+    异步版本放到线程池执行。
+    """
+    def __init__(self, username, password, captcha_corpus_dir, base_url, session_store, session_key, circuit_breaker):
         self.username = username
         self.password = password
-        self.session = requests.Session()
-        self.session.headers.update(HEADERS)
+        self.captcha_corpus_dir = captcha_corpus_dir
         self.is_logged_in = False
+        self.session_store = session_store if session_key else None
+        self.session_key = session_key
+        self.circuit_breaker = circuit_breaker
+        # 最近一次 login 失败的类别（成功时为 None），供批量监控判断服务器是否可达
+        self.login_failure = None
+        # 验证会话时已下载的页面 {路径: HTML}，get_all_scores 等直接使用，避免重复请求
+        self._prefetched = {}
+        # 本次运行下载的成绩页指纹 {'all_scores': ..., 'normal_scores': ...}（见 table_fingerprint）
+        self.fingerprints = {}
+        # 最近一次增量解析沿用的旧记录数（见 parse_all_scores_incremental）
+        self.reused_records = 0
+        base_url = base_url or BASE_URL_OVERRIDE
+        self._base_url = None
+        if base_url:
+            self._set_base_url(base_url.rstrip('/'))
+        # 地址来自自动检测（而非调用方指定）时，连接或重定向出错后允许重新检测
+        self._base_url_detected = not base_url
+
+    def _set_base_url(self, base_url):
+        """确定（或重新检测到）教务地址；子类同时更新请求头中的 Origin"""
+        self._base_url = base_url
+
+    def _login_payload(self, captcha_code):
+        return { 'username': self.username, 'password': self.password, 'ranstring': captcha_code, 'url': '', 'returnType': '', 'returnUrl': '', 'area': '' }
+
+    def _record_login(self, failure):
+        """记录登录结果并更新熔断器（会写文件）；返回是否登录成功"""
+        self.login_failure = failure
+        if self.circuit_breaker:
+            if failure == LOGIN_FAILURE_TRANSPORT:
+                self.circuit_breaker.record_failure()
+            else:
+                self.circuit_breaker.record_success()
+        return failure is None
+
+    def _record_restored(self):
+        """恢复了保存的会话，说明服务器可达（会写文件）"""
+        if self.circuit_breaker:
+            self.circuit_breaker.record_success()
+
+    def _harvest_captcha(self, captcha_code, captcha_bytes):
+        """登录成功说明识别结果正确，将验证码写入语料目录；失败不影响登录"""
+        try:
+            path = ocr.save_labeled_captcha(self.captcha_corpus_dir, captcha_code, captcha_bytes)
+            print(f"已保存验证码语料: {path}")
+        except OSError as e:
+            print(f"保存验证码语料失败: {e}")
+
+    def _read_saved_session(self):
+        """读取并解密保存的会话（读取存储、派生密钥，会阻塞）；没有或无法解密时返回 None"""
+        token = self.session_store.get_session()
+        if not token:
+            print("没有保存的登录会话。")
+            return None
+        try:
+            return session_cache.decrypt(token, self.session_key)
+        except ValueError as e:
+            print(f"无法恢复登录会话: {e}")
+            return None
+
+    def _load_session_state(self, cookie_jar, state, base_url):
+        """把解密后的会话载入 cookie_jar；不属于当前账号或已过期时返回 False"""
+        try:
+            if session_cache.load_session(cookie_jar, state, self.username, base_url):
+                return True
+            print("保存的登录会话不属于当前账号或已过期。")
+        except ValueError as e:
+            print(f"无法恢复登录会话: {e}")
+        return False
+
+    def _accept_restored_page(self, url, html):
+        """
+        检查验证会话时下载的全部成绩页
+
+        会话有效时页面保留给 get_all_scores 使用，本次运行只需这一次请求。
+
+        返回:
+            会话是否有效
+        """
+        if is_session_expired(url, html):
+            print("保存的登录会话已过期，需要重新登录。")
+            return False
+        print("登录会话有效，跳过验证码登录。")
+        self._prefetched[ALL_SCORES_PATH] = html
+        self.is_logged_in = True
+        return True
+
+    def _store_session(self, cookie_jar):
+        """加密保存 cookie_jar 中的会话（派生密钥、写入存储，会阻塞）；失败不影响登录"""
+        try:
+            state = session_cache.dump_session(cookie_jar, self.username, self._base_url)
+            self.session_store.save_session(session_cache.encrypt(state, self.session_key))
+        except Exception as e:
+            print(f"保存登录会话失败: {e}")
+
+    def _record_page(self, path, html):
+        """记录成绩页的指纹，返回 html"""
+        if path in FINGERPRINT_PAGES:
+            self.fingerprints[FINGERPRINT_PAGES[path]] = table_fingerprint(html)
+        return html
+
+    def _page_unchanged(self, path, known_fingerprints):
+        """已下载的成绩页与上次保存的指纹是否相同"""
+        name = FINGERPRINT_PAGES[path]
+        return self.fingerprints[name] is not None and self.fingerprints[name] == known_fingerprints.get(name)
 
-    def login(self, max_retries=10, retry_delay=1):
+    def _parse_all_scores(self, html, known_scores):
+        """解析全部成绩页（见 get_all_scores）；没有成绩表格时返回 None"""
+        with trace.span('parse', page='all_scores') as parse_span:
+            all_rows_data, reused = parse_all_scores_incremental(html, known_scores)
+            parse_span.set('records', len(all_rows_data or ()))
+            parse_span.set('reused', reused)
+        self.reused_records = reused
+        if all_rows_data is None:
+            print("错误：未找到全部成绩表格。")
+            return None
+
+        print(f"成功获取到 {len(all_rows_data)} 条总成绩记录。")
+        if reused:
+            print(f"增量解析：其中 {reused} 条未变化的记录沿用已保存的数据。")
+        return all_rows_data
+
+    def _parse_normal_scores(self, html):
+        """解析平时成绩页；没有成绩表格时返回 None"""
+        with trace.span('parse', page='normal_scores') as parse_span:
+            normal_scores_data = parse_normal_scores(html)
+            parse_span.set('courses', len(normal_scores_data or ()))
+        if normal_scores_data is None:
+            print("错误：未找到平时成绩表格。")
+            return None
+
+        print(f"成功获取到 {len(normal_scores_data)} 门课程的平时成绩明细。")
+        return normal_scores_data
+
+    def _merge(self, all_scores, normal_scores):
+        """合并两页的解析结果；任一为空时抛出异常"""
+        if not all_scores:
+            print("未能获取总成绩，无法进行合并。")
+            raise Exception("未能获取总成绩，无法进行合并。")
+
+        if not normal_scores:
+            print("未能获取平时成绩。")
+            raise Exception("未能获取平时成绩。")
+
+        merge_scores(all_scores, normal_scores)
+        print("总成绩与平时成绩合并完成。")
+        return all_scores
+
+class ScoreFetcher(BaseScoreFetcher):
+    def __init__(self, username, password, captcha_corpus_dir=CAPTCHA_CORPUS_DIR, base_url=None,
+                 session_store=None, session_key=session_cache.SESSION_ENCRYPTION_KEY, circuit_breaker=None):
+        """
+        参数:
+            base_url: 教务地址（如 'http://jwc.swjtu.edu.cn'）；为空时取环境变量 JWC_BASE_URL，
+                仍为空则在第一次请求前自动检测
+            session_store: 保存登录会话的存储后端，需提供 get_session() 与 save_session(token)
+                （如 utils.database）；为空或未设置 session_key 时不保存会话
+            session_key: 会话加密密钥，默认取环境变量 SESSION_ENCRYPTION_KEY
+            circuit_breaker: CircuitBreaker，提供时记录每次登录服务器是否可达（是否跳过运行由调用方根据 allow() 决定）
+        """
+        self.session = transport.new_session(HEADERS)
+        super().__init__(username, password, captcha_corpus_dir, base_url, session_store, session_key, circuit_breaker)
+
+    @property
+    def base_url(self):
+        if self._base_url is None:
+            self._set_base_url(resolve_base_url())
+        return self._base_url
+
+    def _set_base_url(self, base_url):
+        super()._set_base_url(base_url)
+        self.session.headers['Origin'] = base_url
+
+    def url(self, path):
+        """拼接教务页面的完整 URL"""
+        return self.base_url + path
+
+    def _new_session(self):
+        session = transport.new_session(HEADERS)
+        session.headers['Origin'] = self.base_url
+        return session
+
+    def login(self, max_retries=10, retry_delay=1, min_confidence=OCR_MIN_CONFIDENCE,
+              parallel_sessions=LOGIN_PARALLEL_SESSIONS, stagger=LOGIN_PARALLEL_STAGGER):
+        """
+        识别验证码并登录，按失败类别重试
+
+        验证码错误立即重试；账号密码错误或登录受限时立即放弃；网络错误以 retry_delay 为起点指数退避（带随机抖动）。
+
+        参数:
+            max_retries: 最大尝试次数
+            retry_delay: 未知原因失败后的等待秒数，也是网络错误退避的起始值
+            min_confidence: OCR 置信度阈值，低于该值时立即重新获取验证码（不等待、不提交登录）；
+                最后一次尝试不做该检查
+            parallel_sessions: 大于 1 时改为并行登录（见 _login_parallel），max_retries 为各轮尝试次数之和
+            stagger: 并行登录时各会话启动的间隔秒数，避免同一瞬间向教务发出多个请求
+        """
+        with trace.span('login', parallel_sessions=parallel_sessions) as login_span:
+            if parallel_sessions > 1:
+                failure = self._login_parallel(max_retries, retry_delay, min_confidence, parallel_sessions, stagger)
+            else:
+                failure = self._login_sequential(max_retries, retry_delay, min_confidence)
+            login_span.set('failure', failure)
+        return self._record_login(failure)
+
+    def _login_sequential(self, max_retries, retry_delay, min_confidence):
+        """逐次尝试登录；返回 None 表示成功，否则为最后一次失败的类别"""
+        retry = LoginRetry(retry_delay)
+        failure = None
         for attempt in range(1, max_retries + 1):
             print(f"--- 登录尝试 #{attempt}/{max_retries} ---")
             
             try:
-                # 1. 获取并识别验证码
-                print("正在获取验证码...")
-                captcha_params = {'test': int(time.time() * 1000)}
-                response = self.session.get(CAPTCHA_URL, params=captcha_params, timeout=10)
-                response.raise_for_status()
-                captcha_code = ocr.classify(response.content)
-                print(f"OCR 识别结果: {captcha_code}")
-                if not captcha_code or len(captcha_code) != 4:
-                    print("验证码识别失败，跳过本次尝试。")
-                    if attempt < max_retries: time.sleep(retry_delay)
+                status, captcha_code, captcha_bytes = self._attempt_login(
+                    self.session, min_confidence if attempt < max_retries else 0.0)
+                if status == 'low_confidence':
                     continue
-
-                # 2. 尝试API登录
-                print("正在尝试登录API...")
-                login_payload = { 'username': self.username, 'password': self.password, 'ranstring': captcha_code, 'url': '', 'returnType': '', 'returnUrl': '', 'area': '' }
-                response = self.session.post(LOGIN_API_URL, data=login_payload, headers={'Referer': LOGIN_PAGE_URL}, timeout=10)
-                response.raise_for_status()
-                login_result = response.json()
-
-                if login_result.get('loginStatus') == '1':
-                    print(f"API验证成功！{login_result.get('loginMsg')[0:5]}")
-                    print("正在访问加载页面以建立完整会话...")
-                    self.session.get(LOADING_URL, headers={'Referer': LOGIN_PAGE_URL}, timeout=10)
-                    print("会话建立成功，已登录。")
-                    self.is_logged_in = True
-                    return True
-                else:
-                    print(f"登录API失败: {login_result.get('loginMsg', '未知错误')}")
+                if status == 'success':
+                    self._finish_login(captcha_code, captcha_bytes)
+                    return None
+                failure = status
             
             except Exception as e:
                 print(f"登录过程中发生异常: {e}")
+                failure = classify_login_exception(e)
+                if isinstance(e, REPROBE_ERRORS) and self._base_url_detected:
+                    print("连接或重定向异常，重新检测教务访问协议...")
+                    self._set_base_url(resolve_base_url(refresh=True))
 
-            if attempt < max_retries:
-                print(f"等待 {retry_delay} 秒后重试...")
-                time.sleep(retry_delay)
+            wait = retry.after_failure(failure, attempt < max_retries)
+            if wait is None:
+                return failure
+            if wait:
+                time.sleep(wait)
         
         print(f"\n登录失败 {max_retries} 次，程序终止。")
-        return False
+        return failure
+
+    def _attempt_login(self, session, min_confidence, submit_lock=None, cancelled=None):
+        """
+        在 session 上完成一次 获取验证码 → 识别 → 提交登录
+
+        参数:
+            submit_lock: 并行登录时串行化提交，保证最多只有一个会话登录成功
+            cancelled: 并行登录时已有会话成功后被设置的 threading.Event，之后不再发请求
+
+        返回:
+            (状态, 验证码, 验证码图片)，状态为 'success'、'low_confidence'（置信度低于 min_confidence，未提交）、
+            'cancelled'，或失败类别：识别失败为 LOGIN_FAILURE_CAPTCHA，登录被拒绝时按 loginMsg 分类
+        """
+        # 1. 获取并识别验证码
+        trace.current().add('attempts')
+        print("正在获取验证码...")
+        captcha_params = {'test': int(time.time() * 1000)}
+        with trace.span('captcha.download') as download_span:
+            response = session.get(self.url(CAPTCHA_PATH), params=captcha_params, timeout=10)
+            trace.record_response(download_span, response)
+            response.raise_for_status()
+        captcha_bytes = response.content
+        status, captcha_code = screen_captcha(recognize_captcha(captcha_bytes), min_confidence)
+        if status:
+            return status, captcha_code, captcha_bytes
+
+        # 2. 尝试API登录
+        with submit_lock or _NO_LOCK:
+            if cancelled is not None and cancelled.is_set():
+                return 'cancelled', captcha_code, captcha_bytes
+            print("正在尝试登录API...")
+            with trace.span('login.post') as post_span:
+                response = session.post(self.url(LOGIN_API_PATH), data=self._login_payload(captcha_code), headers={'Referer': self.url(LOGIN_PAGE_PATH)}, timeout=10)
+                trace.record_response(post_span, response)
+                response.raise_for_status()
+                login_result = response.json()
+                post_span.set('login_status', login_result.get('loginStatus'))
+            status = login_response_status(login_result)
+            if status == 'success' and cancelled is not None:
+                cancelled.set()
+        return status, captcha_code, captcha_bytes
+
+    def _finish_login(self, captcha_code, captcha_bytes):
+        """登录API验证成功后建立完整会话"""
+        if self.captcha_corpus_dir:
+            self._harvest_captcha(captcha_code, captcha_bytes)
+        print("正在访问加载页面以建立完整会话...")
+        with trace.span('session.establish') as establish_span:
+            response = self.session.get(self.url(LOADING_PATH), headers={'Referer': self.url(LOGIN_PAGE_PATH)}, timeout=10)
+            trace.record_response(establish_span, response)
+            print("会话建立成功，已登录。")
+            self.is_logged_in = True
+            self.save_session()
+
+    def _login_parallel(self, max_retries, retry_delay, min_confidence, parallel_sessions, stagger):
+        """
+        每轮同时用 parallel_sessions 个独立会话各自获取验证码、识别并尝试登录，保留第一个成功的会话
+
+        提交登录由 submit_lock 串行化，并行的只有验证码下载与识别。一旦有会话成功，其余会话不再提交，未启动的直接取消；
+        等正在下载或识别的会话结束后关闭落选的会话，成功的会话替换 self.session（原会话同样关闭）。
+        一轮全部失败后按失败类别等待（同 _login_sequential）再开始下一轮，直到累计尝试 max_retries 次；
+        出现账号密码错误或登录受限时立即放弃。
+
+        返回:
+            None 表示成功，否则为失败类别
+        """
+        retry = LoginRetry(retry_delay)
+        remaining = max_retries
+        round_number = 0
+        while remaining > 0:
+            round_number += 1
+            count = min(parallel_sessions, remaining)
+            remaining -= count
+            print(f"--- 并行登录第 {round_number} 轮：{count} 个会话 ---")
+
+            submit_lock = threading.Lock()
+            cancelled = threading.Event()
+            round_min_confidence = 0.0 if remaining == 0 else min_confidence
+            login_round = LoginRound()
+            pool = ThreadPoolExecutor(max_workers=count)
+            futures = {}
+            for i in range(count):
+                session = self._new_session()
+                futures[pool.submit(trace.bind(self._staggered_attempt), session, i * stagger, round_min_confidence,
+                                    submit_lock, cancelled)] = session
+            for future in as_completed(futures):
+                try:
+                    outcome = future.result()
+                except Exception as e:
+                    login_round.record(futures[future], error=e)
+                    continue
+                if login_round.record(futures[future], outcome):
+                    break
+            # 未启动的会话直接取消；已在运行的会话检查 cancelled 后不会再提交登录，等它们结束后再关闭连接
+            cancelled.set()
+            pool.shutdown(cancel_futures=True)
+            winner = login_round.winner[0] if login_round.winner else None
+            for session in futures.values():
+                if session is not winner:
+                    session.close()
 
-    def get_all_scores(self):
+            if winner is not None:
+                _, captcha_code, captcha_bytes = login_round.winner
+                replaced, self.session = self.session, winner
+                replaced.close()
+                try:
+                    self._finish_login(captcha_code, captcha_bytes)
+                    return None
+                except Exception as e:
+                    print(f"登录过程中发生异常: {e}")
+                    login_round.failures.add(classify_login_exception(e))
+            failure = login_round.failure
+            wait = retry.after_failure(failure, remaining > 0)
+            if wait is None:
+                return failure
+            if login_round.reprobe and self._base_url_detected:
+                print("连接或重定向异常，重新检测教务访问协议...")
+                self._set_base_url(resolve_base_url(refresh=True))
+            if wait:
+                time.sleep(wait)
+
+        print(f"\n登录失败 {max_retries} 次，程序终止。")
+        return failure
+
+    def _staggered_attempt(self, session, delay, min_confidence, submit_lock, cancelled):
+        if cancelled.wait(delay):
+            return 'cancelled', None, None
+        return self._attempt_login(session, min_confidence, submit_lock, cancelled)
+
+    def ensure_login(self, **login_kwargs):
+        """先尝试恢复保存的会话，会话不可用时才调用 login（参数透传）"""
+        with trace.span('session.restore') as restore_span:
+            restored = self.restore_session()
+            restore_span.set('restored', restored)
+        if restored:
+            self._record_restored()
+            return True
+        return self.login(**login_kwargs)
+
+    def restore_session(self):
+        """
+        载入保存的会话并访问全部成绩页验证其是否有效
+
+        会话有效时成绩页保留给 get_all_scores 使用，本次运行只需这一次请求。
+
+        返回:
+            会话是否有效
+        """
+        if not self.session_store:
+            return False
+        state = self._read_saved_session()
+        if state is None or not self._load_session_state(self.session.cookies, state, self.base_url):
+            return False
+
+        print("正在验证保存的登录会话...")
+        cookies_before = self.session.cookies.get_dict()
+        try:
+            with trace.span('page.fetch', page='all_scores') as fetch_span:
+                response = self.session.get(self.url(ALL_SCORES_PATH), headers={'Referer': self.url(LOADING_PATH)})
+                trace.record_response(fetch_span, response)
+                response.raise_for_status()
+        except Exception as e:
+            print(f"验证登录会话时出错: {e}")
+            self.session.cookies.clear()
+            return False
+        if not self._accept_restored_page(str(response.url), response.text):
+            self.session.cookies.clear()
+            return False
+
+        # 服务器可能在访问时续期 Cookie，有变化才写回
+        if self.session.cookies.get_dict() != cookies_before:
+            self.save_session()
+        return True
+
+    def save_session(self):
+        """加密保存当前会话的 Cookie；失败不影响登录"""
+        if self.session_store:
+            self._store_session(self.session.cookies)
+
+    def _download_page(self, path, referer_path, delay=0):
+        """下载成绩页面 HTML 并记录其指纹；已在验证会话时下载过的页面直接返回"""
+        html = self._prefetched.pop(path, None)
+        if html is None:
+            if delay:
+                time.sleep(delay)
+            with trace.span('page.fetch', page=FINGERPRINT_PAGES.get(path, path)) as fetch_span:
+                response = self.session.get(self.url(path), headers={'Referer': self.url(referer_path)})
+                trace.record_response(fetch_span, response)
+                response.raise_for_status()
+                html = response.text
+        return self._record_page(path, html)
+
+    def scores_unchanged(self, known_fingerprints, delay=SCORES_FETCH_DELAY):
+        """
+        下载两个成绩页，与上次保存的指纹比较
+
+        下载的页面保留给随后的 get_combined_scores 使用，不会重复请求；全部成绩页已变化时不再下载平时成绩页。
+
+        参数:
+            known_fingerprints: 上次保存的指纹（load_cached_fingerprints 或 database.get_fingerprints 的结果）
+            delay: 两个页面请求之间的等待秒数
+
+        返回:
+            两个成绩页的表格都与上次完全相同时为 True
+        """
+        if not self.is_logged_in or not known_fingerprints:
+            return False
+        for path, referer_path, wait in ((ALL_SCORES_PATH, LOADING_PATH, 0), (NORMAL_SCORES_PATH, ALL_SCORES_PATH, delay)):
+            try:
+                self._prefetched[path] = self._download_page(path, referer_path, wait)
+            except Exception as e:
+                print(f"计算页面指纹时下载失败: {e}")
+                return False
+            if not self._page_unchanged(path, known_fingerprints):
+                return False
+        return True
+
+    def get_all_scores(self, html=None, known_scores=None):
+        """
+        html: 已下载的页面（由 get_combined_scores 传入），为空时自行请求
+        known_scores: 已保存的成绩记录（按页面顺序），提供时增量解析（见 parse_all_scores_incremental）
+        """
         if not self.is_logged_in:
             print("错误：未登录。")
             return None
 
         print("\n正在查询全部成绩记录...")
         try:
-            response = self.session.get(ALL_SCORES_URL, headers={'Referer': LOADING_URL}, timeout=15)
-            response.raise_for_status()
-
-            soup = BeautifulSoup(response.text, 'html.parser')
-            score_table = soup.find('table', id='table3')
-            if not score_table:
-                print("错误：未找到全部成绩表格。")
-                return None
-
-            all_rows_data = []
-            header = [th.text.strip() for th in score_table.find('tr').find_all('th')]
-            
-            for row in score_table.find_all('tr')[1:]:
-                cols = [ele.text.strip() for ele in row.find_all('td')]
-                if len(cols) == len(header):
-                    all_rows_data.append(dict(zip(header, cols)))
-            
-            print(f"成功获取到 {len(all_rows_data)} 条总成绩记录。")
-            return all_rows_data
+            if html is None:
+                html = self._download_page(ALL_SCORES_PATH, LOADING_PATH)
+            return self._parse_all_scores(html, known_scores)
 
         except Exception as e:
             print(f"获取全部成绩时出错: {e}")
             return None
 
-    def get_normal_scores(self):
+    def get_normal_scores(self, html=None):
+        """html: 已下载的页面（由 get_combined_scores 传入），为空时自行请求"""
         if not self.is_logged_in:
             print("错误：未登录。")
             return None
 
         print("\n正在查询平时成绩明细...")
         try:
-            response = self.session.get(NORMAL_SCORES_URL, headers={'Referer': ALL_SCORES_URL}, timeout=15)
-            response.raise_for_status()
-            
-            soup = BeautifulSoup(response.text, 'html.parser')
-            score_table = soup.find('table', id='table3')
-            if not score_table:
-                print("错误：未找到平时成绩表格。")
-                return None
-            
-            normal_scores_data = []
-            current_course_info = {}
-            for row in score_table.find_all('tr')[1:]:
-                cols = row.find_all('td')
-                if len(cols) == 11:
-                    course_name = cols[3].text.strip()
-                    if not current_course_info or current_course_info.get("课程名称") != course_name:
-                        if current_course_info:
-                            normal_scores_data.append(current_course_info)
-                        current_course_info = {
-                            "课程名称": course_name,
-                            "教师": cols[5].text.strip(),
-                            "详情": []
-                        }
-                    
-                    current_course_info["详情"].append({
-                        "平时成绩名称": cols[6].text.strip(),
-                        "成绩": cols[8].text.strip(),
-                        "占比": cols[7].text.strip(),
-                        "提交时间": cols[10].text.strip()
-                    })
-                
-                elif len(cols) == 1 and cols[0].get('colspan') == '11':
-                    if current_course_info:
-                        current_course_info["总结"] = cols[0].text.strip()
-            
-            if current_course_info: # 添加最后一个课程
-                normal_scores_data.append(current_course_info)
-
-            print(f"成功获取到 {len(normal_scores_data)} 门课程的平时成绩明细。")
-            return normal_scores_data
+            if html is None:
+                html = self._download_page(NORMAL_SCORES_PATH, ALL_SCORES_PATH)
+            return self._parse_normal_scores(html)
 
         except Exception as e:
             print(f"获取平时成绩时出错: {e}")
             return None
 
-    def get_combined_scores(self):
+    def get_combined_scores(self, concurrent=SCORES_FETCH_CONCURRENT, delay=SCORES_FETCH_DELAY,
+                            known_scores=None, incremental=SCORES_INCREMENTAL):
         """
         获取总成绩和平时成绩，并将它们合并。
+
+        平时成绩页在后台线程下载，与总成绩页的解析重叠进行。
+
+        参数:
+            concurrent: 为 True 时两个页面同时请求，耗时约为两者中较慢的一个
+            delay: 顺序请求时，总成绩页下载完成后等待多少秒再请求平时成绩页（模拟人类行为）
+            known_scores: 已保存的合并成绩（如 database.get_latest_scores() 的结果）
+            incremental: 为 True 且提供了 known_scores 时增量解析全部成绩页
         """
         if not self.is_logged_in:
             print("错误：未登录。")
             return None
+        known_scores = known_scores if incremental else None
 
-        all_scores = self.get_all_scores()
-        time.sleep(1) # 模拟人类行为
-        normal_scores = self.get_normal_scores()
-
-        if not all_scores:
-            print("未能获取总成绩，无法进行合并。")
-            raise Exception("未能获取总成绩，无法进行合并。")
-
-        if not normal_scores:
-            print("未能获取平时成绩。")
-            raise Exception("未能获取平时成绩。")
-
-        # 创建一个快速查找平时成绩的字典
-        # key: (课程名称, 教师)
-        normal_scores_map = {(ns['课程名称'], ns['教师']): {
-            '详情': ns['详情'],
-            '总结': ns.get('总结')  # 包含summary信息
-        } for ns in normal_scores}
-        
-        # 遍历总成绩，将平时成绩详情合并进去
-        for score_record in all_scores:
-            key = (score_record['课程名称'], score_record['教师'])
-            if key in normal_scores_map:
-                normal_data = normal_scores_map[key]
-                score_record['平时成绩详情'] = normal_data['详情']
-                score_record['平时成绩总结'] = normal_data['总结']
+        with ThreadPoolExecutor(max_workers=1) as pool:
+            if concurrent:
+                normal_future = pool.submit(trace.bind(self._download_page), NORMAL_SCORES_PATH, ALL_SCORES_PATH)
+                all_scores = self.get_all_scores(known_scores=known_scores)
             else:
-                score_record['平时成绩详情'] = None
-                score_record['平时成绩总结'] = None
+                try:
+                    all_html = self._download_page(ALL_SCORES_PATH, LOADING_PATH)
+                except Exception as e:
+                    print(f"获取全部成绩时出错: {e}")
+                    all_html = None
+                normal_future = pool.submit(trace.bind(self._download_page), NORMAL_SCORES_PATH, ALL_SCORES_PATH, delay)
+                all_scores = self.get_all_scores(all_html, known_scores) if all_html is not None else None
+            try:
+                normal_html = normal_future.result()
+            except Exception as e:
+                print(f"获取平时成绩时出错: {e}")
+                normal_html = None
+        normal_scores = self.get_normal_scores(normal_html) if normal_html is not None else None
+        return self._merge(all_scores, normal_scores)
 
-        print("总成绩与平时成绩合并完成。")
-        return all_scores
-   
-import requests
-from urllib.parse import urlparse
 
-def detect_base_url(domain, test_path='/', timeout=5):
+def detect_base_url(domain, test_path='/', timeout=5, return_details=False):
     """
     自动检测网站实际使用的协议（HTTP/HTTPS）
     通过尝试访问并跟随重定向来判断
@@ -229,9 +1068,12 @@ def detect_base_url(domain, test_path='/', timeout=5):
         domain: 域名，如 'jwc.swjtu.edu.cn'
         test_path: 测试路径，默认为根路径
         timeout: 超时时间（秒）
+        return_details: 为 True 时返回包含重定向链的字典（resolve_base_url 将其写入缓存文件）
     
     Returns:
-        str: 实际使用的 BASE_URL，如 'http://jwc.swjtu.edu.cn'
+        str: 实际使用的 BASE_URL，如 'http://jwc.swjtu.edu.cn'；
+        return_details=True 时为 {'base_url', 'final_url', 'status_code', 'redirects', 'checked_at'}，
+        全部探测失败时 final_url 为 None
     """
     print(f"🔍 正在检测 {domain} 的访问协议...")
     
@@ -275,6 +1117,14 @@ def detect_base_url(domain, test_path='/', timeout=5):
             base_url = f"{final_protocol}://{final_domain}"
             
             print(f"\n✨ 检测完成！使用: {base_url}\n")
+            if return_details:
+                return {
+                    'base_url': base_url,
+                    'final_url': final_url,
+                    'status_code': response.status_code,
+                    'redirects': [[resp.url, resp.status_code] for resp in response.history],
+                    'checked_at': time.time(),
+                }
             return base_url
             
         except requests.exceptions.SSLError as e:
@@ -297,7 +1147,10 @@ def detect_base_url(domain, test_path='/', timeout=5):
     
     # 所有协议都失败，默认使用 HTTP
     print(f"⚠️  无法自动检测，默认使用: http://{domain}\n")
+    if return_details:
+        return {'base_url': f"http://{domain}", 'final_url': None, 'status_code': None,
+                'redirects': [], 'checked_at': time.time()}
     return f"http://{domain}"
 
 if __name__ == "__main__":
-    print(detect_base_url("jwc.swjtu.edu.cn"))
\ No newline at end of file
+    print(resolve_base_url(refresh="--refresh" in sys.argv))
\ No newline at end of file
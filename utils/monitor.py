@@ -0,0 +1,266 @@
+# utils/monitor.py
+"""
+单个账号的成绩监控流程：登录 → 抓取 → 比较 → 通知 → 保存
+
+actions/index.py 的 monitor（单账号）与 utils/batch.py（批量监控多个账号）共用这里的流程；
+api/index.py 的 /api/monitor-scores 使用其异步版本 async_monitor_account，两者的判断与结果相同。
+"""
+import asyncio
+import contextlib
+import time
+
+from utils import trace
+from utils.fetcher import load_cached_fingerprints, save_cached_fingerprints
+
+class MonitorFailure(Exception):
+    """登录失败或未获取到成绩，流程无法继续；args[0] 为结果字典 {"status": "error", "message": ...}"""
+
+def find_score_changes(old_scores, new_scores):
+    """
+    比较新旧成绩，返回变化列表
+
+    每项为 {'type': 变化类型, 'course': 新成绩记录, ...}，类型为 新增总成绩 / 总成绩变化 / 新增平时成绩 / 平时成绩变化
+    """
+    changes = []
+
+    # 创建旧成绩的快速查找字典 (课程名称+教师) -> 成绩记录
+    old_scores_map = {}
+    if old_scores:
+        for score in old_scores:
+            key = (score.get('课程名称'), score.get('教师'))
+            old_scores_map[key] = score
+
+    # 检查新成绩中的变化
+    for new_score in new_scores:
+        key = (new_score.get('课程名称'), new_score.get('教师'))
+
+        if key not in old_scores_map:
+            # 课程不存在于旧数据中，检查新增的内容
+
+            # 新增总成绩
+            if new_score.get('成绩'):
+                changes.append({
+                    'type': '新增总成绩',
+                    'course': new_score
+                })
+
+            # 新增平时成绩
+            if new_score.get('平时成绩详情'):
+                changes.append({
+                    'type': '新增平时成绩',
+                    'course': new_score,
+                    'new_details': new_score.get('平时成绩详情')
+                })
+        else:
+            # 课程存在，检查是否有变化
+            old_score = old_scores_map[key]
+
+            # 检查总成绩
+            old_grade = old_score.get('成绩')
+            new_grade = new_score.get('成绩')
+
+            if old_grade != new_grade:
+                if not old_grade and new_grade:
+                    # 之前没有总成绩，现在有了
+                    changes.append({
+                        'type': '新增总成绩',
+                        'course': new_score
+                    })
+                else:
+                    # 总成绩发生变化
+                    changes.append({
+                        'type': '总成绩变化',
+                        'course': new_score,
+                        'old_value': old_grade,
+                        'new_value': new_grade
+                    })
+
+            # 检查平时成绩详情
+            old_details = old_score.get('平时成绩详情') or []
+            new_details = new_score.get('平时成绩详情') or []
+
+            if old_details != new_details:
+                if not old_details and new_details:
+                    # 之前没有平时成绩，现在有了
+                    changes.append({
+                        'type': '新增平时成绩',
+                        'course': new_score,
+                        'new_details': new_details
+                    })
+                else:
+                    # 平时成绩发生变化
+                    changes.append({
+                        'type': '平时成绩变化',
+                        'course': new_score,
+                        'old_details': old_details,
+                        'new_details': new_details
+                    })
+    return changes
+
+@contextlib.contextmanager
+def _timed(timings, stage):
+    """累计该阶段的耗时，同时记录为 monitor.<stage> span"""
+    start = time.perf_counter()
+    try:
+        with trace.span(f"monitor.{stage}"):
+            yield
+    finally:
+        timings[stage] = timings.get(stage, 0.0) + time.perf_counter() - start
+
+def _known_fingerprints(username, store):
+    """上次保存的成绩页指纹：优先读本地缓存，没有时读存储"""
+    return load_cached_fingerprints(username) or store.get_fingerprints()
+
+def _diff(old_scores, new_scores):
+    print("正在比较成绩变化...")
+    with trace.span('diff', old_records=len(old_scores or ()), new_records=len(new_scores)) as diff_span:
+        changes = find_score_changes(old_scores, new_scores)
+        diff_span.set('changes', len(changes))
+    return changes
+
+def _save_scores(fetcher, store, new_scores):
+    if store.save_scores(new_scores, fingerprints=fetcher.fingerprints):
+        save_cached_fingerprints(fetcher.username, fetcher.fingerprints)
+
+def _save_fingerprints(fetcher, store, known_fingerprints):
+    # 页面有变化但成绩没有变化（如表格格式调整），更新指纹以便下次走快速路径
+    if fetcher.fingerprints != known_fingerprints and store.save_fingerprints(fetcher.fingerprints):
+        save_cached_fingerprints(fetcher.username, fetcher.fingerprints)
+
+def _unchanged_result(fast_path, timings):
+    return {
+        "status": "success",
+        "message": "成绩无变化。",
+        "changes": [],
+        "fast_path": fast_path,
+        "timings": timings
+    }
+
+def _changed_result(changes, old_scores, new_scores, fast_path, timings):
+    return {
+        "status": "success",
+        "message": f"检测到 {len(changes)} 项成绩变化，已发送邮件通知。",
+        "changes_count": len(changes),
+        "old_scores_count": len(old_scores) if old_scores else 0,
+        "new_scores_count": len(new_scores) if new_scores else 0,
+        "fast_path": fast_path,
+        "timings": timings
+    }
+
+def _incremental_fast_path(fetcher):
+    fast_path = "incremental" if fetcher.reused_records else None
+    if fast_path:
+        print(f"快速路径: 增量解析沿用了 {fetcher.reused_records} 条已保存的记录。")
+    return fast_path
+
+def monitor_account(fetcher, store, notify):
+    """
+    对一个账号执行一次成绩监控
+
+    参数:
+        fetcher: 该账号的 ScoreFetcher（session_store 通常就是 store）
+        store: 该账号的成绩存储，需提供 get_latest_scores / save_scores / get_fingerprints / save_fingerprints
+            （utils.database 或 database.store_for(username)）
+        notify: notify(changes)，检测到变化时调用；抛出异常时不保存新成绩，下次运行会再次通知
+
+    返回:
+        结果字典，timings 为各阶段耗时（秒）：login / fetch / notify / save
+
+    异常:
+        MonitorFailure: 登录失败（失败类别见 fetcher.login_failure）或未获取到成绩
+    """
+    timings = {}
+
+    # 1. 登录教务系统
+    print("正在登录教务系统获取最新成绩...")
+    with _timed(timings, 'login'):
+        login_success = fetcher.ensure_login()  # 优先复用保存的会话
+    if not login_success:
+        raise MonitorFailure({"status": "error", "message": "登录失败，请检查日志。"})
+
+    # 2. 成绩页指纹与上次保存时相同，则无需解析、比较和读写数据库
+    with _timed(timings, 'fetch'):
+        known_fingerprints = _known_fingerprints(fetcher.username, store)
+        unchanged = fetcher.scores_unchanged(known_fingerprints)
+    if unchanged:
+        print("快速路径: 成绩页面指纹未变化，跳过解析、比较与存储。")
+        return _unchanged_result("fingerprint", timings)
+
+    # 3. 获取数据库中的旧成绩，并获取最新成绩
+    print("正在从数据库获取历史成绩...")
+    with _timed(timings, 'fetch'):
+        old_scores = store.get_latest_scores()
+        new_scores = fetcher.get_combined_scores(known_scores=old_scores)  # 开启增量解析时沿用未变化的旧记录
+    if new_scores is None:
+        raise MonitorFailure({"status": "error", "message": "未能获取到成绩数据。"})
+    fast_path = _incremental_fast_path(fetcher)
+
+    # 4. 比较成绩变化
+    changes = _diff(old_scores, new_scores)
+
+    # 5. 如果有变化，发送通知并保存新成绩
+    if changes:
+        print(f"检测到 {len(changes)} 项成绩变化，正在发送邮件通知...")
+        with _timed(timings, 'notify'):
+            notify(changes)
+
+        print("正在将新成绩保存到数据库...")
+        with _timed(timings, 'save'):
+            _save_scores(fetcher, store, new_scores)
+        return _changed_result(changes, old_scores, new_scores, fast_path, timings)
+
+    print("未检测到成绩变化。")
+    with _timed(timings, 'save'):
+        _save_fingerprints(fetcher, store, known_fingerprints)
+    return _unchanged_result(fast_path, timings)
+
+async def async_monitor_account(fetcher, store, notify):
+    """
+    monitor_account 的异步版本，供 api/index.py 使用
+
+    fetcher 为 AsyncScoreFetcher；store 的读写与 notify 会阻塞，放到线程池执行。参数、返回值与异常同 monitor_account。
+    """
+    timings = {}
+
+    # 1. 登录教务系统
+    print("正在登录教务系统获取最新成绩...")
+    with _timed(timings, 'login'):
+        login_success = await fetcher.ensure_login()  # 优先复用保存的会话
+    if not login_success:
+        raise MonitorFailure({"status": "error", "message": "登录失败，请检查日志。"})
+
+    # 2. 成绩页指纹与上次保存时相同，则无需解析、比较和读写数据库
+    with _timed(timings, 'fetch'):
+        known_fingerprints = await asyncio.to_thread(_known_fingerprints, fetcher.username, store)
+        unchanged = await fetcher.scores_unchanged(known_fingerprints)
+    if unchanged:
+        print("快速路径: 成绩页面指纹未变化，跳过解析、比较与存储。")
+        return _unchanged_result("fingerprint", timings)
+
+    # 3. 获取数据库中的旧成绩，并获取最新成绩
+    print("正在从数据库获取历史成绩...")
+    with _timed(timings, 'fetch'):
+        old_scores = await asyncio.to_thread(store.get_latest_scores)
+        new_scores = await fetcher.get_combined_scores(known_scores=old_scores)
+    if new_scores is None:
+        raise MonitorFailure({"status": "error", "message": "未能获取到成绩数据。"})
+    fast_path = _incremental_fast_path(fetcher)
+
+    # 4. 比较成绩变化
+    changes = _diff(old_scores, new_scores)
+
+    # 5. 如果有变化，发送通知并保存新成绩
+    if changes:
+        print(f"检测到 {len(changes)} 项成绩变化，正在发送邮件通知...")
+        with _timed(timings, 'notify'):
+            await asyncio.to_thread(notify, changes)
+
+        print("正在将新成绩保存到数据库...")
+        with _timed(timings, 'save'):
+            await asyncio.to_thread(_save_scores, fetcher, store, new_scores)
+        return _changed_result(changes, old_scores, new_scores, fast_path, timings)
+
+    print("未检测到成绩变化。")
+    with _timed(timings, 'save'):
+        await asyncio.to_thread(_save_fingerprints, fetcher, store, known_fingerprints)
+    return _unchanged_result(fast_path, timings)
@@ -4,6 +4,11 @@ from email.mime.text import MIMEText
 from email.mime.multipart import MIMEMultipart
 from email.mime.base import MIMEBase
 from email import encoders
+from pathlib import Path
+import sys
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from utils import trace
 
 def send_email(
     smtp_server,
@@ -43,29 +48,34 @@ def send_email(
             return
 
     server = None
-    try:
-        # --- 核心修改：根据端口切换连接方式 ---
-        if smtp_port == 465:
-            # 端口 465：使用 SMTP_SSL (全程加密)
-            server = smtplib.SMTP_SSL(smtp_server, smtp_port)
-        else:
-            # 端口 587 或其他：使用普通 SMTP + starttls
-            server = smtplib.SMTP(smtp_server, smtp_port)
-            server.set_debuglevel(1)
-            server.starttls()
+    message = msg.as_string()
+    with trace.span('smtp.send', port=smtp_port) as smtp_span:
+        smtp_span.add('bytes_sent', len(message.encode('utf-8')))
+        try:
+            # --- 核心修改：根据端口切换连接方式 ---
+            if smtp_port == 465:
+                # 端口 465：使用 SMTP_SSL (全程加密)
+                server = smtplib.SMTP_SSL(smtp_server, smtp_port)
+            else:
+                # 端口 587 或其他：使用普通 SMTP + starttls
+                server = smtplib.SMTP(smtp_server, smtp_port)
+                server.set_debuglevel(1)
+                server.starttls()
 
-        # 登录并发送
-        server.login(sender_email, sender_password)
-        server.sendmail(sender_email, receiver_email, msg.as_string())
-        print("邮件发送成功")
-        
-    except smtplib.SMTPException as e:
-        print(f"SMTP错误: {e}")
-    except Exception as e:
-        print(f"发送失败: {e}")
-    finally:
-        if server:
-            server.quit()
+            # 登录并发送
+            server.login(sender_email, sender_password)
+            server.sendmail(sender_email, receiver_email, message)
+            print("邮件发送成功")
+            
+        except smtplib.SMTPException as e:
+            smtp_span.fail(e)
+            print(f"SMTP错误: {e}")
+        except Exception as e:
+            smtp_span.fail(e)
+            print(f"发送失败: {e}")
+        finally:
+            if server:
+                server.quit()
 
 # --- 您的原始内容 ---
 html_content = """
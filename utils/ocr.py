@@ -1,87 +1,155 @@
-from PIL import Image, ImageDraw
-
 from pathlib import Path
+from collections import namedtuple, OrderedDict
+from datetime import datetime
+import io
+import time
+import hashlib
+import heapq
+import importlib
+import threading
 import sys, os
 sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
 
+from utils import trace
+
 PROJECT_ROOT = str(Path(__file__).resolve().parent.parent)
-# --- 准备工作：创建用于存放调试结果的文件夹 ---
+# --- 准备工作：用于存放调试结果的文件夹（首次保存调试图片时才创建） ---
+# 本模块导入时不做任何 I/O，PIL 也在首次用到时才导入，以缩短冷启动时间
 DEBUG_FOLDER = os.path.join(PROJECT_ROOT, "utils" , "debug_output")
+TEMPLATE_DIR = os.path.join(PROJECT_ROOT, 'utils', 'templates')
+# 预编译模板产物（由 utils/compile_templates.py 生成）
+COMPILED_TEMPLATES_MODULE = 'utils.templates_compiled'
 
-if not os.path.exists(DEBUG_FOLDER):
-    os.makedirs(DEBUG_FOLDER)
+def _debug_path(filename):
+    """返回调试图片的保存路径，并确保调试目录存在"""
+    os.makedirs(DEBUG_FOLDER, exist_ok=True)
+    return os.path.join(DEBUG_FOLDER, filename)
 
 # --- 1. 预处理 ---
-def preprocess_image(image_path, threshold=128, noise_reduction_strength=2, debug=True, save_debug_images=False):
+# 将 'L' 模式字节映射为 0/1：黑色(<128) → 1，白色 → 0，便于用 count 统计投影
+_BLACK_ONES = bytes.maketrans(bytes(range(256)), b'\x01' * 128 + b'\x00' * 128)
+# 'L' 模式下 0/255 → '1' 模式的查找表
+_WHITE_TABLE = [0] * 128 + [1] * 128
+
+# 默认二值化阈值；传入 'otsu' 时根据灰度直方图自动计算
+BINARY_THRESHOLD = 94
+
+def otsu_threshold(img_gray):
+    """
+    Otsu 法计算二值化阈值：一次遍历灰度直方图，取类间方差最大的分割点
+    
+    参数:
+        img_gray: 灰度图像('L' 模式)
+    
+    返回:
+        阈值（小于该值为黑色）
+    """
+    histogram = img_gray.histogram()
+    total = sum(histogram)
+    sum_all = sum(i * count for i, count in enumerate(histogram))
+    weight_background = 0
+    sum_background = 0
+    best_variance = -1.0
+    best_threshold = BINARY_THRESHOLD
+    for i, count in enumerate(histogram):
+        weight_background += count
+        if weight_background == 0:
+            continue
+        weight_foreground = total - weight_background
+        if weight_foreground == 0:
+            break
+        sum_background += i * count
+        mean_background = sum_background / weight_background
+        mean_foreground = (sum_all - sum_background) / weight_foreground
+        variance = weight_background * weight_foreground * (mean_background - mean_foreground) ** 2
+        if variance > best_variance:
+            best_variance = variance
+            best_threshold = i + 1
+    return best_threshold
+
+def despeckle(img_bin, strength):
+    """
+    去除孤立噪点：8 邻域内黑色像素少于 strength 个的黑色像素置为白色
+    
+    参数:
+        img_bin: '1' 模式的二值图像
+        strength: 降噪强度，0 表示不处理
+    
+    返回:
+        '1' 模式的二值图像
+    """
+    from PIL import ImageChops, ImageFilter
+    if strength <= 0:
+        return img_bin
+    img_l = img_bin.convert('L')
+    # 黑色为 255，卷积后每个像素的值为 黑色邻居数 × 255 / 8
+    neighbours = img_l.point(lambda v: 255 - v).filter(
+        ImageFilter.Kernel((3, 3), [1, 1, 1, 1, 0, 1, 1, 1, 1], scale=8))
+    cutoff = (strength - 0.5) * 255 / 8
+    isolated = neighbours.point(lambda v: 255 if v < cutoff else 0)
+    return ImageChops.lighter(img_l, isolated).point(_WHITE_TABLE, '1')
+
+def binarize(img, threshold=BINARY_THRESHOLD, median_size=0, despeckle_strength=0):
+    """
+    灰度化并二值化，同时把第一行和第一列置为白色（去除边框）
+    
+    参数:
+        img: 原始图像(PIL Image对象)
+        threshold: 二值化阈值，小于阈值为黑色；'otsu' 表示按灰度直方图自动计算
+        median_size: 二值化前中值滤波的窗口大小（奇数），0 表示不滤波
+        despeckle_strength: 二值化后的去噪点强度，见 despeckle
+    
+    返回:
+        '1' 模式的二值图像
+    """
+    from PIL import ImageFilter
+    img_gray = img.convert('L')
+    if median_size:
+        img_gray = img_gray.filter(ImageFilter.MedianFilter(median_size))
+    if threshold == 'otsu':
+        threshold = otsu_threshold(img_gray)
+    table = [0] * threshold + [1] * (256 - threshold)
+    img_bin = img_gray.point(table[:256], '1')
+    width, height = img_bin.size
+    img_bin.paste(1, (0, 0, width, 1))
+    img_bin.paste(1, (0, 0, 1, height))
+    return despeckle(img_bin, despeckle_strength)
+
+def black_mask(img):
+    """返回逐像素的 0/1 字节串（1 为黑色），按行优先排列"""
+    return img.convert('L').tobytes().translate(_BLACK_ONES)
+
+def preprocess_image(image_path, threshold=128, noise_reduction_strength=0, debug=True, save_debug_images=False):
     """
     对图像进行预处理，并保存中间步骤以便调试。
     
     参数:
         image_path: 图像文件路径
-        threshold: 二值化阈值
-        noise_reduction_strength: 降噪强度
+        threshold: 二值化阈值，'otsu' 表示自动计算
+        noise_reduction_strength: 降噪强度，8 邻域内黑色像素少于该值的孤立黑点会被去除，默认0（不处理）
         debug: 是否输出调试信息，默认True
         save_debug_images: 是否保存中间结果，默认False
     """
+    from PIL import Image
     img = Image.open(image_path)
-    
-    # 步骤 1.1: 灰度化
-    img_gray = img.convert('L')
-    
-    # 步骤 1.2: 二值化
-    table = []
-    for i in range(256):
-        if i < threshold:
-            table.append(0)  # 黑色
-        else:
-            table.append(1)  # 白色
-    img_bin = img_gray.point(table, '1')
-    width, height = img_bin.size
-    img_data = img_bin.load()
-    for x in range(width):
-        for y in range(height):
-            if x == 0 or y == 0:
-                img_data[x, y] = 1
+    img_bin = binarize(img, threshold, despeckle_strength=noise_reduction_strength)
                 
     # 【调试】保存二值化结果
     if save_debug_images:
-        img_bin.convert('RGB').save(os.path.join(DEBUG_FOLDER, "debug_1_binarized.png"))
+        img_bin.convert('RGB').save(_debug_path("debug_1_binarized.png"))
     if debug:
         print(f"✅ 二值化完成" + (" → debug_1_binarized.png" if save_debug_images else ""))
     
     return img_bin
 
 # --- 2. 字符分割 ---
-def segment_characters(img, debug=True, save_debug_images=False):
-    """
-    分割字符，并可视化垂直投影，保存每个切割出的字符。
-    
-    参数:
-        img: 预处理后的图像
-        debug: 是否输出调试信息，默认True
-        save_debug_images: 是否保存中间结果，默认False
-    """
-    width, height = img.size
-    pixels = img.load()
-    
-    # 步骤 2.1: 计算垂直投影
-    vertical_projection = [0] * width
-    for x in range(width):
-        for y in range(height):
-            if pixels[x, y] == 0:
-                vertical_projection[x] += 1
-                
-    # 【调试】可视化垂直投影图
-    proj_img = Image.new('RGB', (width, height), (255, 255, 255))
-    draw = ImageDraw.Draw(proj_img)
-    for x, val in enumerate(vertical_projection):
-        draw.line([(x, height), (x, height - val)], fill=(0, 0, 0))
-    if save_debug_images:
-        proj_img.save(os.path.join(DEBUG_FOLDER, "debug_3_vertical_projection.png"))
-    if debug:
-        print(f"✅ 垂直投影完成" + (" → debug_3_vertical_projection.png" if save_debug_images else ""))
+# 字符分割方式：按垂直投影切分、按连通域切分、先投影后在数量不符时改用连通域
+SEGMENTATION_MODES = ('projection', 'components', 'auto')
+# 验证码固定字符数
+CAPTCHA_LENGTH = 4
 
-    # 步骤 2.2: 寻找边界并切割
+def _projection_boundaries(vertical_projection, width):
+    """按垂直投影寻找字符左右边界，返回 [(起始列, 结束列), ...]"""
     in_char = False
     char_boundaries = []
     start_x = 0
@@ -98,61 +166,188 @@ def segment_characters(img, debug=True, save_debug_images=False):
     # 处理边界情况：如果图像末尾还在字符内
     if in_char:
         char_boundaries.append((start_x, width))
+    return char_boundaries
 
+def _connected_components(mask, width, height):
+    """8 连通域标记，返回每个连通域的像素下标列表"""
+    visited = bytearray(len(mask))
+    components = []
+    idx = mask.find(1)
+    while idx != -1:
+        if not visited[idx]:
+            visited[idx] = 1
+            stack = [idx]
+            pixels = []
+            while stack:
+                current = stack.pop()
+                pixels.append(current)
+                y, x = divmod(current, width)
+                for ny in (y - 1, y, y + 1):
+                    if 0 <= ny < height:
+                        for nx in (x - 1, x, x + 1):
+                            if 0 <= nx < width:
+                                neighbor = ny * width + nx
+                                if mask[neighbor] and not visited[neighbor]:
+                                    visited[neighbor] = 1
+                                    stack.append(neighbor)
+            components.append(pixels)
+        idx = mask.find(1, idx + 1)
+    return components
+
+def _component_segments(mask, width, height, expected_chars=CAPTCHA_LENGTH, min_pixels=4, min_split_width=8,
+                        split_window=1):
+    """
+    按连通域分割字符，并利用验证码字符数已知这一点修正结果
+    
+    1. 丢弃像素数少于 min_pixels 的噪点连通域
+    2. 列范围大部分重叠的连通域视为同一字符（断笔）并合并
+    3. 数量不足时，按宽度把缺少的份数分给最宽的区域，在等分点 ±split_window
+       列内的投影最低处切开
+    4. 数量过多时，把最窄的碎片并入间隙更小的相邻区域
+    
+    返回:
+        [(起始列, 结束列, 像素下标列表), ...]，按起始列排序
+    """
+    segments = []
+    for pixels in _connected_components(mask, width, height):
+        if len(pixels) < min_pixels:
+            continue
+        columns = [idx % width for idx in pixels]
+        segments.append([min(columns), max(columns) + 1, pixels])
+    segments.sort(key=lambda seg: seg[0])
+    
+    # 合并列范围重叠超过较窄者一半的连通域
+    merged = []
+    for seg in segments:
+        if merged:
+            last = merged[-1]
+            overlap = min(last[1], seg[1]) - max(last[0], seg[0])
+            if overlap * 2 >= min(last[1] - last[0], seg[1] - seg[0]):
+                merged[-1] = [min(last[0], seg[0]), max(last[1], seg[1]), last[2] + seg[2]]
+                continue
+        merged.append(seg)
+    segments = merged
+    
+    # 过宽的区域：按宽度分配需要切成的份数，在每个等分点附近的投影最低列处切开
+    pieces = [1] * len(segments)
+    for _ in range(expected_chars - len(segments)):
+        index = max(range(len(segments)), key=lambda i: (segments[i][1] - segments[i][0]) / pieces[i], default=None)
+        if index is None or (segments[index][1] - segments[index][0]) / (pieces[index] + 1) < min_split_width / 2:
+            break
+        pieces[index] += 1
+    split_segments = []
+    for (start, end, pixels), count in zip(segments, pieces):
+        seg_width = end - start
+        projection = [0] * seg_width
+        for idx in pixels:
+            projection[idx % width - start] += 1
+        cuts = []
+        for j in range(1, count):
+            target = j * seg_width / count
+            window = range(max(1, round(target) - split_window), min(seg_width - 1, round(target) + split_window) + 1)
+            cuts.append(start + min(window, key=lambda x: (projection[x], abs(x - target))))
+        bounds = [start] + cuts + [end]
+        for left, right in zip(bounds, bounds[1:]):
+            split_segments.append([left, right, [idx for idx in pixels if left <= idx % width < right]])
+    segments = split_segments
+    
+    # 多余的碎片：并入间隙更小的相邻区域
+    while len(segments) > expected_chars:
+        index = min(range(len(segments)), key=lambda i: (segments[i][1] - segments[i][0], len(segments[i][2])))
+        if index == 0:
+            target = 1
+        elif index == len(segments) - 1:
+            target = index - 1
+        else:
+            left_gap = segments[index][0] - segments[index - 1][1]
+            right_gap = segments[index + 1][0] - segments[index][1]
+            target = index - 1 if left_gap <= right_gap else index + 1
+        a, b = sorted((index, target))
+        segments[a:b + 1] = [[min(segments[a][0], segments[b][0]), max(segments[a][1], segments[b][1]),
+                              segments[a][2] + segments[b][2]]]
+    return [tuple(seg) for seg in segments]
+
+def _segment_image(pixels, width, start, end, height):
+    """用属于某个字符的像素生成只含该字符的二值图像（列范围 [start, end)）"""
+    from PIL import Image
+    seg_width = end - start
+    buffer = bytearray(b'\xff' * (seg_width * height))
+    for idx in pixels:
+        y, x = divmod(idx, width)
+        buffer[y * seg_width + x - start] = 0
+    return Image.frombytes('L', (seg_width, height), bytes(buffer)).point(_WHITE_TABLE, '1')
+
+def _trim_rows(img, mask, width, height, start, end):
+    """截取 [start, end) 列，并用水平投影裁掉上下空白（一行至少 2 个黑色像素才算有内容）"""
+    horizontal_projection = [mask[y * width + start:y * width + end].count(1) for y in range(height)]
+    content_rows = [y for y, val in enumerate(horizontal_projection) if val > 1]
+    if len(content_rows) > 1 and content_rows[-1] > content_rows[0]:
+        return img.crop((start, content_rows[0], end, content_rows[-1] + 1))
+    return img.crop((start, 0, end, height))
+
+def segment_characters(img, debug=True, save_debug_images=False, mode='projection', expected_chars=CAPTCHA_LENGTH):
+    """
+    分割字符，并可视化垂直投影，保存每个切割出的字符。
+    
+    参数:
+        img: 预处理后的图像
+        debug: 是否输出调试信息，默认True
+        save_debug_images: 是否保存中间结果，默认False
+        mode: 分割方式，见 SEGMENTATION_MODES
+            'projection': 按垂直投影中的空白列切分（默认）
+            'components': 按连通域切分，并根据字符数拆开粘连、合并碎片
+            'auto': 先按投影切分，数量不等于 expected_chars 时改用连通域
+        expected_chars: 验证码字符数，默认4
+    """
+    if mode not in SEGMENTATION_MODES:
+        raise ValueError(f"未知的分割方式: {mode}")
+    width, height = img.size
+    mask = black_mask(img)
+    
+    # 步骤 2.1: 计算垂直投影（按列步长切片统计黑色像素）
+    vertical_projection = [mask[x::width].count(1) for x in range(width)]
+                
+    # 【调试】可视化垂直投影图
+    if save_debug_images:
+        from PIL import Image, ImageDraw
+        proj_img = Image.new('RGB', (width, height), (255, 255, 255))
+        draw = ImageDraw.Draw(proj_img)
+        for x, val in enumerate(vertical_projection):
+            draw.line([(x, height), (x, height - val)], fill=(0, 0, 0))
+        proj_img.save(_debug_path("debug_3_vertical_projection.png"))
+    if debug:
+        print(f"✅ 垂直投影完成" + (" → debug_3_vertical_projection.png" if save_debug_images else ""))
+
+    # 步骤 2.2: 寻找边界并切割
     char_images = []
-    for i, (start, end) in enumerate(char_boundaries):
-        box = (start, 0, end, height)
-        char_img = img.crop(box)
-        
-        # 使用水平投影消除上下位置差异
-        char_width, char_height = char_img.size
-        char_pixels = char_img.load()
-        
-        # 计算水平投影(每一行的黑色像素数量)
-        horizontal_projection = [0] * char_height
-        for y in range(char_height):
-            for x in range(char_width):
-                if char_pixels[x, y] == 0:  # 黑色像素
-                    horizontal_projection[y] += 1
-        
-        # 找到字符的上下边界
-        top_boundary = 0
-        bottom_boundary = char_height - 1
-        
-        # 从上往下找第一个有内容的行
-        for y in range(char_height):
-            if horizontal_projection[y] > 1:
-                top_boundary = y
-                break
-        
-        # 从下往上找最后一个有内容的行
-        for y in range(char_height - 1, -1, -1):
-            if horizontal_projection[y] > 1:
-                bottom_boundary = y
-                break
-        
-        # 裁剪掉上下空白区域
-        if bottom_boundary > top_boundary:
-            char_img = char_img.crop((0, top_boundary, char_width, bottom_boundary + 1))
-        
-        char_images.append(char_img)
-        # 【调试】保存每个切割出的字符（保持二值模式）
-        if save_debug_images:
-            char_img.save(os.path.join(DEBUG_FOLDER, f"char_{i}.png"))
+    char_boundaries = [] if mode == 'components' else _projection_boundaries(vertical_projection, width)
+    if mode == 'components' or (mode == 'auto' and len(char_boundaries) != expected_chars):
+        for start, end, pixels in _component_segments(mask, width, height, expected_chars):
+            seg_img = _segment_image(pixels, width, start, end, height)
+            char_images.append(_trim_rows(seg_img, black_mask(seg_img), end - start, height, 0, end - start))
+    else:
+        for start, end in char_boundaries:
+            char_images.append(_trim_rows(img, mask, width, height, start, end))
+
+    # 【调试】保存每个切割出的字符（保持二值模式）
+    if save_debug_images:
+        for i, char_img in enumerate(char_images):
+            char_img.save(_debug_path(f"char_{i}.png"))
         
     if debug:
         print(f"✅ 字符分割完成，共{len(char_images)}个字符" + (f" → char_0.png ~ char_{len(char_images)-1}.png" if save_debug_images else ""))
     return char_images
 
 # --- 3. 字符识别 (增加详细log) ---
-def load_templates(template_dir=os.path.join(PROJECT_ROOT, 'utils', 'templates')):
+def load_templates(template_dir=TEMPLATE_DIR):
     """加载模板字符库"""
+    from PIL import Image
     # 初始化空字典，用于存储模板图像
     templates = {}
     # 检查模板目录是否存在，如果不存在则返回 None
     if not os.path.exists(template_dir): return None
-    # 遍历模板目录中的所有文件
-    for filename in os.listdir(template_dir):
+    # 遍历模板目录中的所有文件（排序保证模板顺序在各平台一致）
+    for filename in sorted(os.listdir(template_dir)):
         # 只处理 PNG 格式的图像文件
         if filename.endswith('.png'):
             # 提取文件名（去掉扩展名）作为字符名称
@@ -166,119 +361,375 @@ def load_templates(template_dir=os.path.join(PROJECT_ROOT, 'utils', 'templates')
     # 返回包含所有模板的字典
     return templates
 
-def recognize_character(char_img, templates, offset_range=3, debug=True):
+# 将 'L' 模式字节映射为位串：黑色(<128) → '1'，白色 → '0'
+_BLACK_BITS = bytes.maketrans(bytes(range(256)), b'1' * 128 + b'0' * 128)
+
+# 打包后的字符：宽度、高度、每行位掩码、黑色像素总数
+PackedGlyph = namedtuple('PackedGlyph', ['width', 'height', 'rows', 'black_count'])
+
+def pack_glyph(img):
+    """
+    将二值图像打包为逐行位掩码，供匹配器复用
+    
+    参数:
+        img: 二值化后的字符或模板图像(PIL Image对象)
+    
+    返回:
+        PackedGlyph(宽度, 高度, 每行位掩码列表, 黑色像素总数)
+        每行位掩码中第 x 位为 1 表示该行第 x 列是黑色像素
+    """
+    width, height = img.size
+    data = img.convert('L').tobytes()
+    rows = []
+    for y in range(height):
+        row = data[y * width:(y + 1) * width]
+        # 反转后第 x 列对应第 x 位
+        rows.append(int(row[::-1].translate(_BLACK_BITS), 2) if width else 0)
+    black_count = sum(row.bit_count() for row in rows)
+    return PackedGlyph(width, height, rows, black_count)
+
+def template_digest(template_dir=TEMPLATE_DIR):
+    """计算模板目录中全部 PNG 文件名和内容的摘要，用于判断预编译产物是否过期"""
+    if not os.path.exists(template_dir):
+        return None
+    digest = hashlib.sha256()
+    for filename in sorted(f for f in os.listdir(template_dir) if f.endswith('.png')):
+        digest.update(filename.encode('utf-8') + b'\0')
+        with open(os.path.join(template_dir, filename), 'rb') as f:
+            digest.update(f.read())
+    return digest.hexdigest()
+
+def load_compiled_templates(template_dir=TEMPLATE_DIR, module_name=COMPILED_TEMPLATES_MODULE):
+    """
+    读取预编译的模板产物，无需解码 PNG
+    
+    参数:
+        template_dir: 产物对应的模板目录，用于校验是否过期
+        module_name: 产物模块名
+    
+    返回:
+        {字符名: PackedGlyph}；产物不存在或与模板文件不一致时返回 None
+    """
+    try:
+        module = importlib.import_module(module_name)
+    except ImportError:
+        return None
+    if getattr(module, 'DIGEST', None) != template_digest(template_dir):
+        return None
+    return {name: PackedGlyph(width, height, list(rows), black_count)
+            for name, width, height, rows, black_count in module.TEMPLATES}
+
+class TemplateBank:
+    """
+    预编译的模板库，每个进程只构建一次
+    
+    保存每个模板的尺寸、黑色像素数和位掩码。构建时优先读取预编译产物，
+    产物缺失或过期时才解码 PNG。同时记录模板目录中每个 PNG 文件的
+    修改时间和大小，文件发生增删改后自动失效重建。
+    """
+    def __init__(self, template_dir=TEMPLATE_DIR):
+        self.template_dir = template_dir
+        self.signature = None
+        self.glyphs = {}
+        # 模板来源：'compiled'（预编译产物）或 'png'（解码模板图片）
+        self.source = None
+
+    @staticmethod
+    def scan(template_dir):
+        """返回模板目录的指纹：((文件名, 修改时间, 文件大小), ...)，目录不存在时返回 None"""
+        if not os.path.exists(template_dir):
+            return None
+        entries = []
+        for entry in os.scandir(template_dir):
+            if entry.name.endswith('.png'):
+                stat = entry.stat()
+                entries.append((entry.name, stat.st_mtime_ns, stat.st_size))
+        return tuple(sorted(entries))
+
+    def is_stale(self):
+        """模板目录是否已在构建之后发生变化"""
+        return self.signature is None or self.scan(self.template_dir) != self.signature
+
+    def build(self):
+        """从预编译产物或模板目录重新构建全部模板"""
+        self.signature = self.scan(self.template_dir)
+        compiled = load_compiled_templates(self.template_dir)
+        if compiled is not None:
+            self.glyphs = compiled
+            self.source = 'compiled'
+            return self
+        templates = load_templates(self.template_dir) or {}
+        self.glyphs = {name: pack_glyph(img) for name, img in templates.items()}
+        self.source = 'png'
+        return self
+
+    def __len__(self):
+        return len(self.glyphs)
+
+# 进程级缓存：模板目录 -> TemplateBank
+_TEMPLATE_BANKS = {}
+
+def get_template_bank(template_dir=TEMPLATE_DIR):
+    """
+    获取进程内共享的模板库，首次调用或模板文件变化时才重新构建
+    
+    参数:
+        template_dir: 模板目录
+    
+    返回:
+        TemplateBank 对象（模板为空时 len 为 0）
+    """
+    bank = _TEMPLATE_BANKS.get(template_dir)
+    if bank is None or bank.is_stale():
+        bank = TemplateBank(template_dir).build()
+        _TEMPLATE_BANKS[template_dir] = bank
+    return bank
+
+def _join_rows(rows, stride, pad):
+    """按固定行跨度把逐行位掩码拼接为一个大整数"""
+    packed = 0
+    for y, row in enumerate(rows):
+        packed |= row << (y * stride + pad)
+    return packed
+
+def black_count_bound(glyph, template):
+    """
+    只根据黑色像素数给出相似度上界
+    
+    调和平均相似度等于 2·重合数 / (模板黑色数 + 字符黑色数)，
+    而重合数不会超过两者中较小的那个。
+    """
+    total = glyph.black_count + template.black_count
+    return 2 * min(glyph.black_count, template.black_count) / total if total else 0.0
+
+def shape_bound(glyph, template):
+    """
+    默认预筛选：根据宽度、高度和黑色像素数给出相似度上界
+    
+    在 black_count_bound 的基础上，黑色重合像素只能落在字符与模板外框的
+    交集内（打包时行两侧留有空白，偏移不会把像素移到相邻行），交集不超过
+    min(宽度) × min(高度) 个像素；两者尺寸相差越大，上界越紧。
+    """
+    total = glyph.black_count + template.black_count
+    if not total:
+        return 0.0
+    overlap = min(glyph.black_count, template.black_count,
+                  min(glyph.width, template.width) * min(glyph.height, template.height))
+    return 2 * overlap / total
+
+# 上界比较时的浮点容差，保证剪枝只会多算、不会漏算
+_BOUND_EPSILON = 1e-9
+
+def match_glyph(glyph, packed_templates, offset_range=3, keep=None, prefilter=shape_bound):
+    """
+    计算字符与每个模板在所有偏移下的最佳相似度
+    
+    字符与模板都按同一行跨度打包成一个大整数，每个偏移只需一次移位、
+    一次按位与和一次 popcount 即可得到黑色重合像素数。行跨度两侧留出
+    offset_range 的空白，保证越界的模板像素不会落到相邻行的字符像素上。
+    
+    指定 keep 时启用剪枝：按 prefilter 给出的相似度上界从高到低评分，
+    一旦剩余模板的上界都低于当前第 keep 名的相似度就停止，前 keep 名
+    （包括平局的先后顺序）与完整扫描完全一致。
+    
+    参数:
+        glyph: pack_glyph 返回的待识别字符
+        packed_templates: 字典，键为字符名，值为 pack_glyph 返回的模板
+        offset_range: 允许的上下左右偏移范围，默认为3像素
+        keep: 需要保证正确的名次数；None 表示不剪枝，对全部模板评分
+        prefilter: 形状特征预筛选函数 prefilter(glyph, template) -> 相似度上界，
+            可利用宽度、高度和黑色像素数；必须是真正的上界，否则剪枝结果可能与完整扫描不同
+    
+    返回:
+        [(字符名, 最佳相似度, 最佳偏移), ...]，只包含实际评分的模板，顺序与 packed_templates 一致
+    """
+    char_width, _, char_rows, char_black_count = glyph
+    pad = offset_range
+    max_template_width = max((t.width for t in packed_templates.values()), default=0)
+    stride = max(char_width + pad, max_template_width + 2 * pad)
+    char_bits = _join_rows(char_rows, stride, pad)
+    # 偏移遍历顺序与逐像素实现保持一致，相似度相同时保留先出现的偏移
+    offsets = [(offset_x, offset_y, offset_y * stride + offset_x)
+               for offset_x in range(-offset_range, offset_range + 1)
+               for offset_y in range(-offset_range, offset_range + 1)]
+    
+    candidates = list(enumerate(packed_templates.items()))
+    if keep is not None:
+        bounds = [prefilter(glyph, template) for _, (_, template) in candidates]
+        candidates.sort(key=lambda item: bounds[item[0]], reverse=True)
+    
+    scored = []
+    top_similarities = []  # 最小堆，保存目前最好的 keep 个相似度
+    for index, (char_name, template) in candidates:
+        if keep is not None and len(top_similarities) >= keep \
+                and bounds[index] < top_similarities[0] - _BOUND_EPSILON:
+            break
+        template_black_count = template.black_count
+        template_bits = _join_rows(template.rows, stride, pad)
+        best_offset_similarity = 0.0
+        best_offset = (0, 0)
+        for offset_x, offset_y, shift in offsets:
+            shifted = template_bits << shift if shift >= 0 else template_bits >> -shift
+            overlap_black_count = (shifted & char_bits).bit_count()
+            
+            # 相似度计算与原实现完全一致：两个比例的调和平均数
+            if template_black_count > 0:
+                template_ratio = overlap_black_count / template_black_count
+            else:
+                template_ratio = 0.0
+            if char_black_count > 0:
+                char_ratio = overlap_black_count / char_black_count
+            else:
+                char_ratio = 0.0
+            if template_ratio + char_ratio > 0:
+                similarity = 2 * template_ratio * char_ratio / (template_ratio + char_ratio)
+            else:
+                similarity = 0.0
+            
+            if similarity > best_offset_similarity:
+                best_offset_similarity = similarity
+                best_offset = (offset_x, offset_y)
+        scored.append((index, (char_name, best_offset_similarity, best_offset)))
+        if keep is not None:
+            if len(top_similarities) < keep:
+                heapq.heappush(top_similarities, best_offset_similarity)
+            else:
+                heapq.heappushpop(top_similarities, best_offset_similarity)
+    
+    scored.sort()
+    return [result for _, result in scored]
+
+# 单个字符的识别详情：识别结果、最佳相似度、与第二名的差距、前 k 个候选 [(字符名, 相似度), ...]、
+# 实际评分的模板数
+CharMatch = namedtuple('CharMatch', ['char', 'similarity', 'margin', 'candidates', 'scored'])
+# 整个验证码的识别详情：识别字符串、整体置信度（各字符相似度的最小值）、每个字符的 CharMatch、
+# 采用的预处理参数
+OcrResult = namedtuple('OcrResult', ['text', 'confidence', 'chars', 'options'])
+
+def recognize_character(char_img, templates, offset_range=3, debug=True, return_details=False, top_k=3,
+                        prune=True, prefilter=shape_bound):
     """
     识别单个字符图像，通过滑动窗口与模板库中的字符进行像素级比较
     
     参数:
         char_img: 待识别的字符图像(PIL Image对象)
-        templates: 模板字符库字典，键为字符名，值为模板图像
+        templates: TemplateBank，或模板字符库字典（键为字符名，值为模板图像）
         offset_range: 允许的上下左右偏移范围，默认为3像素
         debug: 是否输出调试信息，默认True
+        return_details: 是否返回 CharMatch 识别详情，默认False
+        top_k: 识别详情中保留的候选数量，默认3
+        prune: 是否按相似度上界剪枝，结果与完整扫描一致，默认True
+        prefilter: 剪枝使用的形状特征预筛选函数，见 match_glyph
     
     返回:
-        best_match: 最匹配的字符名称(字符串)
+        best_match: 最匹配的字符名称(字符串)；return_details=True 时返回 CharMatch
     """
-    # 获取待识别字符的尺寸和像素数据
-    char_width, char_height = char_img.size
-    char_pixels = char_img.load()
+    glyph = pack_glyph(char_img)
+    if isinstance(templates, TemplateBank):
+        packed_templates = templates.glyphs
+    else:
+        packed_templates = {name: pack_glyph(img) for name, img in templates.items()}
+    # 剪枝时需要保证正确的名次数：识别结果 1 个，调试输出 3 个，识别详情 top_k 个（至少 2 个以计算差距）
+    keep = None
+    if prune:
+        keep = max(1, 3 if debug else 1, max(top_k, 2) if return_details else 1)
+    match_results = match_glyph(glyph, packed_templates, offset_range=offset_range, keep=keep, prefilter=prefilter)
     
-    # 初始化最大相似度为0，用于记录最佳匹配的相似度
+    # 严格大于才更新，与模板遍历顺序一起决定平局时的结果
     max_similarity = 0.0
-    # 初始化最佳匹配字符为'?'，表示未识别或无匹配结果
     best_match = '?'
-    
-    # 存储所有模板的匹配结果，用于调试输出
-    match_results = []
-    
-    # 遍历模板库中的每个字符模板
-    for char_name, template_img in templates.items():
-        # 获取模板图像的尺寸和像素数据
-        template_width, template_height = template_img.size
-        template_pixels = template_img.load()
-        
-        # 对当前模板尝试不同的偏移位置
-        best_offset_similarity = 0.0
-        best_offset = (0, 0)
-        
-        # 计算模板的黑色像素总数
-        template_black_count = 0
-        for x in range(template_width):
-            for y in range(template_height):
-                if template_pixels[x, y] == 0:  # 黑色像素
-                    template_black_count += 1
-        
-        # 计算待识别字符的黑色像素总数
-        char_black_count = 0
-        for x in range(char_width):
-            for y in range(char_height):
-                if char_pixels[x, y] == 0:  # 黑色像素
-                    char_black_count += 1
-        
-        # 遍历所有可能的偏移量
-        for offset_x in range(-offset_range, offset_range + 1):
-            for offset_y in range(-offset_range, offset_range + 1):
-                # 计算黑色部分重合的像素数量
-                overlap_black_count = 0
-                
-                # 遍历模板的每个像素
-                for template_x in range(template_width):
-                    for template_y in range(template_height):
-                        # 如果模板这个位置是黑色像素
-                        if template_pixels[template_x, template_y] == 0:
-                            # 计算对应在待识别字符上的位置
-                            char_x = template_x + offset_x
-                            char_y = template_y + offset_y
-                            
-                            # 检查是否在待识别字符的范围内
-                            if 0 <= char_x < char_width and 0 <= char_y < char_height:
-                                # 如果待识别字符这个位置也是黑色，则重合
-                                if char_pixels[char_x, char_y] == 0:
-                                    overlap_black_count += 1
-                
-                # 计算相似度：黑色重合像素占模板黑色像素的比例
-                if template_black_count > 0:
-                    template_ratio = overlap_black_count / template_black_count
-                else:
-                    template_ratio = 0.0
-                
-                # 计算相似度：黑色重合像素占待识别字符黑色像素的比例
-                if char_black_count > 0:
-                    char_ratio = overlap_black_count / char_black_count
-                else:
-                    char_ratio = 0.0
-                
-                # 使用调和平均数作为相似度（比算术平均更严格）
-                if template_ratio + char_ratio > 0:
-                    similarity = 2 * template_ratio * char_ratio / (template_ratio + char_ratio)
-                else:
-                    similarity = 0.0
-                
-                # 更新该模板的最佳偏移
-                if similarity > best_offset_similarity:
-                    best_offset_similarity = similarity
-                    best_offset = (offset_x, offset_y)
-        
-        # 记录匹配结果
-        match_results.append((char_name, best_offset_similarity, best_offset))
-        
-        # 如果当前模板的相似度大于全局最大相似度，则更新最佳匹配
-        if best_offset_similarity > max_similarity:
-            max_similarity = best_offset_similarity
+    for char_name, similarity, _ in match_results:
+        if similarity > max_similarity:
+            max_similarity = similarity
             best_match = char_name
     
+    # 按相似度降序排序（稳定排序，平局保持模板顺序）
+    sorted_results = sorted(match_results, key=lambda x: x[1], reverse=True)
+    
     # 【调试】输出紧凑的匹配结果
     if debug:
-        # 按相似度降序排序，只显示前3个
-        sorted_results = sorted(match_results, key=lambda x: x[1], reverse=True)[:3]
-        results_str = " | ".join([f"{name}:{sim:.3f}" for name, sim, _ in sorted_results])
-        print(f"  [{results_str}] → '{best_match}'")
+        # 只显示前3个
+        results_str = " | ".join([f"{name}:{sim:.3f}" for name, sim, _ in sorted_results[:3]])
+        print(f"  [{results_str}] → '{best_match}' (评分 {len(match_results)}/{len(packed_templates)})")
+    
+    if return_details:
+        runner_up_similarity = sorted_results[1][1] if len(sorted_results) > 1 else 0.0
+        return CharMatch(
+            char=best_match,
+            similarity=max_similarity,
+            margin=max_similarity - runner_up_similarity,
+            candidates=[(name, sim) for name, sim, _ in sorted_results[:top_k]],
+            scored=len(match_results),
+        )
     
     # 返回识别结果
     return best_match
 
 # --- 4. 对外接口 ---
-def classify(image_bytes, debug=True, save_debug_images=False):
+# 多假设集成时额外尝试的预处理方案
+ENSEMBLE_VARIANTS = (
+    {'threshold': BINARY_THRESHOLD, 'segmentation': 'auto', 'median_size': 0, 'despeckle_strength': 0},
+    {'threshold': 'otsu', 'segmentation': 'auto', 'median_size': 0, 'despeckle_strength': 0},
+    {'threshold': 'otsu', 'segmentation': 'components', 'median_size': 0, 'despeckle_strength': 2},
+    {'threshold': 'otsu', 'segmentation': 'components', 'median_size': 3, 'despeckle_strength': 0},
+    {'threshold': BINARY_THRESHOLD, 'segmentation': 'components', 'median_size': 3, 'despeckle_strength': 0},
+)
+# 任一字符最佳与第二名相似度之差小于该值时视为有歧义
+ENSEMBLE_MARGIN = 0.05
+# 识别结果缓存的容量：键为 (图片摘要, 模板库指纹, 识别参数)，按最近使用淘汰
+OCR_MEMO_SIZE = 256
+_OCR_MEMO = OrderedDict()
+# classify 会在多个线程中同时调用（asyncio.to_thread、并行登录、批量监控），读取与淘汰都需加锁
+_OCR_MEMO_LOCK = threading.Lock()
+
+def _hypothesis_score(result):
+    """假设的综合评分：字符数正确优先，其次整体置信度，再次平均相似度"""
+    mean_similarity = sum(match.similarity for match in result.chars) / len(result.chars) if result.chars else 0.0
+    return (len(result.text) == CAPTCHA_LENGTH, result.confidence, mean_similarity)
+
+def _is_ambiguous(result, margin):
+    return len(result.text) != CAPTCHA_LENGTH or any(match.margin < margin for match in result.chars)
+
+def _classify_variant(image_bytes, templates, options, debug=False, save_debug_images=False):
+    """按一组预处理参数识别一次，返回 OcrResult"""
+    from PIL import Image
+    # 1. 预处理：从字节流加载图像，灰度化并二值化
+    with trace.span('ocr.binarize'):
+        img = Image.open(io.BytesIO(image_bytes))
+        img_bin = binarize(img, options['threshold'], median_size=options['median_size'],
+                           despeckle_strength=options['despeckle_strength'])
+                
+    # 【调试】保存二值化结果
+    if save_debug_images:
+        img_bin.convert('RGB').save(_debug_path("debug_2_binarized_bytes.png"))
+    if debug:
+        print(f"✅ 二值化完成" + (" → debug_2_binarized_bytes.png" if save_debug_images else ""))
+    
+    # 2. 分割字符
+    with trace.span('ocr.segment', mode=options['segmentation']) as segment_span:
+        char_images = segment_characters(img_bin, debug=debug, save_debug_images=save_debug_images,
+                                         mode=options['segmentation'])
+        segment_span.set('glyphs', len(char_images))
+    
+    # 3. 识别字符
+    if debug:
+        print(f"✅ 开始识别{len(char_images)}个字符：")
+    char_matches = []
+    for i, char_img in enumerate(char_images):
+        if debug:
+            print(f"  字符{i+1}:", end=" ")
+        with trace.span('ocr.glyph', index=i) as glyph_span:
+            match = recognize_character(char_img, templates, debug=debug, return_details=True)
+            glyph_span.set('char', match.char)
+            glyph_span.set('similarity', round(match.similarity, 4))
+        char_matches.append(match)
+    result = "".join(match.char for match in char_matches)
+    confidence = min((match.similarity for match in char_matches), default=0.0)
+    return OcrResult(text=result, confidence=confidence, chars=char_matches, options=options)
+
+def classify(image_bytes, debug=True, save_debug_images=False, return_details=False, segmentation='projection',
+             threshold=BINARY_THRESHOLD, median_size=0, despeckle_strength=0,
+             ensemble=False, ensemble_budget=1.0, ensemble_margin=ENSEMBLE_MARGIN, use_memo=True):
     """
     识别验证码图片（从字节流输入）
     
@@ -286,69 +737,132 @@ def classify(image_bytes, debug=True, save_debug_images=False):
         image_bytes: 图片字节流（可以是从网络请求获取的内容）
         debug: 是否输出调试信息，默认True
         save_debug_images: 是否保存中间结果，默认False
+        return_details: 是否返回 OcrResult（含每个字符的相似度、与第二名的差距和整体置信度），默认False
+        segmentation: 字符分割方式，见 segment_characters，默认'projection'
+        threshold: 二值化阈值，默认94；'otsu' 表示按灰度直方图自动计算
+        median_size: 二值化前中值滤波的窗口大小，默认0（不滤波）
+        despeckle_strength: 二值化后的去噪点强度，默认0（不处理）
+        ensemble: 是否启用多假设集成，默认False。结果有歧义（字符数不对，或任一字符
+            与第二名的差距小于 ensemble_margin）时，依次尝试 ENSEMBLE_VARIANTS 中的
+            预处理方案，返回综合置信度最高的假设。各方案串行评估、不并发（原需求要求并发，
+            已收窄范围，原因见函数内步骤 4 的说明），耗时随方案数线性增长，由 ensemble_budget 封顶
+        ensemble_budget: 多假设集成的总耗时上限（秒），每个方案开始前检查，用完后不再尝试
+            其余方案（已开始的方案会执行完，实际耗时最多超出一个方案）
+        ensemble_margin: 判定歧义的相似度差距
+        use_memo: 是否使用识别结果缓存（相同图片字节与参数不重复识别），默认True
     
     返回:
-        识别出的验证码字符串
+        识别出的验证码字符串；return_details=True 时返回 OcrResult
     """
-    import io
-    
+    start_time = time.perf_counter()
     if debug:
         print("="*50)
         print("开始识别验证码")
     
-    # 0. 加载模板
-    templates = load_templates()
+    # 0. 获取模板库（进程内只构建一次）
+    templates = get_template_bank()
     if not templates:
         if debug:
             print("❌ 错误：模板文件夹为空或不存在")
         return None
 
-    # 1. 预处理
-    BINARY_THRESHOLD = 94
-    # 1. 从字节流加载图像
-    img = Image.open(io.BytesIO(image_bytes))
-    # 步骤 1.1: 灰度化
-    img_gray = img.convert('L')
-
-    # 步骤 1.2: 二值化
-    table = []
-    for i in range(256):
-        if i < BINARY_THRESHOLD:
-            table.append(0)  # 黑色
-        else:
-            table.append(1)  # 白色
-    img_bin = img_gray.point(table, '1')
-    width, height = img_bin.size
-    img_data = img_bin.load()
-    for x in range(width):
-        for y in range(height):
-            if x == 0 or y == 0:
-                img_data[x, y] = 1
-                
-    # 【调试】保存二值化结果
-    if save_debug_images:
-        img_bin.convert('RGB').save(os.path.join(DEBUG_FOLDER, "debug_2_binarized_bytes.png"))
-    if debug:
-        print(f"✅ 二值化完成" + (" → debug_2_binarized_bytes.png" if save_debug_images else ""))
+    options = {'threshold': threshold, 'segmentation': segmentation,
+               'median_size': median_size, 'despeckle_strength': despeckle_strength}
     
-    # 2. 分割字符
-    char_images = segment_characters(img_bin, debug=debug, save_debug_images=save_debug_images)
+    # 相同的验证码图片不重复识别
+    memo_key = None
+    if use_memo:
+        memo_key = (hashlib.sha256(image_bytes).digest(), templates.signature, tuple(options.items()),
+                    ensemble, ensemble_margin)
+        with _OCR_MEMO_LOCK:
+            cached = _OCR_MEMO.get(memo_key)
+            if cached is not None:
+                _OCR_MEMO.move_to_end(memo_key)
+        if cached is not None:
+            trace.current().set('memo_hit', True)
+            if debug:
+                print(f"✅ 命中识别缓存：{cached.text}（置信度 {cached.confidence:.3f}）")
+                print("="*50)
+            return cached if return_details else cached.text
     
-    # 3. 识别字符
-    if debug:
-        print(f"✅ 开始识别{len(char_images)}个字符：")
-    result = ""
-    for i, char_img in enumerate(char_images):
+    best = _classify_variant(image_bytes, templates, options, debug=debug, save_debug_images=save_debug_images)
+    
+    # 4. 有歧义时依次评估其他预处理方案
+    # 匹配是持有 GIL 的纯 Python 位运算，放到线程池中并不能并行，只会增加调度开销；
+    # 进程池能真正并行，但每次登录都要把图片与模板库传给子进程，且批量监控的多线程进程中 fork 并不安全。
+    # 因此不做并发，逐个评估，每个方案开始前检查耗时上限。受上限影响而未评估完全的结果不写入缓存
+    complete = True
+    if ensemble and _is_ambiguous(best, ensemble_margin):
+        variants = [variant for variant in ENSEMBLE_VARIANTS if variant != options]
+        evaluated = 0
+        with trace.span('ocr.ensemble', variants=len(variants)) as ensemble_span:
+            for variant in variants:
+                if time.perf_counter() - start_time >= ensemble_budget:
+                    break
+                result = _classify_variant(image_bytes, templates, variant)
+                evaluated += 1
+                if _hypothesis_score(result) > _hypothesis_score(best):
+                    best = result
+            ensemble_span.set('evaluated', evaluated)
+        complete = evaluated == len(variants)
         if debug:
-            print(f"  字符{i+1}:", end=" ")
-        recognized_char = recognize_character(char_img, templates, debug=debug)
-        result += recognized_char
+            print(f"✅ 多假设集成：完成 {evaluated}/{len(variants)} 个方案，采用 {best.options}")
+    
+    if memo_key is not None and complete:
+        with _OCR_MEMO_LOCK:
+            _OCR_MEMO[memo_key] = best
+            while len(_OCR_MEMO) > OCR_MEMO_SIZE:
+                _OCR_MEMO.popitem(last=False)
     
     if debug:
-        print(f"✅ 识别完成：{result}")
+        print(f"✅ 识别完成：{best.text}（置信度 {best.confidence:.3f}）")
         print("="*50)
-        
-    return result
+    
+    if return_details:
+        return best
+    return best.text
+
+# --- 5. 带标注的验证码语料 ---
+IMAGE_EXTENSIONS = ('.png', '.jpg', '.jpeg', '.gif', '.bmp')
+
+def save_labeled_captcha(corpus_dir, label, image_bytes):
+    """
+    把已确认标注的验证码写入语料目录，文件名为 '<标注>_<时间戳>.<扩展名>'
+    
+    返回:
+        写入的文件路径
+    """
+    os.makedirs(corpus_dir, exist_ok=True)
+    if image_bytes.startswith(b'\x89PNG'):
+        ext = '.png'
+    elif image_bytes.startswith(b'GIF8'):
+        ext = '.gif'
+    elif image_bytes.startswith(b'BM'):
+        ext = '.bmp'
+    else:
+        ext = '.jpg'
+    filename = f"{label.upper()}_{datetime.now().strftime('%Y%m%d%H%M%S%f')}{ext}"
+    path = os.path.join(corpus_dir, filename)
+    with open(path, 'wb') as f:
+        f.write(image_bytes)
+    return path
+
+def load_labeled_captchas(corpus_dir):
+    """
+    读取语料目录，标注取自文件名：'ABCD.png'、'ABCD_0001.jpg' 的标注均为 'ABCD'
+    
+    返回:
+        [(文件名, 标注, 图片字节流), ...]，按文件名排序
+    """
+    corpus = []
+    for filename in sorted(os.listdir(corpus_dir)):
+        stem, ext = os.path.splitext(filename)
+        if ext.lower() not in IMAGE_EXTENSIONS:
+            continue
+        label = stem.split('_')[0].upper()
+        with open(os.path.join(corpus_dir, filename), 'rb') as f:
+            corpus.append((filename, label, f.read()))
+    return corpus
 
 if __name__ == '__main__':
     pass
\ No newline at end of file
@@ -0,0 +1,99 @@
+# utils/session_cache.py
+"""
+登录会话（Cookie）的序列化与加密
+
+ScoreFetcher 登录成功后把 Cookie 加密保存到存储后端（见 database.save_session），
+下次运行先用保存的会话访问成绩页，会话未过期时就不必再走验证码登录。
+
+加密使用 cryptography 的 AES-256-GCM（认证加密）：密钥由 SESSION_ENCRYPTION_KEY 经 PBKDF2 派生，
+每次加密使用随机 nonce，版本号作为附加认证数据；密钥不对或内容被篡改时解密失败。
+"""
+import base64
+from http.cookiejar import Cookie
+import hashlib
+import json
+import os
+import time
+
+# 会话加密密钥（任意字符串），为空时不保存也不恢复会话
+SESSION_ENCRYPTION_KEY = os.getenv("SESSION_ENCRYPTION_KEY")
+
+# 版本 1 为早期的标准库实现，已不再支持：解密失败后重新登录并以新格式保存
+_TOKEN_VERSION = b'\x02'
+_NONCE_SIZE = 12
+_KDF_SALT = b'swjtu-scores-monitor/session-cookies'
+_KDF_ITERATIONS = 100_000
+
+_derived_keys = {}
+
+def _aead(secret):
+    """由口令派生 AES-256-GCM 密钥，派生结果在进程内缓存"""
+    # 导入本模块时不加载 cryptography，只在保存或恢复会话时才需要
+    from cryptography.hazmat.primitives.ciphers.aead import AESGCM
+
+    if secret not in _derived_keys:
+        _derived_keys[secret] = hashlib.pbkdf2_hmac('sha256', secret.encode('utf-8'), _KDF_SALT, _KDF_ITERATIONS)
+    return AESGCM(_derived_keys[secret])
+
+def encrypt(data, secret):
+    """加密字节串，返回可直接存储的 ASCII 字符串"""
+    nonce = os.urandom(_NONCE_SIZE)
+    ciphertext = _aead(secret).encrypt(nonce, data, _TOKEN_VERSION)
+    return base64.urlsafe_b64encode(_TOKEN_VERSION + nonce + ciphertext).decode('ascii')
+
+def decrypt(token, secret):
+    """
+    解密 encrypt 生成的字符串
+
+    异常:
+        ValueError: 格式错误、密钥不对或内容被篡改
+    """
+    from cryptography.exceptions import InvalidTag
+
+    aead = _aead(secret)
+    try:
+        raw = base64.urlsafe_b64decode(token.encode('ascii'))
+    except (ValueError, UnicodeEncodeError) as e:
+        raise ValueError(f"会话数据格式错误: {e}") from e
+    if len(raw) < 1 + _NONCE_SIZE or raw[:1] != _TOKEN_VERSION:
+        raise ValueError("会话数据格式错误")
+    try:
+        return aead.decrypt(raw[1:1 + _NONCE_SIZE], raw[1 + _NONCE_SIZE:], _TOKEN_VERSION)
+    except InvalidTag:
+        raise ValueError("会话数据校验失败（密钥不对或内容被篡改）") from None
+
+def dump_session(cookie_jar, username, base_url):
+    """把 Cookie（requests.Session.cookies 或 httpx.Cookies.jar 等 CookieJar）序列化为字节串"""
+    cookies = [{
+        'name': cookie.name,
+        'value': cookie.value,
+        'domain': cookie.domain,
+        'path': cookie.path,
+        'secure': cookie.secure,
+        'expires': cookie.expires,
+    } for cookie in cookie_jar]
+    state = {'username': username, 'base_url': base_url, 'saved_at': time.time(), 'cookies': cookies}
+    return json.dumps(state, ensure_ascii=False, sort_keys=True).encode('utf-8')
+
+def load_session(cookie_jar, data, username, base_url):
+    """
+    把 dump_session 的结果载入 CookieJar
+
+    返回:
+        是否载入（学号或教务地址不一致、Cookie 已过期时返回 False）
+    """
+    state = json.loads(data.decode('utf-8'))
+    if state.get('username') != username or state.get('base_url') != base_url:
+        return False
+    now = time.time()
+    cookies = [c for c in state.get('cookies', []) if not c.get('expires') or c['expires'] > now]
+    if not cookies:
+        return False
+    for c in cookies:
+        cookie_jar.set_cookie(Cookie(
+            version=0, name=c['name'], value=c['value'], port=None, port_specified=False,
+            domain=c['domain'], domain_specified=bool(c['domain']), domain_initial_dot=c['domain'].startswith('.'),
+            path=c['path'], path_specified=True, secure=c['secure'], expires=c['expires'],
+            discard=False, comment=None, comment_url=None, rest={},
+        ))
+    return True
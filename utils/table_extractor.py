@@ -0,0 +1,321 @@
+# utils/table_extractor.py
+"""
+基于 html.parser 事件流的成绩表格提取器
+
+教务成绩页只需要 table#table3 中的内容。BeautifulSoup 会先为整个页面建树再查找，
+这里直接在解析事件中跟踪 table3 内的行与单元格，每一行结束时立即交给回调，不保留其余页面内容。
+
+结果与 BeautifulSoup(html, 'html.parser') 的 find('table', id='table3') / find_all('tr') /
+find_all('td') / .text 完全一致，包括其对不规范 HTML 的处理方式：
+    - 元素按栈嵌套，结束标签弹出到最近的同名元素，没有对应开始标签的结束标签被忽略
+    - 未闭合的 td/tr 会把后续元素当作子元素（其文本也计入外层单元格）
+    - 注释以及 script/style/template/rt/rp 中的文本不计入 .text，CDATA 计入
+    - 两个标记之间只含空白的文本折叠为一个换行或空格（pre/textarea 内除外）
+    - 自闭合元素（br、img 等）没有子元素
+    - 字符引用按 BeautifulSoup 的规则转换（如 &#150; 按 windows-1252 解释，未知的 &foo; 保留为 '&foo'）
+"""
+from html.entities import html5
+from html.parser import HTMLParser
+import re
+
+SCORE_TABLE_ID = 'table3'
+
+# BeautifulSoup 视为空元素（无子元素）的标签
+VOID_ELEMENTS = frozenset({
+    'area', 'base', 'br', 'col', 'embed', 'hr', 'img', 'input', 'keygen', 'link', 'menuitem', 'meta',
+    'param', 'source', 'track', 'wbr', 'basefont', 'bgsound', 'command', 'frame', 'image', 'isindex',
+    'nextid', 'spacer',
+})
+# 其中文本不计入 .text 的标签
+HIDDEN_TEXT_ELEMENTS = frozenset({'script', 'style', 'template', 'rt', 'rp'})
+# 其中空白文本原样保留的标签
+PRESERVE_WHITESPACE_ELEMENTS = frozenset({'pre', 'textarea'})
+ASCII_SPACES = frozenset(' \n\t\x0c\r')
+
+_TABLE_TAG = re.compile(r"<(/?)table\b[^>]*>", re.I)
+_ID_ATTR = re.compile(r"""\bid\s*=\s*(["']?)([^"'\s>]*)\1""", re.I)
+
+_DECIMAL_PREFIX = re.compile(r"^([0-9]+)(.*)", re.S)
+_HEX_PREFIX = re.compile(r"^([0-9a-f]+)(.*)", re.S)
+
+def _numeric_reference(code):
+    """数字字符引用对应的字符（HTML 规范的 numeric character reference end state）"""
+    if code == 0 or code > 0x10FFFF or 0xD800 <= code <= 0xDFFF:
+        return '\ufffd'
+    if 0x80 <= code <= 0x9F:
+        try:
+            return bytes([code]).decode('windows-1252')
+        except UnicodeDecodeError:
+            pass
+    return chr(code)
+
+class StopParsing(Exception):
+    """行回调抛出该异常可提前结束解析（见 extract_rows）"""
+
+class Cell:
+    __slots__ = ('tag', 'attrs', 'parts')
+
+    def __init__(self, tag, attrs):
+        self.tag = tag
+        self.attrs = attrs
+        self.parts = []
+
+    @property
+    def text(self):
+        return ''.join(self.parts)
+
+    def get(self, name, default=None):
+        return self.attrs.get(name, default)
+
+class Row:
+    __slots__ = ('cells', 'closed')
+
+    def __init__(self):
+        self.cells = []
+        self.closed = False
+
+    def find_all(self, tag):
+        """与 BeautifulSoup 的 tr.find_all(tag) 对应：按文档顺序返回所有后代单元格"""
+        return [cell for cell in self.cells if cell.tag == tag]
+
+class _TableParser(HTMLParser):
+    def __init__(self, on_row, table_id):
+        super().__init__(convert_charrefs=False)
+        self.on_row = on_row
+        self.table_id = table_id
+        self.stack = []           # 打开的元素：(标签, 行或单元格或 None)
+        self.table_depth = None   # table3 在栈中的位置，None 表示尚未进入
+        self.found = False
+        self.done = False
+        self.open_rows = []       # 按开始顺序排列、尚未交给回调的行
+        self.open_cells = []
+        self.hidden = 0
+        self.preserve = 0
+        self.pending = []         # 当前文本段（相邻的文本与字符引用）
+
+    def handle_starttag(self, tag, attrs):
+        self._end_data()
+        attrs = {name: '' if value is None else value for name, value in attrs}
+        item = None
+        if self.table_depth is None:
+            if tag == 'table' and attrs.get('id') == self.table_id:
+                self.table_depth = len(self.stack)
+                self.found = True
+        elif tag == 'tr':
+            item = Row()
+            self.open_rows.append(item)
+        elif tag in ('td', 'th'):
+            item = Cell(tag, attrs)
+            for row in self.open_rows:
+                if not row.closed:
+                    row.cells.append(item)
+            self.open_cells.append(item)
+        if tag in VOID_ELEMENTS:
+            return
+        if tag in HIDDEN_TEXT_ELEMENTS:
+            self.hidden += 1
+        if tag in PRESERVE_WHITESPACE_ELEMENTS:
+            self.preserve += 1
+        self.stack.append((tag, item))
+
+    def handle_startendtag(self, tag, attrs):
+        self.handle_starttag(tag, attrs)
+        if tag not in VOID_ELEMENTS:
+            self.handle_endtag(tag)
+
+    def handle_endtag(self, tag):
+        self._end_data()
+        for depth in range(len(self.stack) - 1, -1, -1):
+            if self.stack[depth][0] == tag:
+                break
+        else:
+            return
+        while len(self.stack) > depth:
+            name, item = self.stack.pop()
+            if name in HIDDEN_TEXT_ELEMENTS:
+                self.hidden -= 1
+            if name in PRESERVE_WHITESPACE_ELEMENTS:
+                self.preserve -= 1
+            if isinstance(item, Row):
+                item.closed = True
+            elif isinstance(item, Cell):
+                self.open_cells.remove(item)
+            if self.table_depth is not None and len(self.stack) == self.table_depth:
+                self._close_table()
+                # 表格之后的内容无需解析
+                raise StopParsing
+        self._flush_rows()
+
+    def handle_data(self, data):
+        self.pending.append(data)
+
+    def _end_data(self, cdata=False):
+        """结束当前文本段，计入所有打开的单元格"""
+        if not self.pending:
+            return
+        data = ''.join(self.pending)
+        self.pending = []
+        if not self.open_cells or (self.hidden and not cdata):
+            return
+        if not self.preserve and ASCII_SPACES.issuperset(data):
+            data = '\n' if '\n' in data else ' '
+        for cell in self.open_cells:
+            cell.parts.append(data)
+
+    def handle_comment(self, data):
+        self._end_data()
+
+    def handle_decl(self, decl):
+        self._end_data()
+
+    def handle_pi(self, data):
+        self._end_data()
+
+    def handle_entityref(self, name):
+        character = html5.get(name + ';', html5.get(name))
+        self.handle_data(character if character is not None else f"&{name}")
+
+    def handle_charref(self, name):
+        base, pattern = (16, _HEX_PREFIX) if name[:1] in ('x', 'X') else (10, _DECIMAL_PREFIX)
+        digits = name[1:] if base == 16 else name
+        try:
+            self.handle_data(_numeric_reference(int(digits, base)))
+        except ValueError:
+            # 没有以分号结尾的引用：只取开头的数字部分，其余作为普通文本
+            match = pattern.search(digits)
+            if match is None:
+                self.handle_data(digits)
+            else:
+                self.handle_data(_numeric_reference(int(match.group(1), base)))
+                self.handle_data(match.group(2))
+
+    def unknown_decl(self, data):
+        self._end_data()
+        if data.upper().startswith('CDATA['):
+            self.handle_data(data[len('CDATA['):])
+            self._end_data(cdata=True)
+
+    def _flush_rows(self):
+        # 嵌套的行可能先于外层行结束，按开始顺序交给回调
+        while self.open_rows and self.open_rows[0].closed:
+            self.on_row(self.open_rows.pop(0))
+
+    def _close_table(self):
+        for row in self.open_rows:
+            row.closed = True
+        self._flush_rows()
+        self.done = True
+
+    def close(self):
+        super().close()
+        self._end_data()
+        # 页面结束时仍未闭合的 table3 视为在文末闭合
+        if self.table_depth is not None and not self.done:
+            self._close_table()
+
+def table_source(html, table_id=SCORE_TABLE_ID):
+    """
+    不解析页面，直接截取表格的原始 HTML（从开始标签到与之配对的结束标签）
+
+    嵌套表格按开始/结束标签计数配对；表格未闭合时截取到页面末尾。页面中没有该表格时返回 None。
+    """
+    depth = 0
+    start = None
+    for match in _TABLE_TAG.finditer(html):
+        if start is None:
+            if not match.group(1):
+                id_match = _ID_ATTR.search(match.group(0))
+                if id_match and id_match.group(2) == table_id:
+                    start = match.start()
+                    depth = 1
+            continue
+        depth += -1 if match.group(1) else 1
+        if depth == 0:
+            return html[start:match.end()]
+    return None if start is None else html[start:]
+
+def extract_rows(html, on_row, table_id=SCORE_TABLE_ID):
+    """
+    逐行提取表格，每行（Row）结束时调用 on_row；on_row 抛出 StopParsing 时立即停止
+
+    返回:
+        页面中是否存在该表格
+    """
+    parser = _TableParser(on_row, table_id)
+    try:
+        parser.feed(html)
+        parser.close()
+    except StopParsing:
+        pass
+    return parser.found
+
+def iter_all_score_records(html, on_record):
+    """
+    逐条提取全部成绩记录（{表头: 值}），每条记录调用 on_record；on_record 可抛出 StopParsing
+
+    返回:
+        页面中是否存在成绩表格
+
+    异常:
+        ValueError: 表格中没有任何行（对应 BeautifulSoup 版本在 find('tr') 为 None 时的异常）
+    """
+    header = None
+
+    def on_row(row):
+        nonlocal header
+        if header is None:
+            header = [th.text.strip() for th in row.find_all('th')]
+            return
+        cols = [td.text.strip() for td in row.find_all('td')]
+        if len(cols) == len(header):
+            on_record(dict(zip(header, cols)))
+
+    found = extract_rows(html, on_row)
+    if found and header is None:
+        raise ValueError("成绩表格中没有任何行")
+    return found
+
+def extract_all_scores(html):
+    """解析全部成绩页，返回 [{表头: 值}, ...]；页面中没有成绩表格时返回 None"""
+    records = []
+    if not iter_all_score_records(html, records.append):
+        return None
+    return records
+
+def extract_normal_scores(html):
+    """解析平时成绩页，返回按课程分组的明细；页面中没有成绩表格时返回 None"""
+    normal_scores_data = []
+    current_course_info = {}
+    first_row = True
+
+    def on_row(row):
+        nonlocal current_course_info, first_row
+        if first_row:
+            first_row = False
+            return
+        cols = row.find_all('td')
+        if len(cols) == 11:
+            course_name = cols[3].text.strip()
+            if not current_course_info or current_course_info.get("课程名称") != course_name:
+                if current_course_info:
+                    normal_scores_data.append(current_course_info)
+                current_course_info = {
+                    "课程名称": course_name,
+                    "教师": cols[5].text.strip(),
+                    "详情": []
+                }
+            current_course_info["详情"].append({
+                "平时成绩名称": cols[6].text.strip(),
+                "成绩": cols[8].text.strip(),
+                "占比": cols[7].text.strip(),
+                "提交时间": cols[10].text.strip()
+            })
+        elif len(cols) == 1 and cols[0].get('colspan') == '11':
+            if current_course_info:
+                current_course_info["总结"] = cols[0].text.strip()
+
+    if not extract_rows(html, on_row):
+        return None
+    if current_course_info: # 添加最后一个课程
+        normal_scores_data.append(current_course_info)
+    return normal_scores_data
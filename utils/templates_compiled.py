@@ -0,0 +1,32 @@
+# 由 utils/compile_templates.py 自动生成，请勿手动修改
+# 每项为 (字符名, 宽度, 高度, 逐行位掩码, 黑色像素数)
+DIGEST = 'd4821bb5a94e4b01a4beb52b8c3228e63a8014216cd4009571c7cb290339877e'
+
+TEMPLATES = (
+    ('A', 11, 13, (0xf8, 0xf8, 0xf8, 0x1dc, 0x1dc, 0x1dc, 0x38e, 0x3fe, 0x3fe, 0x7ff, 0x707, 0x707, 0x603,), 84),
+    ('B', 11, 13, (0x1ff, 0x3ff, 0x7ff, 0x707, 0x707, 0x3ff, 0x1ff, 0x37f, 0x707, 0x707, 0x7ff, 0x3ff, 0x1ff,), 112),
+    ('C', 11, 13, (0xf0, 0x3fc, 0x3fe, 0x78e, 0x307, 0x7, 0x7, 0x7, 0x307, 0x78e, 0x3fe, 0x3fc, 0xf0,), 75),
+    ('D', 11, 13, (0xff, 0x3ff, 0x3ff, 0x787, 0x707, 0x707, 0x707, 0x707, 0x707, 0x787, 0x3ff, 0x3ff, 0xff,), 100),
+    ('E', 10, 13, (0x3ff, 0x3ff, 0x3ff, 0x7, 0x7, 0x3ff, 0x3ff, 0x3ff, 0x7, 0x7, 0x3ff, 0x3ff, 0x3ff,), 102),
+    ('F', 9, 13, (0x1ff, 0x1ff, 0x1ff, 0x7, 0x7, 0xff, 0xff, 0xff, 0x7, 0x7, 0x7, 0x7, 0x7,), 72),
+    ('G', 12, 13, (0x1f0, 0x7fc, 0x7fe, 0xf0e, 0x607, 0x7, 0xfc7, 0xfc7, 0xfc7, 0xe0e, 0xffe, 0x7fc, 0x1f0,), 97),
+    ('H', 11, 13, (0x707, 0x707, 0x707, 0x707, 0x707, 0x7ff, 0x7ff, 0x7ff, 0x707, 0x707, 0x707, 0x707, 0x707,), 93),
+    ('I', 3, 13, (0x7, 0x7, 0x7, 0x7, 0x7, 0x7, 0x7, 0x7, 0x7, 0x7, 0x7, 0x7, 0x7,), 39),
+    ('J', 9, 13, (0x1c0, 0x1c0, 0x1c0, 0x1c0, 0x1c0, 0x1c0, 0x1c0, 0x1c0, 0x1c7, 0x1c7, 0x1ff, 0xfe, 0x7c,), 57),
+    ('K', 11, 13, (0x787, 0x3c7, 0x1c7, 0xe7, 0x77, 0x7f, 0xff, 0xef, 0x1c7, 0x1c7, 0x387, 0x707, 0x707,), 84),
+    ('L', 9, 13, (0x7, 0x7, 0x7, 0x7, 0x7, 0x7, 0x7, 0x7, 0x7, 0x7, 0x1ff, 0x1ff, 0x1ff,), 57),
+    ('M', 13, 13, (0x1e0f, 0x1e0f, 0x1f1f, 0x1f1f, 0x1f1f, 0x1db7, 0x1db7, 0x1db7, 0x1db7, 0x1ce7, 0x1ce7, 0x1ce7, 0x1c47,), 120),
+    ('N', 11, 13, (0x707, 0x70f, 0x71f, 0x71f, 0x73f, 0x737, 0x777, 0x767, 0x7e7, 0x7c7, 0x7c7, 0x787, 0x707,), 101),
+    ('O', 12, 13, (0xf0, 0x3fc, 0x7fe, 0x70e, 0xe07, 0xe07, 0xe07, 0xe07, 0xe07, 0x70e, 0x7fe, 0x3fc, 0xf0,), 86),
+    ('P', 10, 13, (0xff, 0x1ff, 0x3ff, 0x387, 0x387, 0x3ff, 0x1ff, 0xff, 0x7, 0x7, 0x7, 0x7, 0x7,), 81),
+    ('Q', 12, 13, (0x1f8, 0x3fc, 0x7fe, 0x70e, 0xe07, 0xe07, 0xe07, 0xe47, 0xee7, 0xfce, 0x7fe, 0x7fc, 0xef8,), 100),
+    ('R', 11, 13, (0x1ff, 0x3ff, 0x7ff, 0x707, 0x707, 0x7ff, 0x3ff, 0xff, 0x1e7, 0x3c7, 0x387, 0x787, 0x707,), 104),
+    ('S', 10, 13, (0xfc, 0x1fe, 0x3ff, 0x387, 0x7, 0x7f, 0x1fe, 0x3f8, 0x380, 0x387, 0x3ff, 0x1fe, 0xfc,), 88),
+    ('T', 11, 13, (0x5ff, 0x7ff, 0x7ff, 0x70, 0x70, 0x70, 0x70, 0x70, 0x70, 0x70, 0x70, 0x70, 0x60,), 61),
+    ('U', 11, 13, (0x707, 0x707, 0x507, 0x707, 0x707, 0x707, 0x707, 0x707, 0x707, 0x78f, 0x3fe, 0x3fe, 0xf8,), 84),
+    ('V', 13, 13, (0x1c07, 0x1c07, 0xe0e, 0xe0e, 0xe0e, 0x71c, 0x71c, 0x3b8, 0x3b8, 0x3b8, 0x1f0, 0x1f0, 0x1f0,), 75),
+    ('W', 17, 13, (0x1c387, 0x1c387, 0x1c7c7, 0xe6ce, 0xe6ce, 0xeeee, 0xeeee, 0xec6e, 0xec6e, 0x7c7c, 0x7c7c, 0x783c, 0x783c,), 129),
+    ('X', 10, 13, (0x387, 0x387, 0x1ce, 0xcc, 0xfc, 0x78, 0x38, 0x78, 0xfc, 0xcc, 0x1ce, 0x387, 0x387,), 67),
+    ('Y', 11, 13, (0x707, 0x707, 0x38e, 0x1dc, 0x1dc, 0xf8, 0xf8, 0x70, 0x70, 0x70, 0x70, 0x70, 0x70,), 58),
+    ('Z', 10, 13, (0x3fe, 0x3fe, 0x3fe, 0x180, 0xe0, 0x70, 0x78, 0x38, 0x1c, 0xe, 0x3ff, 0x3ff, 0x3ff,), 78),
+)
@@ -0,0 +1,180 @@
+# utils/trace.py
+"""
+分阶段的耗时记录（span）
+
+    with trace.collect() as spans:                # 一次运行（一个 API 请求、批量监控中的一个账号）
+        with trace.span('page.fetch', page='all_scores') as s:
+            response = session.get(...)
+            trace.record_response(s, response)    # 计数器 bytes，属性 status_code
+            s.set('rows', 120)                    # 属性
+            s.add('attempts')                     # 计数器累加
+
+span 结束时以一行 JSON 写入 TRACE_FILE（'-' 为标准输出，为空不写），同时追加到当前 collect() 的列表中，
+API 把 report(spans) 附在响应里。嵌套的 span 记录 parent_id；既不在 collect() 中、也没有设置 TRACE_FILE 时
+span 不做任何记录。
+
+基于 contextvars：asyncio 任务与 asyncio.to_thread 自动继承当前 span；自行提交到线程池的任务需用 bind() 包装。
+"""
+import contextlib
+import contextvars
+import json
+import os
+import secrets
+import sys
+import threading
+import time
+
+# span 的 JSON 行输出位置：文件路径，'-' 为标准输出，为空则只在 collect() 中收集
+TRACE_FILE = os.getenv("TRACE_FILE", "")
+
+class Span:
+    """一个阶段的耗时、属性（set）与计数器（add）"""
+    __slots__ = ('name', 'trace_id', 'span_id', 'parent_id', 'start', 'duration_ms', 'attrs', 'counters', 'error')
+
+    def __init__(self, name, trace_id, parent_id=None, attrs=None):
+        self.name = name
+        self.trace_id = trace_id
+        self.span_id = secrets.token_hex(4)
+        self.parent_id = parent_id
+        self.start = time.time()
+        self.duration_ms = None
+        self.attrs = dict(attrs or {})
+        self.counters = {}
+        self.error = None
+
+    def set(self, key, value):
+        self.attrs[key] = value
+
+    def add(self, key, amount=1):
+        with _counter_lock:
+            self.counters[key] = self.counters.get(key, 0) + amount
+
+    def fail(self, message):
+        """标记该阶段失败（异常离开 span 时自动标记）"""
+        self.error = str(message)
+
+    def to_dict(self):
+        return {
+            'trace_id': self.trace_id,
+            'span_id': self.span_id,
+            'parent_id': self.parent_id,
+            'name': self.name,
+            'start': round(self.start, 6),
+            'duration_ms': round(self.duration_ms, 3) if self.duration_ms is not None else None,
+            'status': 'error' if self.error else 'ok',
+            'error': self.error,
+            'attrs': self.attrs,
+            'counters': self.counters,
+        }
+
+class _NoopSpan:
+    """未启用记录时 span() 返回的占位对象"""
+    name = trace_id = span_id = parent_id = duration_ms = error = None
+
+    def set(self, key, value):
+        pass
+
+    def add(self, key, amount=1):
+        pass
+
+    def fail(self, message):
+        pass
+
+_NOOP = _NoopSpan()
+_counter_lock = threading.Lock()
+_output_lock = threading.Lock()
+_current = contextvars.ContextVar('trace_span', default=None)
+# (trace_id, span 列表)
+_collector = contextvars.ContextVar('trace_collector', default=None)
+
+def enabled():
+    return bool(TRACE_FILE) or _collector.get() is not None
+
+def current():
+    """当前所在的 span；不在任何 span 中时为占位对象"""
+    return _current.get() or _NOOP
+
+@contextlib.contextmanager
+def span(name, **attrs):
+    """记录一个阶段；异常会标记在 span 上并照常抛出"""
+    if not enabled():
+        yield _NOOP
+        return
+    parent = _current.get()
+    collector = _collector.get()
+    trace_id = parent.trace_id if parent else (collector[0] if collector else secrets.token_hex(8))
+    item = Span(name, trace_id, parent.span_id if parent else None, attrs)
+    token = _current.set(item)
+    start = time.perf_counter()
+    try:
+        yield item
+    except BaseException as e:
+        if item.error is None:
+            item.fail(f"{type(e).__name__}: {e}")
+        raise
+    finally:
+        item.duration_ms = (time.perf_counter() - start) * 1000
+        _current.reset(token)
+        _finish(item, collector)
+
+def _finish(item, collector):
+    if collector is not None:
+        collector[1].append(item)
+    if TRACE_FILE:
+        line = json.dumps(item.to_dict(), ensure_ascii=False)
+        with _output_lock:
+            if TRACE_FILE == '-':
+                print(line, file=sys.stdout, flush=True)
+            else:
+                try:
+                    with open(TRACE_FILE, 'a', encoding='utf-8') as f:
+                        f.write(line + '\n')
+                except OSError as e:
+                    print(f"写入 span 失败: {e}")
+
+@contextlib.contextmanager
+def collect():
+    """收集此范围内结束的全部 span（按结束顺序），它们共用一个 trace_id"""
+    spans = []
+    token = _collector.set((secrets.token_hex(8), spans))
+    try:
+        yield spans
+    finally:
+        _collector.reset(token)
+
+def bind(fn):
+    """让 fn 在提交到线程池后仍处于当前的 span 与 collect() 中（每次提交前调用一次）"""
+    context = contextvars.copy_context()
+    return lambda *args, **kwargs: context.run(fn, *args, **kwargs)
+
+def record_response(item, response):
+    """记录 HTTP 响应（requests 或 httpx）的状态码与正文字节数；压缩传输时另记 wire_bytes"""
+    if item is _NOOP:
+        return
+    item.set('status_code', getattr(response, 'status_code', None))
+    item.add('bytes', len(getattr(response, 'content', b'') or b''))
+    headers = getattr(response, 'headers', None) or {}
+    wire_bytes = headers.get('Content-Length')
+    if wire_bytes and wire_bytes.isdigit() and headers.get('Content-Encoding'):
+        item.add('wire_bytes', int(wire_bytes))
+
+def summarize(spans):
+    """按名称汇总：{名称: {'count', 'total_ms', 'errors', 各计数器之和}}"""
+    summary = {}
+    for item in spans:
+        entry = summary.setdefault(item.name, {'count': 0, 'total_ms': 0.0, 'errors': 0})
+        entry['count'] += 1
+        entry['total_ms'] = round(entry['total_ms'] + (item.duration_ms or 0.0), 3)
+        entry['errors'] += bool(item.error)
+        for key, value in item.counters.items():
+            entry[key] = entry.get(key, 0) + value
+    return summary
+
+def report(spans):
+    """附在 API 响应中的记录：完整的 span 列表（按开始时间排序）与按名称的汇总"""
+    ordered = sorted(spans, key=lambda item: item.start)
+    return {
+        'trace_id': ordered[0].trace_id if ordered else None,
+        'spans': [item.to_dict() for item in ordered],
+        'summary': summarize(spans),
+    }
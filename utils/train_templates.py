@@ -0,0 +1,117 @@
+# utils/train_templates.py
+"""
+用登录成功时保存的验证码语料重建或扩充模板库
+
+语料由 ScoreFetcher 在设置 CAPTCHA_CORPUS_DIR 时写入，文件名即标注（见 ocr.save_labeled_captcha）。
+每张验证码按识别时相同的方式二值化、分割，只有分割数量与标注长度一致时才采用；
+同一字母的所有样本中，选与其余样本平均相似度最高的一个（medoid）作为模板。
+
+用法:
+    python utils/train_templates.py corpus/                  # 只补充缺失字母的模板
+    python utils/train_templates.py corpus/ --mode rebuild   # 样本足够的字母全部替换为新模板
+    python utils/train_templates.py corpus/ --output-dir /tmp/templates
+"""
+import argparse
+import io
+from pathlib import Path
+import sys, os
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from PIL import Image
+
+from utils import fetcher, ocr
+from utils.compile_templates import compile_templates
+
+# 每个字母参与 medoid 计算的最大样本数（计算量与样本数平方成正比）
+MAX_SAMPLES_PER_CHAR = 60
+
+def collect_glyphs(corpus, threshold=fetcher.OCR_THRESHOLD, segmentation=fetcher.OCR_SEGMENTATION):
+    """
+    从语料中切出带标注的字符图像
+
+    参数:
+        corpus: ocr.load_labeled_captchas 返回的语料
+        threshold: 二值化阈值，默认与登录识别相同（OCR_THRESHOLD）
+        segmentation: 字符分割方式，默认与登录识别相同（OCR_SEGMENTATION）；
+            与识别时切法不同的模板会与实际切出的字符对不齐
+
+    返回:
+        ({字母: [字符图像, ...]}, 分割数量与标注不一致而被跳过的验证码数)
+    """
+    glyphs = {}
+    skipped = 0
+    for _, label, image_bytes in corpus:
+        img_bin = ocr.binarize(Image.open(io.BytesIO(image_bytes)), threshold)
+        char_images = ocr.segment_characters(img_bin, debug=False, mode=segmentation, expected_chars=len(label))
+        if len(char_images) != len(label):
+            skipped += 1
+            continue
+        for char, char_img in zip(label, char_images):
+            glyphs.setdefault(char, []).append(char_img)
+    return glyphs, skipped
+
+def select_medoid(samples):
+    """返回与其余样本平均相似度最高的样本"""
+    samples = samples[:MAX_SAMPLES_PER_CHAR]
+    if len(samples) == 1:
+        return samples[0]
+    packed = {i: ocr.pack_glyph(img) for i, img in enumerate(samples)}
+    best_index, best_score = 0, -1.0
+    for i, glyph in packed.items():
+        score = sum(similarity for _, similarity, _ in ocr.match_glyph(glyph, packed))
+        if score > best_score:
+            best_index, best_score = i, score
+    return samples[best_index]
+
+def train_templates(corpus_dir, output_dir=ocr.TEMPLATE_DIR, mode='extend', min_samples=3,
+                    threshold=fetcher.OCR_THRESHOLD, segmentation=fetcher.OCR_SEGMENTATION):
+    """
+    根据语料写出模板 PNG
+
+    参数:
+        corpus_dir: 语料目录
+        output_dir: 模板输出目录
+        mode: 'extend' 只补充缺失的字母；'rebuild' 样本数足够的字母全部替换
+        min_samples: 生成模板所需的最少样本数
+        threshold, segmentation: 同 collect_glyphs，默认与登录识别相同
+
+    返回:
+        写出模板的字母列表
+    """
+    corpus = ocr.load_labeled_captchas(corpus_dir)
+    glyphs, skipped = collect_glyphs(corpus, threshold=threshold, segmentation=segmentation)
+    print(f"语料 {len(corpus)} 张，跳过 {skipped} 张（分割数量与标注不一致）")
+
+    os.makedirs(output_dir, exist_ok=True)
+    existing = {os.path.splitext(f)[0] for f in os.listdir(output_dir) if f.endswith('.png')}
+    written = []
+    for char in sorted(glyphs):
+        samples = glyphs[char]
+        if len(samples) < min_samples:
+            print(f"  {char}: 样本 {len(samples)} 个，不足 {min_samples} 个，跳过")
+            continue
+        if mode == 'extend' and char in existing:
+            continue
+        select_medoid(samples).convert('1').save(os.path.join(output_dir, f"{char}.png"))
+        written.append(char)
+        print(f"  {char}: 由 {len(samples)} 个样本生成模板")
+    return written
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="用验证码语料重建或扩充模板库")
+    parser.add_argument("corpus_dir", help="带标注的验证码目录")
+    parser.add_argument("--output-dir", default=ocr.TEMPLATE_DIR, help="模板输出目录，默认 utils/templates")
+    parser.add_argument("--mode", choices=['extend', 'rebuild'], default='extend')
+    parser.add_argument("--min-samples", type=int, default=3)
+    parser.add_argument("--threshold", default=str(fetcher.OCR_THRESHOLD), help="二值化阈值或 'otsu'，默认同 OCR_THRESHOLD")
+    parser.add_argument("--segmentation", default=fetcher.OCR_SEGMENTATION, choices=ocr.SEGMENTATION_MODES,
+                        help="字符分割方式，默认同 OCR_SEGMENTATION（与登录识别一致）")
+    args = parser.parse_args()
+
+    threshold = int(args.threshold) if args.threshold.isdigit() else args.threshold
+    written = train_templates(args.corpus_dir, args.output_dir, args.mode, args.min_samples,
+                              threshold=threshold, segmentation=args.segmentation)
+    print(f"✅ 共写出 {len(written)} 个模板: {''.join(written)}")
+    if written and os.path.abspath(args.output_dir) == os.path.abspath(ocr.TEMPLATE_DIR):
+        compile_templates()
+        print("✅ 已重新生成 utils/templates_compiled.py")
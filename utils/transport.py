@@ -0,0 +1,215 @@
+# utils/transport.py
+"""
+进程内共享的 HTTP 传输层
+
+ScoreFetcher、AsyncScoreFetcher 与 utils/database 的请求都经过这里：
+    - 同步请求共用一个带连接池的 HTTPAdapter：每个 requests.Session 仍各自保存 Cookie，
+      但对同一主机复用同一组长连接，不必每次都重新握手 TCP/TLS
+    - 异步请求在同一事件循环内共用一个 httpx 连接池
+    - 统一声明 Accept-Encoding 以压缩传输，按主机设置默认超时（请求未指定 timeout 时使用）
+    - 按主机限制请求速率（令牌桶，进程内所有会话共享），批量监控多个账号时避免给教务造成压力
+    - stats() 返回各主机的请求数与新建连接数，用于观察连接复用情况
+
+导入本模块不创建连接池，也不导入 httpx；第一次使用时才创建。
+"""
+import os
+import threading
+import time
+import weakref
+from collections import defaultdict
+from urllib.parse import urlparse
+
+from requests import Session
+from requests.adapters import HTTPAdapter
+
+# 连接池中缓存的主机数，以及每个主机保持的长连接数（并行登录、并发抓取时同一主机会同时使用多个连接）
+POOL_CONNECTIONS = int(os.getenv("HTTP_POOL_CONNECTIONS", "10"))
+POOL_MAXSIZE = int(os.getenv("HTTP_POOL_MAXSIZE", "10"))
+# 异步连接池中空闲长连接的保留时间（秒）
+KEEPALIVE_EXPIRY = float(os.getenv("HTTP_KEEPALIVE_EXPIRY", "30"))
+ACCEPT_ENCODING = "gzip, deflate"
+
+# 各主机的默认超时 (连接, 读取)（秒）
+DEFAULT_TIMEOUT = (float(os.getenv("HTTP_CONNECT_TIMEOUT", "5")), float(os.getenv("HTTP_READ_TIMEOUT", "30")))
+HOST_TIMEOUTS = {
+    "jwc.swjtu.edu.cn": (float(os.getenv("JWC_CONNECT_TIMEOUT", "5")), float(os.getenv("JWC_READ_TIMEOUT", "15"))),
+    "api.github.com": (float(os.getenv("GITHUB_CONNECT_TIMEOUT", "5")), float(os.getenv("GITHUB_READ_TIMEOUT", "30"))),
+}
+
+# 各主机的请求速率上限（每秒请求数，0 为不限制）；也可以用 set_rate_limit 在运行时设置
+HOST_RATE_LIMITS = {
+    "jwc.swjtu.edu.cn": float(os.getenv("JWC_RATE_LIMIT", "0")),
+}
+# 速率受限时允许连续发出的请求数
+RATE_LIMIT_BURST = int(os.getenv("HTTP_RATE_LIMIT_BURST", "2"))
+
+def _host(url):
+    return urlparse(url).hostname if '//' in url else url
+
+def timeout_for(url):
+    """URL（或主机名）对应的默认超时 (连接, 读取)"""
+    return HOST_TIMEOUTS.get(_host(url), DEFAULT_TIMEOUT)
+
+class RateLimiter:
+    """
+    线程安全的令牌桶：平均每秒 rate 个请求，最多连续 burst 个
+
+    reserve() 预约一个令牌并返回需要等待的秒数（令牌可以预支，多个等待者按预约顺序依次放行），
+    同步请求用 acquire() 直接等待，异步请求 await asyncio.sleep(reserve())。
+    """
+    def __init__(self, rate, burst=1, clock=time.monotonic):
+        self.rate = rate
+        self.burst = max(1, burst)
+        self.clock = clock
+        self._tokens = float(self.burst)
+        self._updated = clock()
+        self._lock = threading.Lock()
+
+    def reserve(self):
+        with self._lock:
+            now = self.clock()
+            self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+            self._updated = now
+            self._tokens -= 1
+            return 0.0 if self._tokens >= 0 else -self._tokens / self.rate
+
+    def acquire(self):
+        wait = self.reserve()
+        if wait > 0:
+            time.sleep(wait)
+        return wait
+
+_limiters = {}
+_limiters_lock = threading.Lock()
+
+def set_rate_limit(url, rate, burst=RATE_LIMIT_BURST):
+    """设置 URL（或主机名）所在主机的请求速率上限（每秒请求数，0 或 None 取消限制）"""
+    host = _host(url)
+    with _limiters_lock:
+        HOST_RATE_LIMITS[host] = rate or 0
+        _limiters.pop(host, None)
+
+def rate_limiter(url):
+    """URL（或主机名）所在主机共享的 RateLimiter，未限制速率时为 None"""
+    host = _host(url)
+    rate = HOST_RATE_LIMITS.get(host)
+    if not rate:
+        return None
+    with _limiters_lock:
+        if host not in _limiters:
+            _limiters[host] = RateLimiter(rate, RATE_LIMIT_BURST)
+        return _limiters[host]
+
+class PooledAdapter(HTTPAdapter):
+    """
+    进程内共享的适配器：未指定 timeout 的请求使用主机默认超时，并遵守主机的请求速率上限；
+    Session.close() 不关闭共享的连接
+    """
+
+    def send(self, request, timeout=None, **kwargs):
+        if timeout is None:
+            timeout = timeout_for(request.url)
+        limiter = rate_limiter(request.url)
+        if limiter:
+            limiter.acquire()
+        return super().send(request, timeout=timeout, **kwargs)
+
+    def close(self):
+        pass
+
+_adapter = None
+_adapter_lock = threading.Lock()
+
+def shared_adapter():
+    global _adapter
+    with _adapter_lock:
+        if _adapter is None:
+            # 重试由调用方按失败类别决定（见 fetcher.login），这里不自动重试
+            _adapter = PooledAdapter(pool_connections=POOL_CONNECTIONS, pool_maxsize=POOL_MAXSIZE, max_retries=0)
+        return _adapter
+
+def new_session(headers=None):
+    """创建挂载共享连接池的 requests.Session（Cookie 等会话状态仍相互独立）"""
+    session = Session()
+    adapter = shared_adapter()
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    session.headers["Accept-Encoding"] = ACCEPT_ENCODING
+    if headers:
+        session.headers.update(headers)
+    return session
+
+# --- 异步传输 ---
+# 异步请求的统计 {主机: {'requests': n, 'connections': n}}；同步请求的统计直接读取 urllib3 连接池
+_async_stats = defaultdict(lambda: {'requests': 0, 'connections': 0})
+_async_transport = None
+
+def async_transport():
+    """返回进程内共享的 httpx 异步传输（在每个事件循环内各自维护连接池）；AsyncClient.aclose() 不会关闭它"""
+    global _async_transport
+    if _async_transport is None:
+        import asyncio
+        import httpx
+
+        class SharedAsyncTransport(httpx.AsyncBaseTransport):
+            def __init__(self):
+                self._pools = weakref.WeakKeyDictionary()
+
+            def _pool(self):
+                loop = asyncio.get_running_loop()
+                if loop not in self._pools:
+                    limits = httpx.Limits(max_connections=POOL_CONNECTIONS * POOL_MAXSIZE,
+                                          max_keepalive_connections=POOL_MAXSIZE, keepalive_expiry=KEEPALIVE_EXPIRY)
+                    self._pools[loop] = httpx.AsyncHTTPTransport(limits=limits)
+                return self._pools[loop]
+
+            async def handle_async_request(self, request):
+                limiter = rate_limiter(request.url.host)
+                if limiter:
+                    wait = limiter.reserve()
+                    if wait > 0:
+                        await asyncio.sleep(wait)
+                counters = _async_stats[request.url.host]
+                counters['requests'] += 1
+
+                async def trace(event, info):
+                    if event == 'connection.connect_tcp.complete':
+                        counters['connections'] += 1
+
+                request.extensions = {**request.extensions, 'trace': trace}
+                return await self._pool().handle_async_request(request)
+
+            async def aclose(self):
+                pass
+
+        _async_transport = SharedAsyncTransport()
+    return _async_transport
+
+def async_timeout_for(url):
+    """URL 对应的 httpx.Timeout"""
+    import httpx
+    connect, read = timeout_for(url)
+    return httpx.Timeout(read, connect=connect)
+
+def stats():
+    """
+    各主机的连接复用统计
+
+    返回:
+        {主机: {'requests': 请求数, 'connections': 新建连接数, 'reused': 复用已有连接的请求数}}
+    """
+    result = defaultdict(lambda: {'requests': 0, 'connections': 0})
+    if _adapter is not None:
+        pools = _adapter.poolmanager.pools
+        for key in list(pools.keys()):
+            pool = pools.get(key)
+            if pool is None:
+                continue
+            counters = result[pool.host]
+            counters['requests'] += pool.num_requests
+            counters['connections'] += pool.num_connections
+    for host, counters in list(_async_stats.items()):
+        result[host]['requests'] += counters['requests']
+        result[host]['connections'] += counters['connections']
+    return {host: {**counters, 'reused': max(0, counters['requests'] - counters['connections'])}
+            for host, counters in result.items()}